@@ -156,6 +156,7 @@ class zulip::app_frontend_base {
     'email_mirror',
     'embed_links',
     'embedded_bots',
+    'message_fanout',
     'email_senders',
     'deferred_email_senders',
     'missedmessage_emails',
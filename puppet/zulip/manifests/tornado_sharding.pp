@@ -45,6 +45,9 @@ class zulip::tornado_sharding {
   # the zulip.conf configuration. Default is just port 9800.
   $tornado_groups = zulipconf_keys('tornado_sharding').map |$key| { $key.regsubst(/_regex$/, '').split('_') }.unique
   $tornado_ports = $tornado_groups.flatten.unique
+  # Each port can be served by several processes, which each also
+  # listen on a port of their own (see get_tornado_process_port).
+  $tornado_processes_per_port = Integer(zulipconf('application_server', 'tornado_processes_per_port', 1))
 
   file { '/etc/nginx/zulip-include/tornado-upstreams':
     require => [Package[$zulip::common::nginx], Exec['stage_updated_sharding']],
@@ -20,6 +20,7 @@ normal_queues = [
     "email_senders",
     "embed_links",
     "embedded_bots",
+    "message_fanout",
     "missedmessage_emails",
     "missedmessage_mobile_notifications",
     "outgoing_webhooks",
@@ -24,8 +24,9 @@ def nginx_quote(s: str) -> str:
 # Basic system to do Tornado sharding.  Writes two output .tmp files that need
 # to be renamed to the following files to finalize the changes:
 # * /etc/zulip/nginx_sharding_map.conf; nginx needs to be reloaded after changing.
-# * /etc/zulip/sharding.json; supervisor Django process needs to be reloaded
-# after changing.  TODO: We can probably make this live-reload by statting the file.
+# * /etc/zulip/sharding.json; Django and Tornado processes pick up changes
+# within a few seconds.  Moving a realm's event queues to another Tornado
+# process without a restart is done with `manage.py move_realm_event_queues`.
 #
 # TODO: Restructure this to automatically generate a sharding layout.
 def write_updated_configs() -> None:
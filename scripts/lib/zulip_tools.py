@@ -613,6 +613,36 @@ def get_tornado_ports(config_file: configparser.RawConfigParser) -> list[int]:
     return ports
 
 
+# Each Tornado port can be served by several processes, which all
+# listen on it (using SO_REUSEPORT) and partition its users between
+# them.  Each process also listens on a port of its own, counting up
+# from the shared port in steps of TORNADO_PROCESS_PORT_OFFSET, which
+# is used to address it directly.
+TORNADO_PROCESS_PORT_OFFSET = 1000
+
+
+def get_tornado_processes_per_port(config_file: configparser.RawConfigParser) -> int:
+    return int(get_config(config_file, "application_server", "tornado_processes_per_port", "1"))
+
+
+def get_tornado_process_port(port: int, process_num: int) -> int:
+    return port + TORNADO_PROCESS_PORT_OFFSET * (process_num + 1)
+
+
+def get_tornado_process_ports(config_file: configparser.RawConfigParser) -> list[int]:
+    """The ports of all Tornado processes; this differs from
+    get_tornado_ports only if tornado_processes_per_port is set."""
+    processes_per_port = get_tornado_processes_per_port(config_file)
+    ports = get_tornado_ports(config_file)
+    if processes_per_port == 1:
+        return ports
+    return [
+        get_tornado_process_port(port, process_num)
+        for port in ports
+        for process_num in range(processes_per_port)
+    ]
+
+
 def get_or_create_dev_uuid_var_path(path: str) -> str:
     absolute_path = f"{get_dev_uuid_var_path()}/{path}"
     os.makedirs(absolute_path, exist_ok=True)
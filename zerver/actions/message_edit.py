@@ -26,7 +26,11 @@ from zerver.actions.message_send import (
 from zerver.actions.uploads import AttachmentChangeResult, check_attachment_reference_change
 from zerver.actions.user_topics import bulk_do_set_user_topic_visibility_policy
 from zerver.lib import utils
-from zerver.lib.cache import cache_delete_many, to_dict_cache_key_id
+from zerver.lib.cache import (
+    cache_delete_many,
+    flush_first_unread_anchors,
+    to_dict_cache_keys_to_flush,
+)
 from zerver.lib.exceptions import (
     JsonableError,
     MessageMoveError,
@@ -967,7 +971,7 @@ def do_update_message(
     # this to after the transaction commits so that concurrent readers
     # don't repopulate the cache with stale pre-commit data.
     transaction.on_commit(
-        lambda: cache_delete_many(to_dict_cache_key_id(msg_id) for msg_id in changed_message_ids)
+        lambda: cache_delete_many(to_dict_cache_keys_to_flush(changed_message_ids))
     )
     event["message_ids"] = sorted(changed_message_ids)
 
@@ -1267,6 +1271,12 @@ def do_update_message(
 
     send_event_on_commit(user_profile.realm, event, users_to_be_notified)
 
+    if message_edit_request.is_message_moved:
+        # Moved messages may now be the first unread message in a
+        # narrow for the users who can see them.
+        moved_message_user_ids = [user["id"] for user in users_to_be_notified]
+        transaction.on_commit(lambda: flush_first_unread_anchors(moved_message_user_ids))
+
     resolved_topic_message_id = None
     # We calculate the users for which the resolved-topic notification
     # should be marked as unread using the topic visibility policy and
@@ -8,6 +8,7 @@ from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
 
 from analytics.lib.counts import COUNT_STATS, do_increment_logging_stat
+from zerver.lib.cache import flush_first_unread_anchors
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.message import (
     bulk_access_messages,
@@ -434,6 +435,7 @@ def do_update_message_flags(
             event["message_details"] = format_unread_message_details(
                 user_profile.id, raw_unread_data
             )
+            transaction.on_commit(lambda: flush_first_unread_anchors([user_profile.id]))
 
         send_event_on_commit(user_profile.realm, event, [user_profile.id])
 
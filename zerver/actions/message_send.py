@@ -1,6 +1,6 @@
 import logging
 from collections import defaultdict
-from collections.abc import Callable, Collection, Sequence
+from collections.abc import Callable, Collection, Iterable, Mapping, Sequence
 from collections.abc import Set as AbstractSet
 from dataclasses import dataclass
 from datetime import timedelta
@@ -11,7 +11,7 @@ import orjson
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
-from django.db.models import Exists, F, OuterRef, Q, QuerySet
+from django.db.models import Exists, OuterRef, Q, QuerySet
 from django.utils.html import escape
 from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
@@ -25,7 +25,11 @@ from zerver.actions.user_topics import (
 )
 from zerver.lib.addressee import Addressee
 from zerver.lib.alert_words import get_alert_word_automaton
-from zerver.lib.cache import cache_with_key, user_profile_delivery_email_cache_key
+from zerver.lib.cache import (
+    cache_with_key,
+    flush_first_unread_anchors,
+    user_profile_delivery_email_cache_key,
+)
 from zerver.lib.create_user import create_user
 from zerver.lib.exceptions import (
     DirectMessageInitiationError,
@@ -52,7 +56,7 @@ from zerver.lib.message import (
     truncate_topic,
     visibility_policy_for_send_message,
 )
-from zerver.lib.message_cache import MessageDict
+from zerver.lib.message_cache import MessageDict, set_new_message_dict_versions
 from zerver.lib.muted_users import get_muting_users
 from zerver.lib.notification_data import (
     UserMessageNotificationsData,
@@ -90,7 +94,7 @@ from zerver.lib.user_groups import (
     is_any_user_in_group,
     is_user_in_group,
 )
-from zerver.lib.user_message import UserMessageLite, bulk_insert_ums
+from zerver.lib.user_message import bulk_insert_um_columns
 from zerver.lib.users import (
     check_can_access_user,
     get_inaccessible_user_ids,
@@ -287,70 +291,41 @@ def get_recipient_info(
             # misses this sender. This is useful when the sender is sending their first message
             # in the topic.
             topic_participant_user_ids.add(sender_id)
-        subscription_rows = (
-            get_subscriptions_for_send_message(
-                realm_id=realm_id,
-                stream_id=stream_topic.stream_id,
-                topic_name=stream_topic.topic_name,
-                possible_stream_wildcard_mention=possible_stream_wildcard_mention,
-                topic_participant_user_ids=topic_participant_user_ids,
-                possibly_mentioned_user_ids=possibly_mentioned_user_ids,
-            )
-            .annotate(
-                user_profile_email_notifications=F(
-                    "user_profile__enable_stream_email_notifications"
-                ),
-                user_profile_push_notifications=F("user_profile__enable_stream_push_notifications"),
-                user_profile_wildcard_mentions_notify=F("user_profile__wildcard_mentions_notify"),
-                followed_topic_email_notifications=F(
-                    "user_profile__enable_followed_topic_email_notifications"
-                ),
-                followed_topic_push_notifications=F(
-                    "user_profile__enable_followed_topic_push_notifications"
-                ),
-                followed_topic_wildcard_mentions_notify=F(
-                    "user_profile__enable_followed_topic_wildcard_mentions_notify"
-                ),
-            )
-            .values(
-                "user_profile_id",
-                "push_notifications",
-                "email_notifications",
-                "wildcard_mentions_notify",
-                "followed_topic_push_notifications",
-                "followed_topic_email_notifications",
-                "followed_topic_wildcard_mentions_notify",
-                "user_profile_email_notifications",
-                "user_profile_push_notifications",
-                "user_profile_wildcard_mentions_notify",
-                "is_muted",
-            )
-            .order_by("user_profile_id")
+        user_id_to_visibility_policy = stream_topic.user_id_to_visibility_policy_dict()
+        subscription_rows = get_subscriptions_for_send_message(
+            realm_id=realm_id,
+            recipient_id=recipient.id,
+            possible_stream_wildcard_mention=possible_stream_wildcard_mention,
+            topic_participant_user_ids=topic_participant_user_ids,
+            possibly_mentioned_user_ids=possibly_mentioned_user_ids,
+            followed_topic_user_ids={
+                user_id
+                for user_id, visibility_policy in user_id_to_visibility_policy.items()
+                if visibility_policy == UserTopic.VisibilityPolicy.FOLLOWED
+            },
         )
 
         message_to_user_id_set = set()
         for row in subscription_rows:
-            message_to_user_id_set.add(row["user_profile_id"])
+            message_to_user_id_set.add(row.user_profile_id)
             # We store the 'sender_muted_stream' information here to avoid db query at
             # a later stage when we perform automatically unmute topic in muted stream operation.
-            if row["user_profile_id"] == sender_id:
-                sender_muted_stream = row["is_muted"]
-
-        user_id_to_visibility_policy = stream_topic.user_id_to_visibility_policy_dict()
+            if row.user_profile_id == sender_id:
+                sender_muted_stream = row.is_muted
 
         def notification_recipients(
             setting: str, *, channel_specific_setting_overrides_mute: bool = False
         ) -> set[int]:
             return {
-                row["user_profile_id"]
+                row.user_profile_id
                 for row in subscription_rows
                 if user_allows_notifications_in_StreamTopic(
-                    row["is_muted"],
+                    row.is_muted,
                     user_id_to_visibility_policy.get(
-                        row["user_profile_id"], UserTopic.VisibilityPolicy.INHERIT
+                        row.user_profile_id, UserTopic.VisibilityPolicy.INHERIT
                     ),
-                    row[setting],
-                    row["user_profile_" + setting],
+                    getattr(row, setting),
+                    getattr(row, "user_profile_" + setting),
                     channel_specific_setting_overrides_mute,
                 )
             }
@@ -360,13 +335,13 @@ def get_recipient_info(
 
         def followed_topic_notification_recipients(setting: str) -> set[int]:
             return {
-                row["user_profile_id"]
+                row.user_profile_id
                 for row in subscription_rows
                 if user_id_to_visibility_policy.get(
-                    row["user_profile_id"], UserTopic.VisibilityPolicy.INHERIT
+                    row.user_profile_id, UserTopic.VisibilityPolicy.INHERIT
                 )
                 == UserTopic.VisibilityPolicy.FOLLOWED
-                and row["followed_topic_" + setting]
+                and getattr(row, "followed_topic_" + setting)
             }
 
         followed_topic_email_user_ids = followed_topic_notification_recipients(
@@ -785,7 +760,9 @@ def create_user_messages(
     mark_as_read_user_ids: set[int],
     limit_unread_user_ids: set[int] | None,
     topic_participant_user_ids: set[int],
-) -> list[UserMessageLite]:
+) -> tuple[list[int], list[int]]:
+    """Returns the user IDs to create UserMessage rows for, and the
+    flags of each row."""
     # These properties on the Message are set via
     # render_message_markdown by code in the Markdown inline patterns
     ids_with_alert_words = rendering_result.user_ids_with_alert_words
@@ -797,6 +774,27 @@ def create_user_messages(
     if message.recipient.type in [Recipient.DIRECT_MESSAGE_GROUP, Recipient.PERSONAL]:
         base_flags |= UserMessage.flags.is_private
 
+    # Rather than checking every recipient's membership in each of
+    # the sets below, we use set operations, which run in C, to find
+    # the (usually few) recipients that need flags beyond base_flags.
+    extra_flags: dict[int, int] = defaultdict(int)
+
+    def add_flag(user_ids: Iterable[int], flag: int) -> None:
+        for user_id in user_ids:
+            extra_flags[user_id] |= flag
+
+    read_user_ids = um_eligible_user_ids & mark_as_read_user_ids
+    if limit_unread_user_ids is not None:
+        read_user_ids |= um_eligible_user_ids - limit_unread_user_ids
+    add_flag(read_user_ids, UserMessage.flags.read.mask)
+    add_flag(um_eligible_user_ids & mentioned_user_ids, UserMessage.flags.mentioned.mask)
+    add_flag(um_eligible_user_ids & ids_with_alert_words, UserMessage.flags.has_alert_word.mask)
+    if rendering_result.mentions_topic_wildcard:
+        add_flag(
+            um_eligible_user_ids & topic_participant_user_ids,
+            UserMessage.flags.topic_wildcard_mentioned.mask,
+        )
+
     # For long_term_idle (aka soft-deactivated) users, we are allowed
     # to optimize by lazily not creating UserMessage rows that would
     # have the default 0 flag set (since the soft-reactivation logic
@@ -816,42 +814,21 @@ def create_user_messages(
     #
     # See https://zulip.readthedocs.io/en/latest/subsystems/sending-messages.html#soft-deactivation
     # for details on this system.
-    user_messages = []
-    for user_profile_id in um_eligible_user_ids:
-        flags = base_flags
-        if user_profile_id in mark_as_read_user_ids or (
-            limit_unread_user_ids is not None and user_profile_id not in limit_unread_user_ids
-        ):
-            flags |= UserMessage.flags.read
-        if user_profile_id in mentioned_user_ids:
-            flags |= UserMessage.flags.mentioned
-        if user_profile_id in ids_with_alert_words:
-            flags |= UserMessage.flags.has_alert_word
-        if (
-            rendering_result.mentions_topic_wildcard
-            and user_profile_id in topic_participant_user_ids
-        ):
-            flags |= UserMessage.flags.topic_wildcard_mentioned
-
-        if (
-            user_profile_id in long_term_idle_user_ids
-            and user_profile_id not in stream_push_user_ids
-            and user_profile_id not in stream_email_user_ids
-            and user_profile_id not in followed_topic_push_user_ids
-            and user_profile_id not in followed_topic_email_user_ids
-            and is_stream_message
-            and int(flags) == 0
-        ):
-            continue
-
-        um = UserMessageLite(
-            user_profile_id=user_profile_id,
-            message_id=message.id,
-            flags=flags,
+    excluded_user_ids = set(extra_flags)
+    if is_stream_message and base_flags == 0:
+        excluded_user_ids |= set(um_eligible_user_ids & long_term_idle_user_ids).difference(
+            stream_push_user_ids,
+            stream_email_user_ids,
+            followed_topic_push_user_ids,
+            followed_topic_email_user_ids,
         )
-        user_messages.append(um)
 
-    return user_messages
+    # Recipients with no flags beyond base_flags, followed by the rest.
+    um_user_ids = list(um_eligible_user_ids - excluded_user_ids)
+    um_flags = [base_flags] * len(um_user_ids)
+    um_user_ids.extend(extra_flags.keys())
+    um_flags.extend(base_flags | flags for flags in extra_flags.values())
+    return um_user_ids, um_flags
 
 
 def filter_presence_idle_user_ids(user_ids: set[int]) -> list[int]:
@@ -920,9 +897,6 @@ def do_send_messages(
         if send_request is not None
     ]
 
-    # Save the message receipts in the database
-    user_message_flags: dict[int, dict[int, list[str]]] = defaultdict(dict)
-
     Message.objects.bulk_create(send_request.message for send_request in send_message_requests)
 
     # Claim attachments in message
@@ -958,7 +932,237 @@ def do_send_messages(
 
             send_request.message.save(update_fields=update_fields)
 
-    ums: list[UserMessageLite] = []
+    # Sender automatically follows or unmutes the topic depending on
+    # 'automatically_follow_topics_policy' and
+    # 'automatically_unmute_topics_in_muted_streams_policy' user settings.
+    for send_request in send_message_requests:
+        if send_request.message.is_channel_message:
+            if send_request.stream is None:
+                stream_id = send_request.message.recipient.type_id
+                send_request.stream = Stream.objects.get(id=stream_id)
+            # assert needed because stubs for django are missing
+            assert send_request.stream is not None
+            sender = send_request.message.sender
+
+            # Determine and set the visibility_policy depending on 'automatically_follow_topics_policy'
+            # and 'automatically_unmute_topics_in_muted_streams_policy'.
+            if set_visibility_policy_possible(sender, send_request.message) and not (
+                sender.automatically_follow_topics_policy
+                == sender.automatically_unmute_topics_in_muted_streams_policy
+                == UserProfile.AUTOMATICALLY_CHANGE_VISIBILITY_POLICY_NEVER
+            ):
+                try:
+                    user_topic = UserTopic.objects.get(
+                        user_profile=sender,
+                        stream_id=send_request.stream.id,
+                        topic_name__iexact=send_request.message.topic_name(),
+                    )
+                    visibility_policy = user_topic.visibility_policy
+                except UserTopic.DoesNotExist:
+                    visibility_policy = UserTopic.VisibilityPolicy.INHERIT
+
+                new_visibility_policy = visibility_policy_for_send_message(
+                    sender,
+                    send_request.message,
+                    send_request.stream,
+                    send_request.sender_muted_stream,
+                    visibility_policy,
+                )
+                if new_visibility_policy:
+                    do_set_user_topic_visibility_policy(
+                        user_profile=sender,
+                        stream=send_request.stream,
+                        topic_name=send_request.message.topic_name(),
+                        visibility_policy=new_visibility_policy,
+                    )
+                    send_request.automatic_new_visibility_policy = new_visibility_policy
+
+    fan_out_requests: list[SendMessageRequest] = []
+    for send_request in send_message_requests:
+        if use_message_fanout_queue(send_request):
+            # The queued event carries the final set of users for whom
+            # the message is marked as read.
+            send_request.muted_sender_user_ids.update(mark_as_read)
+            queue_event_on_commit("message_fanout", get_message_fanout_event(send_request))
+        else:
+            fan_out_requests.append(send_request)
+
+    fan_out_messages(fan_out_requests, mark_as_read=mark_as_read)
+
+    sent_message_results = [
+        SentMessageResult(
+            message_id=send_request.message.id,
+            automatic_new_visibility_policy=send_request.automatic_new_visibility_policy,
+        )
+        for send_request in send_message_requests
+    ]
+    return sent_message_results
+
+
+def use_message_fanout_queue(send_request: SendMessageRequest) -> bool:
+    """Whether the UserMessage rows, notifications, and events for
+    this message should be created by the message_fanout queue
+    worker, rather than before the request that sent it returns.
+    """
+    min_recipients = settings.MESSAGE_FANOUT_QUEUE_MIN_RECIPIENTS
+    return (
+        min_recipients is not None
+        and send_request.message.is_channel_message
+        and len(send_request.um_eligible_user_ids) >= min_recipients
+        # These are not passed to the message_fanout queue.
+        and send_request.limit_unread_user_ids is None
+        and send_request.recipients_for_user_creation_events is None
+        and send_request.widget_content is None
+    )
+
+
+# The sets of user IDs in a SendMessageRequest that are needed to fan
+# out the message, and are thus passed to the message_fanout queue.
+MESSAGE_FANOUT_USER_ID_SET_FIELDS = [
+    "active_user_ids",
+    "online_push_user_ids",
+    "dm_mention_push_disabled_user_ids",
+    "dm_mention_email_disabled_user_ids",
+    "stream_push_user_ids",
+    "stream_email_user_ids",
+    "followed_topic_push_user_ids",
+    "followed_topic_email_user_ids",
+    "muted_sender_user_ids",
+    "um_eligible_user_ids",
+    "long_term_idle_user_ids",
+    "default_bot_user_ids",
+    "all_bot_user_ids",
+    "push_device_registered_user_ids",
+    "topic_wildcard_mention_user_ids",
+    "stream_wildcard_mention_user_ids",
+    "topic_wildcard_mention_in_followed_topic_user_ids",
+    "stream_wildcard_mention_in_followed_topic_user_ids",
+    "topic_participant_user_ids",
+]
+
+
+def get_message_fanout_event(send_request: SendMessageRequest) -> dict[str, Any]:
+    rendering_result = send_request.rendering_result
+    event: dict[str, Any] = dict(
+        message_id=send_request.message.id,
+        recipient_id=send_request.message.recipient_id,
+        local_id=send_request.local_id,
+        sender_queue_id=send_request.sender_queue_id,
+        mentioned_user_groups_map=list(send_request.mentioned_user_groups_map.items()),
+        service_bot_tuples=send_request.service_bot_tuples,
+        links_for_embed=list(send_request.links_for_embed),
+        disable_external_notifications=send_request.disable_external_notifications,
+        mentions_topic_wildcard=rendering_result.mentions_topic_wildcard,
+        mentions_stream_wildcard=rendering_result.mentions_stream_wildcard,
+        mentions_user_ids=list(rendering_result.mentions_user_ids),
+        user_ids_with_alert_words=list(rendering_result.user_ids_with_alert_words),
+    )
+    for field_name in MESSAGE_FANOUT_USER_ID_SET_FIELDS:
+        event[field_name] = list(getattr(send_request, field_name))
+    return event
+
+
+@transaction.atomic(savepoint=False)
+def do_fan_out_queued_messages(events: Sequence[Mapping[str, Any]]) -> None:
+    """Called by the message_fanout queue worker with events from
+    get_message_fanout_event."""
+    messages = Message.objects.select_related("sender", "recipient", "realm").in_bulk(
+        [event["message_id"] for event in events]
+    )
+    streams = Stream.objects.in_bulk([message.recipient.type_id for message in messages.values()])
+
+    send_message_requests = []
+    for event in events:
+        message = messages.get(event["message_id"])
+        if message is None:
+            # The message was deleted before we got to it.
+            continue
+        # TODO/compatibility: Events queued before recipient_id was
+        # added to them lack it.
+        if message.recipient_id != event.get("recipient_id", message.recipient_id):
+            # The message was moved to another channel before we got
+            # to it; the recipients we were sent are those of the old
+            # channel, and the move already gave the new channel's
+            # subscribers access to it.
+            continue
+        assert message.rendered_content is not None
+        rendering_result = MessageRenderingResult(
+            rendered_content=message.rendered_content,
+            mentions_topic_wildcard=event["mentions_topic_wildcard"],
+            mentions_stream_wildcard=event["mentions_stream_wildcard"],
+            mentions_user_ids=set(event["mentions_user_ids"]),
+            mentions_user_group_ids=set(),
+            alert_words=set(),
+            links_for_preview=set(),
+            user_ids_with_alert_words=set(event["user_ids_with_alert_words"]),
+            potential_attachment_path_ids=[],
+            thumbnail_spinners=set(),
+        )
+        send_message_requests.append(
+            SendMessageRequest(
+                message=message,
+                rendering_result=rendering_result,
+                stream=streams[message.recipient.type_id],
+                sender_muted_stream=None,
+                local_id=event["local_id"],
+                sender_queue_id=event["sender_queue_id"],
+                realm=message.realm,
+                mention_data=None,
+                mentioned_user_groups_map=dict(event["mentioned_user_groups_map"]),
+                service_bot_tuples=[
+                    (bot_id, bot_type) for bot_id, bot_type in event["service_bot_tuples"]
+                ],
+                links_for_embed=set(event["links_for_embed"]),
+                widget_content=None,
+                disable_external_notifications=event["disable_external_notifications"],
+                active_user_ids=set(event["active_user_ids"]),
+                online_push_user_ids=set(event["online_push_user_ids"]),
+                dm_mention_push_disabled_user_ids=set(event["dm_mention_push_disabled_user_ids"]),
+                dm_mention_email_disabled_user_ids=set(event["dm_mention_email_disabled_user_ids"]),
+                stream_push_user_ids=set(event["stream_push_user_ids"]),
+                stream_email_user_ids=set(event["stream_email_user_ids"]),
+                followed_topic_push_user_ids=set(event["followed_topic_push_user_ids"]),
+                followed_topic_email_user_ids=set(event["followed_topic_email_user_ids"]),
+                muted_sender_user_ids=set(event["muted_sender_user_ids"]),
+                um_eligible_user_ids=set(event["um_eligible_user_ids"]),
+                long_term_idle_user_ids=set(event["long_term_idle_user_ids"]),
+                default_bot_user_ids=set(event["default_bot_user_ids"]),
+                all_bot_user_ids=set(event["all_bot_user_ids"]),
+                push_device_registered_user_ids=set(event["push_device_registered_user_ids"]),
+                topic_wildcard_mention_user_ids=set(event["topic_wildcard_mention_user_ids"]),
+                stream_wildcard_mention_user_ids=set(event["stream_wildcard_mention_user_ids"]),
+                topic_wildcard_mention_in_followed_topic_user_ids=set(
+                    event["topic_wildcard_mention_in_followed_topic_user_ids"]
+                ),
+                stream_wildcard_mention_in_followed_topic_user_ids=set(
+                    event["stream_wildcard_mention_in_followed_topic_user_ids"]
+                ),
+                topic_participant_user_ids=set(event["topic_participant_user_ids"]),
+            )
+        )
+
+    fan_out_messages(send_message_requests, queued=True)
+
+
+def fan_out_messages(
+    send_message_requests: Sequence[SendMessageRequest],
+    *,
+    mark_as_read: Sequence[int] = [],
+    queued: bool = False,
+) -> None:
+    """Creates the UserMessage rows for newly saved messages, and
+    notifies the rest of the Zulip system about them.  Called by
+    do_send_messages, or for messages to very large channels, by the
+    message_fanout queue worker (with queued=True); see
+    use_message_fanout_queue.
+    """
+    # Save the message receipts in the database
+    user_message_flags: dict[int, dict[int, list[str]]] = defaultdict(dict)
+
+    # The UserMessage rows to create, as a list for each column.
+    um_user_profile_ids: list[int] = []
+    um_message_ids: list[int] = []
+    um_flags: list[int] = []
     for send_request in send_message_requests:
         # Service bots (outgoing webhook bots and embedded bots) don't store UserMessage rows;
         # they will be processed later.
@@ -968,7 +1172,7 @@ def do_send_messages(
         mark_as_read_user_ids = send_request.muted_sender_user_ids
         mark_as_read_user_ids.update(mark_as_read)
 
-        user_messages = create_user_messages(
+        message_um_user_ids, message_um_flags = create_user_messages(
             message=send_request.message,
             rendering_result=send_request.rendering_result,
             um_eligible_user_ids=send_request.um_eligible_user_ids,
@@ -983,10 +1187,18 @@ def do_send_messages(
             topic_participant_user_ids=send_request.topic_participant_user_ids,
         )
 
-        for um in user_messages:
-            user_message_flags[send_request.message.id][um.user_profile_id] = um.flags_list()
+        # Most rows share one of a few flag values, so we only
+        # convert each distinct value to a list of flag names once.
+        flags_lists: dict[int, list[str]] = {}
+        message_user_flags = user_message_flags[send_request.message.id]
+        for user_profile_id, flags in zip(message_um_user_ids, message_um_flags, strict=True):
+            if flags not in flags_lists:
+                flags_lists[flags] = UserMessage.flags_list_for_flags(flags)
+            message_user_flags[user_profile_id] = flags_lists[flags]
 
-        ums.extend(user_messages)
+        um_user_profile_ids.extend(message_um_user_ids)
+        um_message_ids.extend([send_request.message.id] * len(message_um_user_ids))
+        um_flags.extend(message_um_flags)
 
         send_request.service_queue_events = get_service_bot_events(
             sender=send_request.message.sender,
@@ -996,15 +1208,30 @@ def do_send_messages(
             recipient_type=send_request.message.recipient.type,
         )
 
-    bulk_insert_ums(ums)
+    bulk_insert_um_columns(um_user_profile_ids, um_message_ids, um_flags)
+
+    if queued:
+        # The message_fanout queue creates UserMessage rows after
+        # later messages' rows, so these unread messages may be older
+        # than a recipient's cached first unread anchor.  Rows created
+        # while sending the message need no flush, since only anchors
+        # older than any send transaction are cached (see
+        # FIRST_UNREAD_ANCHOR_MIN_AGE).
+        unread_user_ids = {
+            user_profile_id
+            for user_profile_id, flags in zip(um_user_profile_ids, um_flags, strict=True)
+            if not flags & UserMessage.flags.read.mask
+        }
+        if unread_user_ids:
+            transaction.on_commit(lambda: flush_first_unread_anchors(unread_user_ids))
 
     for send_request in send_message_requests:
         do_widget_post_save_actions(send_request)
 
+    set_new_message_dict_versions(send_request.message.id for send_request in send_message_requests)
+
     # This next loop is responsible for notifying other parts of the
     # Zulip system about the messages we just committed to the database:
-    # * Sender automatically follows or unmutes the topic depending on 'automatically_follow_topics_policy'
-    #   and 'automatically_unmute_topics_in_muted_streams_policy' user settings.
     # * Notifying clients via send_event_on_commit
     # * Triggering outgoing webhooks via the service event queue.
     # * Updating the `first_message_id` field for streams without any message history.
@@ -1013,46 +1240,9 @@ def do_send_messages(
     for send_request in send_message_requests:
         realm_id: int | None = None
         if send_request.message.is_channel_message:
-            if send_request.stream is None:
-                stream_id = send_request.message.recipient.type_id
-                send_request.stream = Stream.objects.get(id=stream_id)
             # assert needed because stubs for django are missing
             assert send_request.stream is not None
             realm_id = send_request.stream.realm_id
-            sender = send_request.message.sender
-
-            # Determine and set the visibility_policy depending on 'automatically_follow_topics_policy'
-            # and 'automatically_unmute_topics_in_muted_streams_policy'.
-            if set_visibility_policy_possible(sender, send_request.message) and not (
-                sender.automatically_follow_topics_policy
-                == sender.automatically_unmute_topics_in_muted_streams_policy
-                == UserProfile.AUTOMATICALLY_CHANGE_VISIBILITY_POLICY_NEVER
-            ):
-                try:
-                    user_topic = UserTopic.objects.get(
-                        user_profile=sender,
-                        stream_id=send_request.stream.id,
-                        topic_name__iexact=send_request.message.topic_name(),
-                    )
-                    visibility_policy = user_topic.visibility_policy
-                except UserTopic.DoesNotExist:
-                    visibility_policy = UserTopic.VisibilityPolicy.INHERIT
-
-                new_visibility_policy = visibility_policy_for_send_message(
-                    sender,
-                    send_request.message,
-                    send_request.stream,
-                    send_request.sender_muted_stream,
-                    visibility_policy,
-                )
-                if new_visibility_policy:
-                    do_set_user_topic_visibility_policy(
-                        user_profile=sender,
-                        stream=send_request.stream,
-                        topic_name=send_request.message.topic_name(),
-                        visibility_policy=new_visibility_policy,
-                    )
-                    send_request.automatic_new_visibility_policy = new_visibility_policy
 
             # Set the visibility_policy of the users mentioned in the message
             # to "FOLLOWED" if "automatically_follow_topics_where_mentioned" is "True".
@@ -1129,23 +1319,27 @@ def do_send_messages(
             flags: list[str]
             mentioned_user_group_id: int | None
 
-        users: list[UserData] = []
+        # Recipients with no flags and no mentioned user group, which
+        # is most recipients of a message to a large channel, are sent
+        # as just their user ID, to keep the event small.
+        users: list[int | UserData] = []
         for user_id in user_list:
             flags = user_flags.get(user_id, [])
+            mentioned_user_group_id = send_request.mentioned_user_groups_map.get(user_id)
+            if not flags and mentioned_user_group_id is None:
+                users.append(user_id)
+                continue
+
             # TODO/compatibility: The `wildcard_mentioned` flag was deprecated in favor of
             # the `stream_wildcard_mentioned` and `topic_wildcard_mentioned` flags.  The
             # `wildcard_mentioned` flag exists for backwards-compatibility with older
             # clients.  Remove this when we no longer support legacy clients that have not
             # been updated to access `stream_wildcard_mentioned`.
             if "stream_wildcard_mentioned" in flags or "topic_wildcard_mentioned" in flags:
-                flags.append("wildcard_mentioned")
-            user_data: UserData = dict(id=user_id, flags=flags, mentioned_user_group_id=None)
-
-            if user_id in send_request.mentioned_user_groups_map:
-                user_data["mentioned_user_group_id"] = send_request.mentioned_user_groups_map[
-                    user_id
-                ]
-
+                flags = [*flags, "wildcard_mentioned"]
+            user_data: UserData = dict(
+                id=user_id, flags=flags, mentioned_user_group_id=mentioned_user_group_id
+            )
             users.append(user_data)
 
         sender = send_request.message.sender
@@ -1260,7 +1454,9 @@ def do_send_messages(
                 user_ids_who_can_access_sender = get_user_ids_who_can_access_user(
                     send_request.message.sender
                 )
-                user_ids_receiving_event = {user["id"] for user in users}
+                user_ids_receiving_event = {
+                    user if isinstance(user, int) else user["id"] for user in users
+                }
                 user_ids_without_access_to_sender = user_ids_receiving_event - set(
                     user_ids_who_can_access_sender
                 )
@@ -1305,15 +1501,6 @@ def do_send_messages(
                     },
                 )
 
-    sent_message_results = [
-        SentMessageResult(
-            message_id=send_request.message.id,
-            automatic_new_visibility_policy=send_request.automatic_new_visibility_policy,
-        )
-        for send_request in send_message_requests
-    ]
-    return sent_message_results
-
 
 def extract_stream_indicator(s: str) -> str | int:
     # Users can pass stream name as either an id or a name,
@@ -18,7 +18,9 @@ from zerver.lib.cache import (
     cache_delete_many,
     cache_set,
     display_recipient_cache_key,
-    to_dict_cache_key_id,
+    flush_first_unread_anchors,
+    flush_stream_recipient_snapshots,
+    to_dict_cache_keys_to_flush,
 )
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.mention import silent_mention_syntax_for_user, silent_mention_syntax_for_user_group
@@ -268,7 +270,7 @@ def do_unarchive_stream(stream: Stream, new_name: str, *, acting_user: UserProfi
         recipient_id=stream.recipient_id,
     ).only("id")
     transaction.on_commit(
-        lambda: cache_delete_many(to_dict_cache_key_id(message.id) for message in messages)
+        lambda: cache_delete_many(to_dict_cache_keys_to_flush(message.id for message in messages))
     )
 
     # Unset the is_web_public and is_realm_public cache on attachments,
@@ -325,7 +327,7 @@ def bulk_delete_cache_keys(message_ids_to_clear: list[int]) -> None:
     while len(message_ids_to_clear) > 0:
         batch = message_ids_to_clear[0:5000]
 
-        keys_to_delete = [to_dict_cache_key_id(message_id) for message_id in batch]
+        keys_to_delete = list(to_dict_cache_keys_to_flush(batch))
         cache_delete_many(keys_to_delete)
 
         message_ids_to_clear = message_ids_to_clear[5000:]
@@ -511,6 +513,9 @@ def bulk_add_subs_to_db_with_logging(
     Subscription.objects.bulk_create(info.sub for info in subs_to_add)
     sub_ids = [info.sub.id for info in subs_to_activate]
     Subscription.objects.filter(id__in=sub_ids).update(active=True)
+    flush_stream_recipient_snapshots(
+        {info.sub.recipient_id for info in [*subs_to_add, *subs_to_activate]}
+    )
 
     # Log subscription activities in RealmAuditLog
     event_time = timezone_now()
@@ -1134,6 +1139,9 @@ def bulk_remove_subscriptions(
         Subscription.objects.filter(
             id__in=sub_ids_to_deactivate,
         ).update(active=False)
+        flush_stream_recipient_snapshots(
+            {sub_info.sub.recipient_id for sub_info in subs_to_deactivate}
+        )
         bulk_update_subscriber_counts(direction=-1, streams=subscriber_count_changes)
 
         # Log subscription activities in RealmAuditLog
@@ -1228,6 +1236,7 @@ def do_change_subscription_property(
         )
 
         send_event_on_commit(user_profile.realm, in_home_view_event, [user_profile.id])
+        transaction.on_commit(lambda: flush_first_unread_anchors([user_profile.id]))
 
     event = dict(
         type="subscription",
@@ -1525,7 +1534,7 @@ def do_rename_stream(stream: Stream, new_name: str, user_profile: UserProfile) -
     # clearer than trying to set them. display_recipient is the out of
     # date field in all cases.
     transaction.on_commit(
-        lambda: cache_delete_many(to_dict_cache_key_id(message.id) for message in messages)
+        lambda: cache_delete_many(to_dict_cache_keys_to_flush(message.id for message in messages))
     )
 
     # We want to key these updates by id, not name, since id is
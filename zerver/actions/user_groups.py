@@ -7,6 +7,7 @@ from django.db import transaction
 from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
 
+from zerver.lib.cache import flush_realm_mention_data
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.stream_subscription import get_user_ids_for_streams
 from zerver.lib.stream_traffic import get_streams_traffic
@@ -347,6 +348,7 @@ def bulk_add_members_to_user_groups(
         for user_group in user_groups
     ]
     UserGroupMembership.objects.bulk_create(memberships)
+    flush_realm_mention_data(realm.id)
     now = timezone_now()
     RealmAuditLog.objects.bulk_create(
         RealmAuditLog(
@@ -420,6 +422,7 @@ def bulk_remove_members_from_user_groups(
     UserGroupMembership.objects.filter(
         user_group__in=user_groups, user_profile_id__in=user_profile_ids
     ).delete()
+    flush_realm_mention_data(realm.id)
     now = timezone_now()
     RealmAuditLog.objects.bulk_create(
         RealmAuditLog(
@@ -479,6 +482,7 @@ def add_subgroups_to_user_group(
         GroupGroupMembership(supergroup=user_group, subgroup=subgroup) for subgroup in subgroups
     ]
     GroupGroupMembership.objects.bulk_create(group_memberships)
+    flush_realm_mention_data(realm.id)
 
     subgroup_ids = [subgroup.id for subgroup in subgroups]
     now = timezone_now()
@@ -554,6 +558,7 @@ def remove_subgroups_from_user_group(
     old_stream_metadata_user_ids = bulk_can_access_stream_metadata_user_ids(streams)
 
     GroupGroupMembership.objects.filter(supergroup=user_group, subgroup__in=subgroups).delete()
+    flush_realm_mention_data(realm.id)
 
     subgroup_ids = [subgroup.id for subgroup in subgroups]
     now = timezone_now()
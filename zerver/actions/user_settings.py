@@ -16,6 +16,8 @@ from zerver.lib.cache import (
     bulk_flush_users,
     cache_delete,
     delete_user_profile_caches,
+    flush_user_stream_recipient_snapshots,
+    stream_recipient_snapshot_user_fields,
     user_profile_by_api_key_cache_key,
 )
 from zerver.lib.create_user import get_display_email_address
@@ -499,6 +501,8 @@ def bulk_change_user_setting(
         )
 
     UserProfile.objects.bulk_update(user_profiles, [setting_name])
+    if setting_name in stream_recipient_snapshot_user_fields:
+        flush_user_stream_recipient_snapshots(user_profiles)
     RealmAuditLog.objects.bulk_create(audit_logs)
 
     # Disabling digest emails should clear a user's email queue
@@ -4,6 +4,7 @@ from typing import Any
 from django.db import transaction
 from django.utils.timezone import now as timezone_now
 
+from zerver.lib.cache import flush_first_unread_anchors
 from zerver.lib.timestamp import datetime_to_timestamp
 from zerver.lib.topic import maybe_rename_general_chat_to_empty_topic
 from zerver.lib.user_topics import (
@@ -44,6 +45,14 @@ def bulk_do_set_user_topic_visibility_policy(
     if len(user_profiles_with_changed_user_topic_rows) == 0:
         return
 
+    # Muting or unmuting a topic changes which of its messages can be
+    # the first unread message in these users' narrows.
+    transaction.on_commit(
+        lambda: flush_first_unread_anchors(
+            user_profile.id for user_profile in user_profiles_with_changed_user_topic_rows
+        )
+    )
+
     for user_profile in user_profiles_with_changed_user_topic_rows:
         # This first muted_topics event is deprecated and will be removed
         # once clients are migrated to handle the user_topic event type
@@ -977,6 +977,10 @@ def internal_api_view(
             if not is_tornado_view and is_tornado_request:
                 raise RuntimeError("Django notify view called with Tornado handler")
             request_notes.requester_for_logs = "internal"
+            if request_notes.saved_response is not None:
+                # The view returned an AsynchronousResponse, and this
+                # is Tornado finishing the request; see zulip_finish.
+                return request_notes.saved_response
             return view_func(request, *args, **kwargs)
 
         return _wrapped_func_arguments
@@ -1,23 +1,33 @@
+import secrets
 from collections.abc import Iterable
+from dataclasses import dataclass, field
 
 import ahocorasick
 from django.db import transaction
+from django.db.models import QuerySet
 from django.db.models.functions import Lower
+from typing_extensions import override
 
 from zerver.lib.cache import (
+    cache_delete,
+    cache_get,
+    cache_get_many,
+    cache_incr,
+    cache_set,
     cache_with_key,
     realm_alert_words_automaton_cache_key,
+    realm_alert_words_automaton_version_cache_key,
     realm_alert_words_cache_key,
 )
+from zerver.lib.notes import BaseNotes
 from zerver.models import AlertWord, Realm, UserProfile
-from zerver.models.alert_words import flush_realm_alert_words
 
 
-@cache_with_key(lambda realm: realm_alert_words_cache_key(realm.id), timeout=3600 * 24)
-def alert_words_in_realm(realm: Realm) -> dict[int, list[str]]:
-    user_ids_and_words = AlertWord.objects.filter(realm=realm, user_profile__is_active=True).values(
-        "user_profile_id", "word"
-    )
+@cache_with_key(realm_alert_words_cache_key, timeout=3600 * 24)
+def alert_words_in_realm(realm_id: int) -> dict[int, list[str]]:
+    user_ids_and_words = AlertWord.objects.filter(
+        realm_id=realm_id, user_profile__is_active=True
+    ).values("user_profile_id", "word")
     user_ids_with_words: dict[int, list[str]] = {}
     for id_and_word in user_ids_and_words:
         user_ids_with_words.setdefault(id_and_word["user_profile_id"], [])
@@ -25,28 +35,139 @@ def alert_words_in_realm(realm: Realm) -> dict[int, list[str]]:
     return user_ids_with_words
 
 
-@cache_with_key(lambda realm: realm_alert_words_automaton_cache_key(realm.id), timeout=3600 * 24)
-def get_alert_word_automaton(realm: Realm) -> ahocorasick.Automaton:
-    user_id_with_words = alert_words_in_realm(realm)
-    alert_word_automaton = ahocorasick.Automaton()
-    for user_id, alert_words in user_id_with_words.items():
-        for alert_word in alert_words:
-            alert_word_lower = alert_word.lower()
-            if alert_word_automaton.exists(alert_word_lower):
-                (_key, user_ids_for_alert_word) = alert_word_automaton.get(alert_word_lower)
-                user_ids_for_alert_word.add(user_id)
-            else:
-                alert_word_automaton.add_word(alert_word_lower, (alert_word_lower, {user_id}))
+def add_alert_word_to_automaton(
+    alert_word_automaton: ahocorasick.Automaton, user_id: int, alert_word: str
+) -> None:
+    alert_word_lower = alert_word.lower()
+    if alert_word_automaton.exists(alert_word_lower):
+        (_key, user_ids_for_alert_word) = alert_word_automaton.get(alert_word_lower)
+        user_ids_for_alert_word.add(user_id)
+    else:
+        alert_word_automaton.add_word(alert_word_lower, (alert_word_lower, {user_id}))
+
+
+def remove_alert_word_from_automaton(
+    alert_word_automaton: ahocorasick.Automaton, user_id: int, alert_word: str
+) -> None:
+    alert_word_lower = alert_word.lower()
+    if alert_word_automaton.exists(alert_word_lower):
+        (_key, user_ids_for_alert_word) = alert_word_automaton.get(alert_word_lower)
+        user_ids_for_alert_word.discard(user_id)
+        if not user_ids_for_alert_word:
+            alert_word_automaton.remove_word(alert_word_lower)
+
+
+def make_alert_word_automaton(
+    alert_word_automaton: ahocorasick.Automaton,
+) -> ahocorasick.Automaton | None:
     alert_word_automaton.make_automaton()
-    # If the kind is not AHOCORASICK after calling make_automaton, it means there is no key present
-    # and hence we cannot call items on the automaton yet. To avoid it we return None for such cases
-    # where there is no alert-words in the realm.
+    # If there are no words in the automaton, we cannot call items on
+    # it, so we return None when there are no alert words in the realm.
     # https://pyahocorasick.readthedocs.io/en/latest/#make-automaton
-    if alert_word_automaton.kind != ahocorasick.AHOCORASICK:
+    if len(alert_word_automaton) == 0:
         return None
     return alert_word_automaton
 
 
+# The realm's automaton is cached along with a version number, which
+# is incremented atomically for each change to the realm's alert
+# words; the cached automaton is only used if its version is current.
+# This lets a change to one user's alert words update the cached
+# automaton in place, rather than having the next message sent in the
+# realm rebuild it from every alert word in the realm, while
+# concurrent changes safely fall back to such a rebuild.
+def get_alert_word_automaton(realm: Realm) -> ahocorasick.Automaton | None:
+    version_key = realm_alert_words_automaton_version_cache_key(realm.id)
+    automaton_key = realm_alert_words_automaton_cache_key(realm.id)
+    cached = cache_get_many([version_key, automaton_key])
+    version = cached.get(version_key)
+    if version is None:
+        # We start from a random version, so that an automaton cached
+        # before the version was evicted is never taken to be current.
+        version = secrets.randbits(62)
+        cache_set(version_key, version, timeout=3600 * 24, pickled_tupled=False)
+    elif automaton_key in cached:
+        (cached_version, alert_word_automaton) = cached[automaton_key][0]
+        if cached_version == version:
+            return alert_word_automaton
+
+    alert_word_automaton = ahocorasick.Automaton()
+    for user_id, alert_words in alert_words_in_realm(realm.id).items():
+        for alert_word in alert_words:
+            add_alert_word_to_automaton(alert_word_automaton, user_id, alert_word)
+    alert_word_automaton = make_alert_word_automaton(alert_word_automaton)
+    cache_set(automaton_key, (version, alert_word_automaton), timeout=3600 * 24)
+    return alert_word_automaton
+
+
+class AlertWordAutomatonUpdate:
+    """A change to the alert words in a realm, which is applied to
+    the realm's cached automaton once the transaction making it
+    commits.  Until then, another process may cache an automaton
+    without the change, or (within this transaction) with it, so we
+    bump the version immediately, and only accept an automaton cached
+    just before or during the transaction as the base to update; the
+    change is applied idempotently, so either is fine.
+    """
+
+    def __init__(self, realm_id: int) -> None:
+        # The words are added after this is created, so it has to be
+        # before the transaction commits.
+        assert transaction.get_connection().in_atomic_block
+        self.realm_id = realm_id
+        self.added_words: list[tuple[int, str]] = []
+        self.removed_words: list[tuple[int, str]] = []
+        self.base_version = cache_incr(realm_alert_words_automaton_version_cache_key(realm_id))
+        if not self.base_version:
+            # The version was not in the cache; memcached creates it
+            # with a value of 0 in that case, which no cached
+            # automaton uses.
+            cache_delete(realm_alert_words_automaton_cache_key(realm_id))
+        transaction.on_commit(self.apply)
+
+    def apply(self) -> None:
+        version = cache_incr(realm_alert_words_automaton_version_cache_key(self.realm_id))
+        automaton_key = realm_alert_words_automaton_cache_key(self.realm_id)
+        if not self.base_version or version != self.base_version + 1:
+            # The alert words in the realm were changed concurrently,
+            # so we leave the next message sent in the realm to
+            # rebuild it.
+            cache_delete(automaton_key)
+            return
+
+        cached = cache_get(automaton_key)
+        if cached is None:
+            return
+        (cached_version, alert_word_automaton) = cached[0]
+        if cached_version not in (self.base_version - 1, self.base_version):
+            cache_delete(automaton_key)
+            return
+
+        if alert_word_automaton is None:
+            alert_word_automaton = ahocorasick.Automaton()
+        for user_id, alert_word in self.added_words:
+            add_alert_word_to_automaton(alert_word_automaton, user_id, alert_word)
+        for user_id, alert_word in self.removed_words:
+            remove_alert_word_from_automaton(alert_word_automaton, user_id, alert_word)
+        alert_word_automaton = make_alert_word_automaton(alert_word_automaton)
+        cache_set(automaton_key, (version, alert_word_automaton), timeout=3600 * 24)
+
+
+@dataclass
+class AlertWordDeletionNotes(BaseNotes[AlertWord | QuerySet[AlertWord], "AlertWordDeletionNotes"]):
+    """The automaton updates for the alert words removed by one
+    deletion, keyed by the instance or QuerySet being deleted, so
+    that the post_delete signal handler, which is called for each
+    deleted word, updates each realm's cached automaton only once."""
+
+    updates: dict[int, AlertWordAutomatonUpdate] = field(default_factory=dict)
+
+    @classmethod
+    @override
+    def init_notes(cls) -> "AlertWordDeletionNotes":
+        return AlertWordDeletionNotes()
+
+
 def user_alert_words(user_profile: UserProfile) -> list[str]:
     return list(AlertWord.objects.filter(user_profile=user_profile).values_list("word", flat=True))
 
@@ -68,7 +189,11 @@ def add_user_alert_words(user_profile: UserProfile, new_words: Iterable[str]) ->
         for word in word_dict.values()
     )
     # Django bulk_create operations don't flush caches, so we need to do this ourselves.
-    flush_realm_alert_words(user_profile.realm_id)
+    cache_delete(realm_alert_words_cache_key(user_profile.realm_id))
+    if word_dict:
+        AlertWordAutomatonUpdate(user_profile.realm_id).added_words.extend(
+            (user_profile.id, word) for word in word_dict.values()
+        )
 
     return user_alert_words(user_profile)
 
@@ -76,9 +201,9 @@ def add_user_alert_words(user_profile: UserProfile, new_words: Iterable[str]) ->
 @transaction.atomic(savepoint=False)
 def remove_user_alert_words(user_profile: UserProfile, delete_words: Iterable[str]) -> list[str]:
     delete_words_lower = [word.lower() for word in delete_words]
+    # The post_delete signal handler updates the caches.
     AlertWord.objects.annotate(word_lower=Lower("word")).filter(
         user_profile=user_profile,
         word_lower__in=delete_words_lower,
     ).delete()
-    flush_realm_alert_words(user_profile.realm_id)
     return user_alert_words(user_profile)
@@ -16,6 +16,7 @@ from bmemcached.exceptions import MemcachedException
 from django.conf import settings
 from django.core.cache import caches
 from django.core.cache.backends.base import BaseCache
+from django.db import transaction
 from django.db.models import Q, QuerySet
 from typing_extensions import ParamSpec
 
@@ -24,7 +25,16 @@ from scripts.lib.zulip_tools import DEPLOYMENTS_DIR, get_recent_deployments
 if TYPE_CHECKING:
     # These modules have to be imported for type annotations but
     # they cannot be imported at runtime due to cyclic dependency.
-    from zerver.models import Attachment, Message, MutedUser, Realm, Stream, SubMessage, UserProfile
+    from zerver.models import (
+        Attachment,
+        Message,
+        MutedUser,
+        Realm,
+        Stream,
+        SubMessage,
+        Subscription,
+        UserProfile,
+    )
 
 MEMCACHED_MAX_KEY_LENGTH = 250
 
@@ -267,6 +277,21 @@ def cache_get(key: str, cache_name: str | None = None) -> Any:
     return ret
 
 
+def cache_incr(key: str, cache_name: str | None = None) -> int | None:
+    """Atomically increments an integer stored with
+    pickled_tupled=False, returning None if the key is missing."""
+    final_key = KEY_PREFIX + key
+    validate_cache_key(final_key)
+
+    remote_cache_stats_start()
+    try:
+        return get_cache_backend(cache_name).incr(final_key)
+    except ValueError:
+        return None
+    finally:
+        remote_cache_stats_finish()
+
+
 def cache_get_many(keys: list[str], cache_name: str | None = None) -> dict[str, Any]:
     keys = [KEY_PREFIX + key for key in keys]
     for key in keys:
@@ -588,6 +613,43 @@ def bot_dicts_in_realm_cache_key(realm_id: int) -> str:
     return f"bot_dicts_in_realm:{realm_id}"
 
 
+# UserProfile fields included in the channel recipient snapshots used
+# when sending messages; see get_stream_recipient_snapshot.
+stream_recipient_snapshot_user_fields: list[str] = [
+    "is_active",
+    "long_term_idle",
+    "enable_stream_push_notifications",
+    "enable_stream_email_notifications",
+    "wildcard_mentions_notify",
+    "enable_followed_topic_push_notifications",
+    "enable_followed_topic_email_notifications",
+    "enable_followed_topic_wildcard_mentions_notify",
+]
+
+
+def stream_recipient_snapshot_cache_key(recipient_id: int) -> str:
+    return f"stream_recipient_snapshot:{recipient_id}"
+
+
+def flush_stream_recipient_snapshots(recipient_ids: Iterable[int]) -> None:
+    keys = [stream_recipient_snapshot_cache_key(rid) for rid in recipient_ids]
+    cache_delete_many(keys)
+    # Until our transaction commits, another process may cache a
+    # snapshot from before the change, so we flush again afterwards.
+    transaction.on_commit(lambda: cache_delete_many(keys))
+
+
+def flush_user_stream_recipient_snapshots(user_profiles: Iterable["UserProfile"]) -> None:
+    # We need to import here to avoid cyclic dependency.
+    from zerver.models import Recipient, Subscription
+
+    flush_stream_recipient_snapshots(
+        Subscription.objects.filter(
+            user_profile__in=user_profiles, recipient__type=Recipient.STREAM
+        ).values_list("recipient_id", flat=True)
+    )
+
+
 def delete_user_profile_caches(user_profiles: Iterable["UserProfile"], realm_id: int) -> None:
     # Imported here to avoid cyclic dependency.
     from zerver.models.users import is_cross_realm_bot_email
@@ -648,6 +710,11 @@ def bulk_flush_users(
     if changed(update_fields, ["role"]):
         cache_keys_to_delete.add(active_non_guest_user_ids_cache_key(realm.id))
 
+    # Role changes move users between the role-based system groups,
+    # whose members mentions of those groups resolve to.
+    if changed(update_fields, ["full_name", "is_active", "role"]):
+        flush_realm_mention_data(realm.id)
+
     # Invalidate our bots_in_realm info dict if any bot has
     # changed the fields in the dict or become (in)active
     if changed(update_fields, bot_dict_fields):
@@ -667,6 +734,7 @@ def flush_user_profile(
     *,
     instance: "UserProfile",
     update_fields: Sequence[str] | None = None,
+    created: bool = False,
     **kwargs: object,
 ) -> None:
     user_profile = instance
@@ -674,6 +742,17 @@ def flush_user_profile(
         user_profiles=[user_profile], realm=user_profile.realm, update_fields=update_fields
     )
 
+    # A newly created user has no subscriptions yet.
+    if not created and changed(update_fields, stream_recipient_snapshot_user_fields):
+        flush_user_stream_recipient_snapshots([user_profile])
+
+
+# Called by models/streams.py whenever we save a Subscription object.
+# Bulk changes to subscriptions need to call
+# flush_stream_recipient_snapshots themselves.
+def flush_subscription(*, instance: "Subscription", **kwargs: object) -> None:
+    flush_stream_recipient_snapshots([instance.recipient_id])
+
 
 def flush_muting_users_cache(*, instance: "MutedUser", **kwargs: object) -> None:
     mute_object = instance
@@ -720,6 +799,58 @@ def realm_alert_words_automaton_cache_key(realm_id: int) -> str:
     return f"realm_alert_words_automaton:{realm_id}"
 
 
+def realm_alert_words_automaton_version_cache_key(realm_id: int) -> str:
+    return f"realm_alert_words_automaton_version:{realm_id}"
+
+
+def realm_mention_data_version_cache_key(realm_id: int) -> str:
+    return f"realm_mention_data_version:{realm_id}"
+
+
+def mention_users_by_name_cache_key(realm_id: int, version: str, full_name: str) -> str:
+    name_hash = hashlib.sha1(full_name.lower().encode()).hexdigest()
+    return f"mention_users_by_name:{realm_id}:{version}:{name_hash}"
+
+
+def mention_user_by_id_cache_key(realm_id: int, version: str, user_id: int) -> str:
+    return f"mention_user_by_id:{realm_id}:{version}:{user_id}"
+
+
+def mention_group_members_cache_key(realm_id: int, version: str, group_id: int) -> str:
+    return f"mention_group_members:{realm_id}:{version}:{group_id}"
+
+
+# Every mention lookup cache entry for a realm is keyed by the realm's
+# current version, so deleting the version invalidates all of them.
+def flush_realm_mention_data(realm_id: int) -> None:
+    version_key = realm_mention_data_version_cache_key(realm_id)
+    cache_delete(version_key)
+    # Until our transaction commits, another process may cache lookups
+    # from before the change under a new version, so we flush again
+    # afterwards.
+    transaction.on_commit(lambda: cache_delete(version_key))
+
+
+def first_unread_anchor_version_cache_key(user_profile_id: int) -> str:
+    return f"first_unread_anchor_version:{user_profile_id}"
+
+
+def first_unread_anchor_cache_key(user_profile_id: int, version: str, query_hash: str) -> str:
+    return f"first_unread_anchor:{user_profile_id}:{version}:{query_hash}"
+
+
+# Cached first unread anchors remain valid as new messages arrive or
+# as messages are marked as read; this must be called whenever an
+# older message could become the first unread message in one of a
+# user's narrows, including when the message_fanout queue worker
+# gives the user a new unread message after later ones.
+def flush_first_unread_anchors(user_profile_ids: Iterable[int]) -> None:
+    cache_delete_many(
+        first_unread_anchor_version_cache_key(user_profile_id)
+        for user_profile_id in user_profile_ids
+    )
+
+
 def realm_rendered_description_cache_key(realm: "Realm") -> str:
     return f"realm_rendered_description:{realm.string_id}"
 
@@ -769,6 +900,24 @@ def to_dict_cache_key(message: "Message", realm_id: int | None = None) -> str:
     return to_dict_cache_key_id(message.id)
 
 
+def to_dict_version_cache_key_id(message_id: int) -> str:
+    return f"message_dict_version:{message_id}"
+
+
+def to_dict_cache_keys_to_flush(message_ids: Iterable[int]) -> Iterator[str]:
+    # Each message's version key, which validates its dict in the
+    # process-local message dict caches, is deleted after the dict
+    # itself, so that a concurrent fetch cannot pair a new version
+    # with the old dict.
+    for message_id in message_ids:
+        yield to_dict_cache_key_id(message_id)
+        yield to_dict_version_cache_key_id(message_id)
+
+
+def rendered_content_cache_key(realm_id: int, rendering_digest: str) -> str:
+    return f"rendered_content:{realm_id}:{rendering_digest}"
+
+
 def open_graph_description_cache_key(content: bytes, request_url: str) -> str:
     return f"open_graph_description_path:{hashlib.sha1(request_url.encode()).hexdigest()}"
 
@@ -783,7 +932,7 @@ def flush_zoom_server_access_token_cache(account_id: str) -> None:
 
 def flush_message(*, instance: "Message", **kwargs: object) -> None:
     message = instance
-    cache_delete(to_dict_cache_key_id(message.id))
+    cache_delete_many(to_dict_cache_keys_to_flush([message.id]))
 
 
 def flush_submessage(*, instance: "SubMessage", **kwargs: object) -> None:
@@ -791,7 +940,7 @@ def flush_submessage(*, instance: "SubMessage", **kwargs: object) -> None:
     # submessages are not cached directly, they are part of their
     # parent messages
     message_id = submessage.message_id
-    cache_delete(to_dict_cache_key_id(message_id))
+    cache_delete_many(to_dict_cache_keys_to_flush([message_id]))
 
 
 class IgnoreUnhashableLruCacheWrapper(Generic[ParamT, ReturnT]):
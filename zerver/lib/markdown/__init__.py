@@ -1,10 +1,11 @@
 # Zulip's main Markdown implementation.  See docs/subsystems/markdown.md for
 # detailed documentation on our Markdown syntax.
+import hashlib
 import logging
 import re
 import time
 from collections import deque
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from email.message import EmailMessage
@@ -25,6 +26,7 @@ import markdown.postprocessors
 import markdown.preprocessors
 import markdown.treeprocessors
 import markdown.util
+import orjson
 import re2
 import regex
 import requests
@@ -37,6 +39,7 @@ from tlds import tld_set
 from typing_extensions import NotRequired, Self, override
 
 from zerver.lib import mention
+from zerver.lib.cache import cache_get, cache_set, rendered_content_cache_key
 from zerver.lib.camo import get_camo_url
 from zerver.lib.emoji import EMOTICON_RE, codepoint_to_name, name_to_codepoint, translate_emoticons
 from zerver.lib.emoji_utils import emoji_to_hex_codepoint, unqualify_emoji
@@ -53,6 +56,7 @@ from zerver.lib.mention import (
 )
 from zerver.lib.mime_types import AUDIO_INLINE_MIME_TYPES, guess_type
 from zerver.lib.outgoing_http import OutgoingSession
+from zerver.lib.parallel import map_parallel
 from zerver.lib.per_request_cache import cache_for_current_request
 from zerver.lib.subdomains import is_static_or_current_realm_url
 from zerver.lib.tex import render_tex
@@ -1668,6 +1672,62 @@ def get_compiled_linkifier_regex(source_pattern: str) -> "re2._Regexp[str]":
     return re2.compile(prepare_linkifier_pattern(source_pattern), options=options)
 
 
+@lru_cache(maxsize=1000)
+def get_compiled_linkifier_set(source_patterns: tuple[str, ...]) -> "re2.Set | None":
+    options = re2.Options()
+    options.log_errors = False
+    # RE2::Set can't fall back to a slower matcher if its DFA runs
+    # out of memory, so we give it more than the default.
+    options.max_mem = 64 << 20
+    linkifier_set = re2.Set.SearchSet(options)
+    try:
+        for source_pattern in source_patterns:
+            linkifier_set.Add(source_pattern)
+        linkifier_set.Compile()
+    except re2.error:
+        return None
+    return linkifier_set
+
+
+# The RE2 syntax for matching at the start or end of the text.
+LINKIFIER_ANCHORS = ["^", "$", r"\A", r"\z"]
+
+
+def get_possibly_matching_linkifiers(
+    linkifiers: list[LinkifierDict], text: str
+) -> list[LinkifierDict]:
+    """Returns the linkifiers, in order, which may match some part of
+    the text, finding them in a single scan of the text.
+
+    Each linkifier is applied to each inline text node (paragraph,
+    list item, etc.) separately, where ^ and $ (or \\A and \\z) match
+    at the start and end of that node, rather than of the whole text;
+    so we always return linkifiers whose patterns contain any of
+    LINKIFIER_ANCHORS.  The prepared pattern of any other linkifier
+    can only match where its source pattern does, so those whose
+    source pattern does not match anywhere in the text need not be
+    tried on it one at a time."""
+    possible_indices = set()
+    set_indices = []
+    for index, linkifier in enumerate(linkifiers):
+        if any(anchor in linkifier["pattern"] for anchor in LINKIFIER_ANCHORS):
+            possible_indices.add(index)
+        else:
+            set_indices.append(index)
+    if not set_indices:
+        return linkifiers
+    linkifier_set = get_compiled_linkifier_set(
+        tuple(linkifiers[index]["pattern"] for index in set_indices)
+    )
+    if linkifier_set is None:
+        return linkifiers
+    # The type stubs incorrectly say that this returns a bool.
+    matched_indices = cast(list[int] | None, linkifier_set.Match(text))
+    if matched_indices is not None:
+        possible_indices.update(set_indices[index] for index in matched_indices)
+    return [linkifiers[index] for index in sorted(possible_indices)]
+
+
 # Given a regular expression pattern, linkifies groups that match it
 # using the provided format string to construct the URL.
 class LinkifierPattern(CompiledInlineProcessor):
@@ -2431,9 +2491,12 @@ class ZulipMarkdown(markdown.Markdown):
         return postprocessors
 
 
-def make_md_engine(linkifiers_key: int, email_gateway: bool) -> ZulipMarkdown:
+def make_md_engine(linkifiers_key: int, email_gateway: bool, content: str) -> ZulipMarkdown:
+    # Realms can have hundreds of linkifiers, each of which would
+    # otherwise be a separate inline pattern searching every bit of
+    # text in the message, so we only include those which can match.
     return ZulipMarkdown(
-        linkifiers=linkifiers_for_realm(linkifiers_key),
+        linkifiers=get_possibly_matching_linkifiers(linkifiers_for_realm(linkifiers_key), content),
         linkifiers_key=linkifiers_key,
         email_gateway=email_gateway,
     )
@@ -2477,13 +2540,11 @@ def topic_links(linkifiers_key: int, topic_name: str) -> list[dict[str, str]]:
     linkifiers = linkifiers_for_realm(linkifiers_key)
     precedence = 0
 
-    options = re2.Options()
-    options.log_errors = False
-    for linkifier in linkifiers:
+    for linkifier in get_possibly_matching_linkifiers(linkifiers, topic_name):
         raw_pattern = linkifier["pattern"]
         prepared_url_template = uri_template.URITemplate(linkifier["url_template"])
         try:
-            pattern = re2.compile(prepare_linkifier_pattern(raw_pattern), options=options)
+            pattern = get_compiled_linkifier_regex(raw_pattern)
         except re2.error:
             # An invalid regex shouldn't be possible here, and logging
             # here on an invalid regex would spam the logs with every
@@ -2591,6 +2652,62 @@ def privacy_clean_markdown(content: str) -> str:
     return repr(_privacy_re.sub("x", content))
 
 
+def rendering_is_cacheable(
+    content: str, realm_alert_words_automaton: ahocorasick.Automaton | None
+) -> bool:
+    """Whether the rendering of this content depends only on the
+    realm's linkifiers, custom emoji, and settings, and not on users,
+    channels, topics, uploaded files, or alert words, all of which
+    can change without the content changing."""
+    if (
+        mention.MENTIONS_RE.search(content) is not None
+        or mention.USER_GROUP_MENTIONS_RE.search(content) is not None
+    ):
+        return False
+    if possible_linked_stream_names(content):
+        return False
+    if "/user_uploads/" in content:
+        return False
+    if realm_alert_words_automaton is not None:
+        # This is a superset of the alert words which
+        # AlertWordNotificationProcessor would actually match.
+        for _match in realm_alert_words_automaton.iter(content.lower()):
+            return False
+    return True
+
+
+def get_rendered_content_cache_key(
+    content: str,
+    realm: Realm,
+    active_realm_emoji: dict[str, EmojiInfo],
+    inline_image_preview: bool,
+    inline_url_embed_preview: bool,
+    translate_emoticons: bool,
+    email_gateway: bool,
+) -> str:
+    # Everything else the rendered content can depend on is part of
+    # the key, so that when a linkifier or custom emoji changes, we
+    # just stop finding the old entries, and they expire on their own.
+    rendering_context = orjson.dumps(
+        [
+            version,
+            # realm.host, which is used to recognize local links,
+            # is derived from the URL.
+            realm.url,
+            realm.default_code_block_language,
+            linkifiers_for_realm(realm.id),
+            active_realm_emoji,
+            inline_image_preview,
+            inline_url_embed_preview,
+            translate_emoticons,
+            email_gateway,
+        ],
+        option=orjson.OPT_SORT_KEYS,
+    )
+    rendering_digest = hashlib.sha256(rendering_context + b"\0" + content.encode()).hexdigest()
+    return rendered_content_cache_key(realm.id, rendering_digest)
+
+
 def do_convert(
     content: str,
     realm_alert_words_automaton: ahocorasick.Automaton | None = None,
@@ -2621,7 +2738,7 @@ def do_convert(
     else:
         logging_message_id = "unknown"
 
-    md_engine = make_md_engine(linkifiers_key, email_gateway)
+    md_engine = make_md_engine(linkifiers_key, email_gateway, content)
 
     # Filters such as UserMentionPattern need a message.
     rendering_result: MessageRenderingResult = MessageRenderingResult(
@@ -2657,6 +2774,7 @@ def do_convert(
 
     # Pre-fetch data from the DB that is used in the Markdown thread
     user_upload_previews = None
+    active_realm_emoji: dict[str, EmojiInfo] = {}
     if message_realm is not None:
         # Here we fetch the data structures needed to render
         # mentions/stream mentions from the database, but only
@@ -2685,8 +2803,6 @@ def do_convert(
 
         if content_has_emoji_syntax(content):
             active_realm_emoji = get_name_keyed_dict_for_active_realm_emoji(message_realm.id)
-        else:
-            active_realm_emoji = {}
 
         user_upload_previews = manifest_and_get_user_upload_previews(message_realm.id, content)
         md_engine.zulip_db_data = DbData(
@@ -2701,6 +2817,35 @@ def do_convert(
             user_upload_previews=user_upload_previews,
         )
 
+    # Messages sent by bots, like CI notifications or monitoring
+    # alerts, often have exactly the same content as an earlier
+    # message, so we cache their rendering when it's safe to do so.
+    cache_key = None
+    if (
+        message_realm is not None
+        and sent_by_bot
+        and url_embed_data is None
+        and rendering_is_cacheable(content, realm_alert_words_automaton)
+    ):
+        cache_key = get_rendered_content_cache_key(
+            content,
+            message_realm,
+            active_realm_emoji,
+            inline_image_preview=md_engine.image_preview_enabled,
+            inline_url_embed_preview=md_engine.url_embed_preview_enabled,
+            translate_emoticons=translate_emoticons,
+            email_gateway=email_gateway,
+        )
+        cached_rendering = cache_get(cache_key)
+        if cached_rendering is not None:
+            rendered_content, links_for_preview, has_image, has_link = cached_rendering[0]
+            rendering_result.rendered_content = rendered_content
+            rendering_result.links_for_preview = set(links_for_preview)
+            if message is not None:
+                message.has_image = has_image
+                message.has_link = has_link
+            return rendering_result
+
     try:
         # Spend at most 5 seconds rendering; this protects the backend
         # from being overloaded by bugs (e.g. Markdown logic that is
@@ -2726,6 +2871,18 @@ def do_convert(
             raise MarkdownRenderingError(
                 f"Rendered content exceeds {MAX_MESSAGE_LENGTH * 100} characters (message {logging_message_id})"
             )
+
+        if cache_key is not None:
+            cache_set(
+                cache_key,
+                (
+                    rendering_result.rendered_content,
+                    sorted(rendering_result.links_for_preview),
+                    message is not None and message.has_image,
+                    message is not None and message.has_link,
+                ),
+                timeout=3600 * 24,
+            )
         return rendering_result
     except Exception:
         cleaned = privacy_clean_markdown(content)
@@ -2832,6 +2989,26 @@ def render_message_markdown(
     return rendering_result
 
 
+def render_message_markdown_for_pool(message_and_content: tuple[Message, str]) -> str:
+    """Renders a message in a worker process of a pool created by
+    render_messages_markdown.  As with render_message_markdown, a
+    Markdown engine is built for each message, with only the
+    linkifiers which could match its content."""
+    message, content = message_and_content
+    return render_message_markdown(message, content).rendered_content
+
+
+def render_messages_markdown(
+    messages_and_contents: Iterable[tuple[Message, str]], processes: int = 1
+) -> Iterator[str]:
+    """Renders the content of many messages, e.g. for bulk
+    re-rendering, using a pool of processes.  The rendered content is
+    yielded in the same order as the messages, and is the same as if
+    they were rendered serially with render_message_markdown.
+    """
+    return map_parallel(render_message_markdown_for_pool, messages_and_contents, processes)
+
+
 def get_markdown_link_for_url(filename: str, url: str) -> str:
     # Our markdown has no escaping, so we cannot link any
     # text containing brackets; strip them from the
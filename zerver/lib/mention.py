@@ -1,5 +1,6 @@
 import functools
 import re
+import secrets
 from collections import defaultdict
 from dataclasses import dataclass
 from re import Match
@@ -9,6 +10,16 @@ from django.conf import settings
 from django.db.models import Q
 from django_stubs_ext import StrPromise
 
+from zerver.lib.cache import (
+    cache_get,
+    cache_get_many,
+    cache_set,
+    cache_set_many,
+    mention_group_members_cache_key,
+    mention_user_by_id_cache_key,
+    mention_users_by_name_cache_key,
+    realm_mention_data_version_cache_key,
+)
 from zerver.lib.streams import get_content_access_streams
 from zerver.lib.topic import get_latest_message_for_user_in_topic
 from zerver.lib.types import UserDisplayRecipient
@@ -41,6 +52,8 @@ USER_GROUP_MENTIONS_RE = re.compile(
 topic_wildcards = frozenset(["topic"])
 stream_wildcards = frozenset(["all", "everyone", "stream", "channel"])
 
+MENTION_DATA_CACHE_TIMEOUT = 3600 * 24
+
 
 @dataclass
 class FullNameInfo:
@@ -64,6 +77,29 @@ class UserFilter:
         else:
             raise AssertionError("totally empty filter makes no sense")
 
+    def lookup_filter(self) -> "UserFilter":
+        # The shared mention cache stores **name|id** lookups by just
+        # the ID, so that they can be reused whatever name is given;
+        # the name is checked when reading the cached users.
+        if self.id is not None:
+            return UserFilter(id=self.id, full_name=None)
+        return self
+
+    def cache_key(self, realm_id: int, version: str) -> str:
+        if self.id is not None:
+            return mention_user_by_id_cache_key(realm_id, version, self.id)
+        elif self.full_name is not None:
+            return mention_users_by_name_cache_key(realm_id, version, self.full_name)
+        else:
+            raise AssertionError("totally empty filter makes no sense")
+
+    def matches(self, user: "FullNameInfo") -> bool:
+        if self.id is not None and user.id != self.id:
+            return False
+        if self.full_name is not None and user.full_name.lower() != self.full_name.lower():
+            return False
+        return True
+
 
 @dataclass
 class MentionText:
@@ -96,6 +132,34 @@ class ChannelInfo:
     # mention topics or messages within channels.
 
 
+# Counts, for this process, the user and group lookups served from
+# the shared mention cache; the middleware logs them per request.
+mention_cache_hits = 0
+mention_cache_misses = 0
+
+
+def get_mention_cache_hits() -> int:
+    return mention_cache_hits
+
+
+def get_mention_cache_misses() -> int:
+    return mention_cache_misses
+
+
+def get_mention_data_version(realm_id: int) -> str:
+    """The shared mention cache entries for a realm are keyed by this
+    version, which flush_realm_mention_data resets whenever a user's
+    name, activity or role, or any group membership, in the realm
+    changes."""
+    version_key = realm_mention_data_version_cache_key(realm_id)
+    cached = cache_get(version_key)
+    if cached is not None:
+        return cached[0]
+    version = secrets.token_hex(8)
+    cache_set(version_key, version)
+    return version
+
+
 class MentionBackend:
     # Be careful about reuse: MentionBackend contains caches which are
     # designed to only have the lifespan of a sender user (typically a
@@ -132,11 +196,50 @@ class MentionBackend:
             # BOO! We have to go the database.
             unseen_user_filters.append(user_filter)
 
-        # Most of the time, we have to go to the database to get user info,
-        # unless our last loop found everything in the cache.
+        # Most of the time, we have to go to the shared cache or the
+        # database to get user info, unless our last loop found
+        # everything in the cache.
         if unseen_user_filters:
-            q_list = [user_filter.Q() for user_filter in unseen_user_filters]
+            rows = self.get_mentionable_users(unseen_user_filters)
+
+            possible_mention_user_ids = [row.id for row in rows]
+            inaccessible_user_ids = get_inaccessible_user_ids(
+                possible_mention_user_ids, message_sender
+            )
+
+            user_list = [row for row in rows if row.id not in inaccessible_user_ids]
+
+            # We expect callers who take advantage of our cache to supply both
+            # id and full_name in the user mentions in their messages.
+            for user in user_list:
+                self.user_cache[(user.id, user.full_name)] = user
+
+            result += user_list
+
+        return result
 
+    def get_mentionable_users(self, user_filters: list[UserFilter]) -> list[FullNameInfo]:
+        # Looks up the users matching user_filters via the realm's
+        # shared mention cache, which does not depend on the sender;
+        # callers are responsible for filtering out users the sender
+        # cannot access.
+        version = get_mention_data_version(self.realm_id)
+        filters_by_key: dict[str, list[UserFilter]] = defaultdict(list)
+        for user_filter in user_filters:
+            filters_by_key[user_filter.cache_key(self.realm_id, version)].append(user_filter)
+
+        global mention_cache_hits, mention_cache_misses
+        cached_users = cache_get_many(list(filters_by_key))
+        mention_cache_hits += len(cached_users)
+        mention_cache_misses += len(filters_by_key) - len(cached_users)
+
+        uncached_filters = {
+            key: filters[0].lookup_filter()
+            for key, filters in filters_by_key.items()
+            if key not in cached_users
+        }
+        if uncached_filters:
+            q_list = [user_filter.Q() for user_filter in uncached_filters.values()]
             rows = (
                 UserProfile.objects.filter(
                     Q(realm_id=self.realm_id) | Q(email__in=settings.CROSS_REALM_BOT_EMAILS),
@@ -150,26 +253,70 @@ class MentionBackend:
                     "is_active",
                 )
             )
-
-            possible_mention_user_ids = [row.id for row in rows]
-            inaccessible_user_ids = get_inaccessible_user_ids(
-                possible_mention_user_ids, message_sender
-            )
-
-            user_list = [
+            fetched_users = [
                 FullNameInfo(id=row.id, full_name=row.full_name, is_active=row.is_active)
                 for row in rows
-                if row.id not in inaccessible_user_ids
             ]
 
-            # We expect callers who take advantage of our cache to supply both
-            # id and full_name in the user mentions in their messages.
-            for user in user_list:
-                self.user_cache[(user.id, user.full_name)] = user
-
-            result += user_list
+            # Note that cross-realm bots are cached with the realm's
+            # other users; their names are not expected to change.
+            for key, user_filter in uncached_filters.items():
+                cached_users[key] = [user for user in fetched_users if user_filter.matches(user)]
+            cache_set_many(
+                {key: cached_users[key] for key in uncached_filters},
+                timeout=MENTION_DATA_CACHE_TIMEOUT,
+            )
 
-        return result
+        users: dict[int, FullNameInfo] = {}
+        for key, filters in filters_by_key.items():
+            for user in cached_users[key]:
+                if any(user_filter.matches(user) for user_filter in filters):
+                    users[user.id] = user
+        return list(users.values())
+
+    def get_group_members(self, user_group_ids: list[int]) -> dict[int, set[int]]:
+        # Maps each of the groups to its active direct and indirect
+        # members, via the realm's shared mention cache.
+        version = get_mention_data_version(self.realm_id)
+        group_ids_by_key = {
+            mention_group_members_cache_key(self.realm_id, version, group_id): group_id
+            for group_id in user_group_ids
+        }
+        global mention_cache_hits, mention_cache_misses
+        cached_members = cache_get_many(list(group_ids_by_key))
+        mention_cache_hits += len(cached_members)
+        mention_cache_misses += len(group_ids_by_key) - len(cached_members)
+
+        group_members: dict[int, set[int]] = {
+            group_ids_by_key[key]: members for key, members in cached_members.items()
+        }
+        uncached_group_ids = [
+            group_id for group_id in user_group_ids if group_id not in group_members
+        ]
+        if not uncached_group_ids:
+            return group_members
+
+        for group_id in uncached_group_ids:
+            group_members[group_id] = set()
+        # Fetch membership for the groups in a single, efficient
+        # bulk query, mapping each group to its direct and indirect
+        # members.
+        for group_root_id, member_id in (
+            get_root_id_annotated_recursive_subgroups_for_groups(uncached_group_ids, self.realm_id)
+            .filter(direct_members__is_active=True)
+            .values_list("root_id", "direct_members")  # type: ignore[misc]  # root_id is an annotated field.
+        ):
+            group_members[group_root_id].add(member_id)
+
+        cache_set_many(
+            {
+                key: group_members[group_id]
+                for key, group_id in group_ids_by_key.items()
+                if key not in cached_members
+            },
+            timeout=MENTION_DATA_CACHE_TIMEOUT,
+        )
+        return group_members
 
     def get_stream_name_map(
         self, stream_names: set[str], acting_user: UserProfile | None
@@ -423,15 +570,9 @@ class MentionData:
             if len(filtered_group_ids) == 0:
                 return
 
-            # Fetch membership for the groups filtered above in a
-            # single, efficient bulk query, mapping each group to its
-            # direct and indirect members.
-            for group_root_id, member_id in (
-                get_root_id_annotated_recursive_subgroups_for_groups(filtered_group_ids, realm_id)
-                .filter(direct_members__is_active=True)
-                .values_list("root_id", "direct_members")  # type: ignore[misc]  # root_id is an annotated field.
-            ):
-                self.user_group_members[group_root_id].add(member_id)
+            self.user_group_members.update(
+                self.mention_backend.get_group_members(filtered_group_ids)
+            )
 
     def get_user_by_name(self, name: str) -> FullNameInfo | None:
         # warning: get_user_by_name is not dependable if two
@@ -15,12 +15,11 @@ from psycopg2.sql import SQL
 
 from analytics.lib.counts import COUNT_STATS
 from analytics.models import RealmCount
-from zerver.lib.cache import generic_bulk_cached_fetch, to_dict_cache_key_id
 from zerver.lib.display_recipient import get_display_recipient_by_id
 from zerver.lib.exceptions import JsonableError, MissingAuthenticationError
 from zerver.lib.markdown import MessageRenderingResult
 from zerver.lib.mention import MentionData, sender_can_mention_group, silent_mention_syntax_for_user
-from zerver.lib.message_cache import MessageDict, extract_message_dict, stringify_message_dict
+from zerver.lib.message_cache import MessageDict, bulk_fetch_message_dicts
 from zerver.lib.partial import partial
 from zerver.lib.request import RequestVariableConversionError
 from zerver.lib.stream_subscription import (
@@ -130,7 +129,7 @@ class SendMessageRequest:
     local_id: str | None
     sender_queue_id: str | None
     realm: Realm
-    mention_data: MentionData
+    mention_data: MentionData | None
     mentioned_user_groups_map: dict[int, int]
     active_user_ids: set[int]
     online_push_user_ids: set[int]
@@ -292,18 +291,7 @@ def messages_for_ids(
     user_profile: UserProfile | None,
     realm: Realm,
 ) -> list[dict[str, Any]]:
-    id_fetcher = lambda row: row["id"]
-
-    message_dicts = generic_bulk_cached_fetch(
-        to_dict_cache_key_id,
-        MessageDict.ids_to_dict,
-        message_ids,
-        id_fetcher=id_fetcher,
-        cache_transformer=lambda obj: obj,
-        extractor=extract_message_dict,
-        setter=stringify_message_dict,
-        pickled_tupled=False,
-    )
+    message_dicts = bulk_fetch_message_dicts(message_ids)
 
     message_list: list[dict[str, Any]] = []
 
@@ -1,4 +1,5 @@
 import copy
+import secrets
 from collections.abc import Iterable
 from datetime import datetime
 from email.headerregistry import Address
@@ -7,7 +8,14 @@ from typing import Any, TypedDict
 import orjson
 
 from zerver.lib.avatar import get_avatar_field, get_avatar_for_inaccessible_user
-from zerver.lib.cache import cache_set_many, cache_with_key, to_dict_cache_key, to_dict_cache_key_id
+from zerver.lib.cache import (
+    cache_get_many,
+    cache_set_many,
+    cache_with_key,
+    to_dict_cache_key,
+    to_dict_cache_key_id,
+    to_dict_version_cache_key_id,
+)
 from zerver.lib.display_recipient import bulk_fetch_display_recipients
 from zerver.lib.markdown import render_message_markdown, topic_links
 from zerver.lib.markdown import version as markdown_version
@@ -62,12 +70,58 @@ def sew_messages_and_submessages(
             message["submessages"].append(submessage)
 
 
+# Message dicts are stored in the to_dict cache as JSON arrays of
+# their values, in the order of MESSAGE_DICT_FIELDS, rather than as
+# JSON objects, so that we don't store and decode the same field names
+# for every message and reaction.  The optional fields are stored as
+# null when the message doesn't have them.
+MESSAGE_DICT_FIELDS = (
+    "id",
+    "sender_id",
+    "content",
+    "recipient_type_id",
+    "recipient_type",
+    "recipient_id",
+    "timestamp",
+    "client",
+    TOPIC_NAME,
+    "sender_realm_id",
+    TOPIC_LINKS,
+    "last_edit_timestamp",
+    "edit_history",
+    "rendered_content",
+    "is_me_message",
+    "reactions",
+    "submessages",
+)
+OPTIONAL_MESSAGE_DICT_FIELDS = frozenset(["last_edit_timestamp", "edit_history"])
+REACTION_DICT_FIELDS = ("emoji_name", "emoji_code", "reaction_type", "user_id")
+
+
 def extract_message_dict(message_bytes: bytes) -> dict[str, Any]:
-    return orjson.loads(message_bytes)
+    message_dict = {
+        field: value
+        for field, value in zip(MESSAGE_DICT_FIELDS, orjson.loads(message_bytes), strict=True)
+        if value is not None or field not in OPTIONAL_MESSAGE_DICT_FIELDS
+    }
+    message_dict["reactions"] = [
+        dict(zip(REACTION_DICT_FIELDS, reaction, strict=True))
+        for reaction in message_dict["reactions"]
+    ]
+    return message_dict
 
 
 def stringify_message_dict(message_dict: dict[str, Any]) -> bytes:
-    return orjson.dumps(message_dict)
+    assert message_dict.keys() <= set(MESSAGE_DICT_FIELDS)
+    values = [
+        message_dict.get(field) if field in OPTIONAL_MESSAGE_DICT_FIELDS else message_dict[field]
+        for field in MESSAGE_DICT_FIELDS
+    ]
+    values[MESSAGE_DICT_FIELDS.index("reactions")] = [
+        [reaction[field] for field in REACTION_DICT_FIELDS]
+        for reaction in message_dict["reactions"]
+    ]
+    return orjson.dumps(values)
 
 
 @cache_with_key(to_dict_cache_key, timeout=3600 * 24, pickled_tupled=False)
@@ -75,6 +129,19 @@ def message_to_encoded_cache(message: Message, realm_id: int | None = None) -> b
     return MessageDict.messages_to_encoded_cache([message], realm_id)[message.id]
 
 
+def set_new_message_dict_versions(message_ids: Iterable[int]) -> None:
+    """Gives newly sent messages versions in the remote cache, so that
+    processes can cache their dicts locally; see
+    bulk_fetch_message_dicts."""
+    cache_set_many(
+        {
+            to_dict_version_cache_key_id(message_id): secrets.token_hex(8)
+            for message_id in message_ids
+        },
+        timeout=3600 * 24,
+    )
+
+
 def update_message_cache(
     changed_messages: Iterable[Message], realm_id: int | None = None
 ) -> list[int]:
@@ -84,11 +151,110 @@ def update_message_cache(
     changed_messages_to_dict = MessageDict.messages_to_encoded_cache(changed_messages, realm_id)
     for msg_id, msg in changed_messages_to_dict.items():
         items_for_remote_cache[to_dict_cache_key_id(msg_id)] = msg
+    # New versions, set after the dicts themselves, invalidate any
+    # copies of these messages in process-local caches.
+    for msg_id in changed_messages_to_dict:
+        items_for_remote_cache[to_dict_version_cache_key_id(msg_id)] = secrets.token_hex(8)
 
-    cache_set_many(items_for_remote_cache)
+    cache_set_many(items_for_remote_cache, timeout=3600 * 24)
     return list(changed_messages_to_dict.keys())
 
 
+# Process-local cache in front of the remote cache for message dicts,
+# for messages that are fetched by many users in a short time, like
+# recent messages in busy channels.  It maps message IDs to the
+# version the message's encoded dict was fetched under, and that dict,
+# in least recently used order.
+MESSAGE_DICT_LOCAL_CACHE_SIZE = 5000
+message_dict_local_cache: dict[int, tuple[str, bytes]] = {}
+message_dict_local_cache_hits = 0
+message_dict_local_cache_misses = 0
+
+
+def get_message_dict_local_cache_hits() -> int:
+    return message_dict_local_cache_hits
+
+
+def get_message_dict_local_cache_misses() -> int:
+    return message_dict_local_cache_misses
+
+
+def bulk_fetch_message_dicts(message_ids: list[int]) -> dict[int, dict[str, Any]]:
+    """Fetches the to_dict cache entries for the messages, decoded.
+
+    Sending or updating a message gives it a new version in the
+    remote cache, and flushing its dict deletes its version,
+    invalidating the copies held by every process.  We fetch each
+    message's version along with its dict, or only its version for
+    messages in our process-local cache; messages without a version
+    are not cached locally.  The local cache holds the encoded dicts,
+    since our callers mutate the dicts we return, and decoding is
+    cheaper than a deep copy.
+    """
+    global message_dict_local_cache_hits, message_dict_local_cache_misses
+
+    keys: list[str] = []
+    for message_id in message_ids:
+        keys.append(to_dict_version_cache_key_id(message_id))
+        if message_id not in message_dict_local_cache:
+            keys.append(to_dict_cache_key_id(message_id))
+    cached = cache_get_many(keys)
+
+    encoded_message_dicts: dict[int, bytes] = {}
+    fetched_versions: dict[int, str | None] = {}
+    stale_message_ids: list[int] = []
+    for message_id in message_ids:
+        version = cached.get(to_dict_version_cache_key_id(message_id))
+        local_entry = message_dict_local_cache.pop(message_id, None)
+        if local_entry is not None:
+            if version is not None and local_entry[0] == version:
+                # Reinsert the entry to mark it as the most recently used.
+                message_dict_local_cache[message_id] = local_entry
+                encoded_message_dicts[message_id] = local_entry[1]
+                continue
+            stale_message_ids.append(message_id)
+        elif (encoded_message_dict := cached.get(to_dict_cache_key_id(message_id))) is not None:
+            encoded_message_dicts[message_id] = encoded_message_dict
+        fetched_versions[message_id] = version
+
+    message_dict_local_cache_misses += len(fetched_versions)
+    message_dict_local_cache_hits += len(message_ids) - len(fetched_versions)
+
+    if stale_message_ids:
+        stale_message_dicts = cache_get_many(
+            [to_dict_cache_key_id(message_id) for message_id in stale_message_ids]
+        )
+        for message_id in stale_message_ids:
+            encoded_message_dict = stale_message_dicts.get(to_dict_cache_key_id(message_id))
+            if encoded_message_dict is not None:
+                encoded_message_dicts[message_id] = encoded_message_dict
+
+    needed_ids = [
+        message_id for message_id in fetched_versions if message_id not in encoded_message_dicts
+    ]
+    if needed_ids:
+        items_for_remote_cache = {}
+        for row in MessageDict.ids_to_dict(needed_ids):
+            encoded_message_dicts[row["id"]] = stringify_message_dict(row)
+            items_for_remote_cache[to_dict_cache_key_id(row["id"])] = encoded_message_dicts[
+                row["id"]
+            ]
+        cache_set_many(items_for_remote_cache, timeout=3600 * 24)
+
+    for message_id, version in fetched_versions.items():
+        # A flush after we fetched the version deletes it, so what we
+        # fetched under it is safe to keep until the version changes.
+        if version is not None and message_id in encoded_message_dicts:
+            message_dict_local_cache[message_id] = (version, encoded_message_dicts[message_id])
+    while len(message_dict_local_cache) > MESSAGE_DICT_LOCAL_CACHE_SIZE:
+        del message_dict_local_cache[next(iter(message_dict_local_cache))]
+
+    return {
+        message_id: extract_message_dict(encoded_message_dict)
+        for message_id, encoded_message_dict in encoded_message_dicts.items()
+    }
+
+
 def save_message_rendered_content(message: Message, content: str) -> str:
     rendering_result = render_message_markdown(message, content, realm=message.get_realm())
     rendered_content = None
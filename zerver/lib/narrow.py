@@ -1,13 +1,16 @@
+import hashlib
 import re
+import secrets
 from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any, Generic, Literal, TypeAlias, TypedDict, TypeVar
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ValidationError
 from django.db import connection
+from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
 from pydantic import BaseModel, model_validator
 from sqlalchemy.dialects import postgresql
@@ -28,12 +31,20 @@ from sqlalchemy.sql import (
     table,
     true,
     union_all,
+    visitors,
 )
+from sqlalchemy.sql.elements import BindParameter
 from sqlalchemy.sql.selectable import SelectBase
 from sqlalchemy.types import ARRAY, Boolean, Integer, Text
 from typing_extensions import override
 
 from zerver.lib.addressee import get_user_profiles, get_user_profiles_by_ids
+from zerver.lib.cache import (
+    cache_get,
+    cache_set,
+    first_unread_anchor_cache_key,
+    first_unread_anchor_version_cache_key,
+)
 from zerver.lib.exceptions import ErrorCode, JsonableError, MissingAuthenticationError
 from zerver.lib.message import (
     access_message,
@@ -191,6 +202,13 @@ def is_web_public_narrow(narrow: Iterable[NarrowParameter] | None) -> bool:
 
 LARGER_THAN_MAX_MESSAGE_ID = 10000000000000000
 
+FIRST_UNREAD_ANCHOR_CACHE_TIMEOUT = 3600 * 24
+# Messages are assigned IDs before the transaction sending them
+# commits, so concurrent sends can commit out of ID order; we only
+# cache anchors sent longer ago than any send transaction takes, after
+# which no message with a lower ID can still appear.
+FIRST_UNREAD_ANCHOR_MIN_AGE = timedelta(minutes=1)
+
 
 class AnchorInfo(TypedDict):
     type: Literal["message_id", "first_unread", "date"]
@@ -835,6 +853,8 @@ def ok_to_include_history(
     narrow: list[NarrowParameter] | None,
     user_profile: UserProfile | None,
     is_web_public_query: bool,
+    *,
+    has_channel_content_access: bool = False,
 ) -> bool:
     # There are occasions where we need to find Message rows that
     # have no corresponding UserMessage row, because the user is
@@ -863,9 +883,13 @@ def ok_to_include_history(
             if term.operator in channel_operators and not term.negated:
                 operand: str | int = term.operand
                 if isinstance(operand, str):
-                    include_history = can_access_stream_history_by_name(user_profile, operand)
+                    include_history = can_access_stream_history_by_name(
+                        user_profile, operand, has_content_access=has_channel_content_access
+                    )
                 else:
-                    include_history = can_access_stream_history_by_id(user_profile, operand)
+                    include_history = can_access_stream_history_by_id(
+                        user_profile, operand, has_content_access=has_channel_content_access
+                    )
             elif (
                 term.operator in channels_operators
                 and term.operand in ["public", "web-public"]
@@ -1199,6 +1223,40 @@ def add_narrow_conditions(
     return (query, is_search, builder.is_dm_narrow)
 
 
+def is_first_unread_anchor_cacheable(narrow: list[NarrowParameter] | None) -> bool:
+    """Whether the first unread anchor for this narrow can be served from
+    the cache.  This is limited to the common narrows -- the home view,
+    channels, topics and direct message conversations -- whose set of
+    messages only changes when messages are sent, deleted or moved, or
+    muting settings change."""
+    if narrow is None:
+        return True
+    for term in narrow:
+        if term.negated:
+            return False
+        if term.operator in ["channel", "stream", "topic", "dm", "pm-with"]:
+            continue
+        if term.operator == "is" and term.operand in ["dm", "private"]:
+            continue
+        if term.operator == "in" and term.operand in ["home", "all"]:
+            continue
+        return False
+    return True
+
+
+def get_first_unread_anchor_version(user_profile_id: int) -> str:
+    """A user's cached first unread anchors are keyed by this version,
+    which flush_first_unread_anchors resets whenever an older message
+    may have become unread in one of their narrows."""
+    version_key = first_unread_anchor_version_cache_key(user_profile_id)
+    cached = cache_get(version_key)
+    if cached is not None:
+        return cached[0]
+    version = secrets.token_hex(8)
+    cache_set(version_key, version)
+    return version
+
+
 def find_first_unread_anchor(
     sa_conn: Connection,
     user_profile: UserProfile | None,
@@ -1213,6 +1271,38 @@ def find_first_unread_anchor(
     if user_profile is None:
         return LARGER_THAN_MAX_MESSAGE_ID
 
+    # The first unread message in a narrow only moves forward as
+    # messages are read or deleted, so a cached anchor is still
+    # correct as long as it is unread; a single lookup on the user's
+    # unread index confirms that, instead of running the narrow query.
+    # Cases where the first unread message can move backwards,
+    # including messages fanned out by the message_fanout queue
+    # worker, reset the user's version via flush_first_unread_anchors.  Compiling the
+    # query is expensive, so we key the cache by the narrow's terms,
+    # which determine its structure, and the values bound into it,
+    # which include the channels and users the narrow resolved to.
+    cache_key = None
+    if is_first_unread_anchor_cacheable(narrow):
+        query_terms = [(term.operator, term.operand) for term in narrow or []]
+        bound_values = [
+            element.effective_value
+            for element in visitors.iterate(query)
+            if isinstance(element, BindParameter)
+        ]
+        cache_key = first_unread_anchor_cache_key(
+            user_profile.id,
+            get_first_unread_anchor_version(user_profile.id),
+            hashlib.sha1(repr((query_terms, bound_values)).encode()).hexdigest(),
+        )
+        cached = cache_get(cache_key)
+        if (
+            cached is not None
+            and UserMessage.objects.filter(user_profile=user_profile, message_id=cached[0])
+            .extra(where=[UserMessage.where_unread()])  # noqa: S610
+            .exists()
+        ):
+            return cached[0]
+
     # Looking at the name get_base_query_for_search, one would think that
     # we can just rebuild the query again with need_user_message set to True
     # regardless of the existing value of need_user_message. But,
@@ -1251,6 +1341,11 @@ def find_first_unread_anchor(
             condition = and_(condition, *muting_conditions)
 
     first_unread_query = query.where(condition)
+    if cache_key is not None:
+        # We only cache anchors which are old enough; see below.
+        first_unread_query = first_unread_query.add_columns(
+            literal_column("zerver_message.date_sent")
+        )
     first_unread_query = first_unread_query.order_by(inner_msg_id_col.asc()).limit(1)
     first_unread_result = list(sa_conn.execute(first_unread_query).fetchall())
     if len(first_unread_result) > 0:
@@ -1258,6 +1353,18 @@ def find_first_unread_anchor(
     else:
         anchor = LARGER_THAN_MAX_MESSAGE_ID
 
+    # We don't cache the absence of unread messages, since any newly
+    # sent message would invalidate it; when the user has no unread
+    # messages, the query above is cheap anyway.  Nor do we cache
+    # recent anchors, since a message with a lower ID, sent
+    # concurrently, may not have committed yet.
+    if (
+        cache_key is not None
+        and anchor != LARGER_THAN_MAX_MESSAGE_ID
+        and first_unread_result[0][-1] < timezone_now() - FIRST_UNREAD_ANCHOR_MIN_AGE
+    ):
+        cache_set(cache_key, anchor, timeout=FIRST_UNREAD_ANCHOR_CACHE_TIMEOUT)
+
     return anchor
 
 
@@ -1537,7 +1644,8 @@ def fetch_messages(
     num_after: int,
     client_requested_message_ids: list[int] | None = None,
 ) -> FetchedMessages:
-    if access_narrow(user_profile, narrow, is_web_public_query, realm) is False:
+    channel_access = access_narrow(user_profile, narrow, is_web_public_query, realm)
+    if channel_access is False:
         # If user is requesting messages from a narrow they don't have
         # access to, do an early return.
         return FetchedMessages(
@@ -1551,7 +1659,16 @@ def fetch_messages(
             is_search=False,
         )
 
-    include_history = ok_to_include_history(narrow, user_profile, is_web_public_query)
+    # access_narrow has already checked the user's access to the
+    # narrow's channel, which we need not repeat when deciding whether
+    # to include its history; this keeps each page of a channel's
+    # history to a single subscription lookup.
+    include_history = ok_to_include_history(
+        narrow,
+        user_profile,
+        is_web_public_query,
+        has_channel_content_access=channel_access is True,
+    )
     if include_history:
         # The initial query in this case doesn't use `zerver_usermessage`,
         # and isn't yet limited to messages the user is entitled to see!
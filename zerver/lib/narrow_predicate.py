@@ -26,6 +26,16 @@ def check_narrow_for_events(narrow: Collection[NeverNegatedNarrowTerm]) -> None:
             )
 
 
+def get_narrow_channel_name(narrow: Collection[NeverNegatedNarrowTerm]) -> str | None:
+    """Returns the (lowercased) name of the channel that all messages
+    matching the narrow must be sent to, if the narrow restricts the
+    channel; this is used to index event queues by their narrows."""
+    for narrow_term in narrow:
+        if narrow_term.operator in channel_operators:
+            return narrow_term.operand.lower()
+    return None
+
+
 class NarrowPredicate(Protocol):
     def __call__(self, *, message: dict[str, Any], flags: list[str]) -> bool: ...
 
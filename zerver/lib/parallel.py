@@ -2,6 +2,7 @@ import logging
 from collections.abc import Callable, Iterable, Iterator
 from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
 from contextlib import contextmanager
+from itertools import islice
 from multiprocessing import current_process
 from typing import Any, TypeVar
 
@@ -14,6 +15,7 @@ from zerver.lib.partial import partial
 from zerver.lib.queue import get_queue_client
 
 ParallelRecordType = TypeVar("ParallelRecordType")
+ParallelResultType = TypeVar("ParallelResultType")
 
 
 def _disconnect() -> None:
@@ -125,3 +127,35 @@ def run_parallel_queue(
         finally:
             if exceptions:
                 raise exceptions[0]
+
+
+def map_parallel(
+    func: Callable[[ParallelRecordType], ParallelResultType],
+    records: Iterable[ParallelRecordType],
+    processes: int,
+    *,
+    chunksize: int = 100,
+) -> Iterator[ParallelResultType]:
+    """Like run_parallel, but yields the result of func for each
+    record, in the same order as the records.  Records are sent to
+    the worker processes in chunks of chunksize, to amortize the cost
+    of pickling them; func must be a module-level function.  Records
+    are read from the iterable a few chunks ahead of the results being
+    consumed, so it may be a lazy stream of more records than fit in
+    memory.
+    """
+    assert processes > 0
+    if settings.TEST_SUITE and current_process().daemon:  # nocoverage
+        assert processes == 1, "Only one process possible under parallel tests"
+
+    if processes == 1:
+        yield from map(func, records)
+        return
+
+    _disconnect()  # nocoverage
+    records = iter(records)  # nocoverage
+    with ProcessPoolExecutor(max_workers=processes) as executor:  # nocoverage
+        # Executor.map submits every record it is given up front, so
+        # hand it a window of a couple of chunks per process at a time.
+        while window := list(islice(records, 2 * processes * chunksize)):
+            yield from executor.map(func, window, chunksize=chunksize)
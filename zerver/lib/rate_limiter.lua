@@ -3,7 +3,8 @@
 --
 -- KEYS[1] = block_key, KEYS[2] = gcra_key
 -- ARGV[1] = num_rules, ARGV[2..2*num_rules+1] = w1, l1, w2, l2, ...
--- ARGV[2*num_rules+2] (optional) = override timestamp for tests only
+-- ARGV[2*num_rules+2] = cost, the number of calls this request counts as
+-- ARGV[2*num_rules+3] (optional) = override timestamp for tests only
 --
 -- Returns a 4-element list of strings:
 --   [ratelimited, secs_to_freedom, calls_remaining, secs_to_reset]
@@ -11,13 +12,14 @@
 local block_key = KEYS[1]
 local gcra_key = KEYS[2]
 local num_rules = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2 * num_rules + 2])
 
 -- Use Redis server time so that all app servers see a consistent
 -- clock, avoiding false positives from inter-machine clock drift.
 -- Tests may pass an explicit timestamp as the last argument to get
 -- deterministic behavior without wall-clock sleeps.
 local now
-local test_time_arg = ARGV[2 * num_rules + 2]
+local test_time_arg = ARGV[2 * num_rules + 3]
 if test_time_arg then
     now = tonumber(test_time_arg)
 else
@@ -52,7 +54,7 @@ for i = 1, num_rules do
     -- If the stored TAT is in the past, treat it as now (the
     -- bucket has fully drained).
     local tat = math.max(stored and tonumber(stored) or now, now)
-    local new_tat = tat + emission_interval
+    local new_tat = tat + emission_interval * cost
 
     -- The bucket overflows when new_tat exceeds the window
     -- horizon: the request arrived faster than the drain rate
@@ -37,10 +37,10 @@ class RateLimitedObject(ABC):
         else:
             self.backend = RedisRateLimiterBackend
 
-    def _rate_limit_entity(self) -> tuple[bool, float, int, float]:
+    def _rate_limit_entity(self, cost: int = 1) -> tuple[bool, float, int, float]:
         # Returns (ratelimited, secs_to_freedom, calls_remaining, secs_to_reset)
         return self.backend.rate_limit_entity(
-            self.key(), self.get_rules(), self.max_api_calls(), self.max_api_window()
+            self.key(), self.get_rules(), self.max_api_calls(), self.max_api_window(), cost
         )
 
     def rate_limit(self) -> tuple[bool, float]:
@@ -48,10 +48,10 @@ class RateLimitedObject(ABC):
         ratelimited, secs_to_freedom, _, _ = self._rate_limit_entity()
         return ratelimited, secs_to_freedom
 
-    def rate_limit_request(self, request: HttpRequest) -> None:
+    def rate_limit_request(self, request: HttpRequest, cost: int = 1) -> None:
         from zerver.lib.request import RequestNotes
 
-        ratelimited, secs_to_freedom, calls_remaining, secs_to_reset = self._rate_limit_entity()
+        ratelimited, secs_to_freedom, calls_remaining, secs_to_reset = self._rate_limit_entity(cost)
         request_notes = RequestNotes.get_notes(request)
 
         request_notes.ratelimits_applied.append(
@@ -205,7 +205,12 @@ class RateLimiterBackend(ABC):
     @classmethod
     @abstractmethod
     def rate_limit_entity(
-        cls, entity_key: str, rules: list[tuple[int, int]], max_api_calls: int, max_api_window: int
+        cls,
+        entity_key: str,
+        rules: list[tuple[int, int]],
+        max_api_calls: int,
+        max_api_window: int,
+        cost: int = 1,
     ) -> tuple[bool, float, int, float]:
         # Returns (ratelimited, secs_to_freedom, calls_remaining, secs_to_reset)
         pass
@@ -277,18 +282,24 @@ class RedisRateLimiterBackend(RateLimiterBackend):
     @classmethod
     @override
     def rate_limit_entity(
-        cls, entity_key: str, rules: list[tuple[int, int]], max_api_calls: int, max_api_window: int
+        cls,
+        entity_key: str,
+        rules: list[tuple[int, int]],
+        max_api_calls: int,
+        max_api_window: int,
+        cost: int = 1,
     ) -> tuple[bool, float, int, float]:
         assert rules
         gcra_key, block_key = cls.get_keys(entity_key)
 
-        # Build args: num_rules, w1, l1, w2, l2, ...[, now]
+        # Build args: num_rules, w1, l1, w2, l2, ..., cost[, now]
         # The Lua script uses Redis TIME internally for clock
         # consistency; tests may pass a trailing timestamp override.
         args: list[float | int] = [len(rules)]
         for window, limit in rules:
             args.append(window)
             args.append(limit)
+        args.append(cost)
         if cls._testing_clock:
             args.append(time.time())
 
@@ -377,14 +388,15 @@ def client_is_exempt_from_rate_limiting(request: HttpRequest) -> bool:
     )
 
 
-def rate_limit_user(request: HttpRequest, user: UserProfile, domain: str) -> None:
+def rate_limit_user(request: HttpRequest, user: UserProfile, domain: str, cost: int = 1) -> None:
     """Returns whether or not a user was rate limited. Will raise a RateLimitedError exception
     if the user has been rate limited, otherwise returns and modifies request to contain
-    the rate limit information"""
+    the rate limit information.  `cost` is the number of API calls the
+    request counts as."""
     if not should_rate_limit(request):
         return
 
-    RateLimitedUser(user, domain=domain).rate_limit_request(request)
+    RateLimitedUser(user, domain=domain).rate_limit_request(request, cost)
 
 
 def rate_limit_request_by_ip(request: HttpRequest, domain: str) -> None:
@@ -11,6 +11,7 @@ from django.db.models import Exists, F, Max, OuterRef, QuerySet
 from django.db.models.functions import Greatest
 from django.utils.timezone import now as timezone_now
 
+from zerver.lib.cache import flush_first_unread_anchors
 from zerver.lib.logging_util import log_to_file
 from zerver.lib.queue import queue_event_on_commit
 from zerver.lib.user_message import bulk_insert_all_ums
@@ -250,6 +251,10 @@ def add_missing_messages(user_profile: UserProfile) -> None:
             last_active_message_id=Greatest(F("last_active_message_id"), message_ids[-1])
         )
 
+    # The new rows are unread, and may be older than messages the user
+    # received while soft-deactivated.
+    transaction.on_commit(lambda: flush_first_unread_anchors([user_profile.id]))
+
 
 def do_soft_deactivate_user(user_profile: UserProfile) -> None:
     try:
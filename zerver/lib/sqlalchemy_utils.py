@@ -1,9 +1,13 @@
+import time
 from collections.abc import Iterator
 from contextlib import contextmanager
+from typing import Any
 
 import sqlalchemy
 from django.db import connection
+from sqlalchemy import event
 from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.engine.default import DefaultExecutionContext
 from typing_extensions import override
 
 from zerver.lib.db import TimeTrackingConnection
@@ -22,6 +26,73 @@ class NonClosingPool(sqlalchemy.pool.NullPool):
 
 sqlalchemy_engine: Engine | None = None
 
+# SQLAlchemy caches the compiled form of each statement by its
+# structure, with literal values as bound parameters, so narrows that
+# differ only in their operands share one compiled query.  We track
+# how long compiling (or looking up) statements takes, separately from
+# executing them, and how often that cache misses.
+sqlalchemy_compile_time = 0.0
+sqlalchemy_execute_time = 0.0
+sqlalchemy_queries = 0
+sqlalchemy_compiled_cache_misses = 0
+
+
+def get_sqlalchemy_compile_time() -> float:
+    return sqlalchemy_compile_time
+
+
+def get_sqlalchemy_execute_time() -> float:
+    return sqlalchemy_execute_time
+
+
+def get_sqlalchemy_queries() -> int:
+    return sqlalchemy_queries
+
+
+def get_sqlalchemy_compiled_cache_misses() -> int:
+    return sqlalchemy_compiled_cache_misses
+
+
+def before_execute(
+    conn: Connection,
+    clauseelement: Any,
+    multiparams: Any,
+    params: Any,
+    execution_options: Any,
+) -> None:
+    conn.info["execute_start"] = time.time()
+
+
+def before_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: DefaultExecutionContext,
+    executemany: bool,
+) -> None:
+    global sqlalchemy_compile_time, sqlalchemy_compiled_cache_misses
+    now = time.time()
+    execute_start = conn.info.pop("execute_start", None)
+    if execute_start is not None:
+        sqlalchemy_compile_time += now - execute_start
+    if context.cache_hit is context.dialect.CACHE_MISS:
+        sqlalchemy_compiled_cache_misses += 1
+    conn.info["cursor_execute_start"] = now
+
+
+def after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: DefaultExecutionContext,
+    executemany: bool,
+) -> None:
+    global sqlalchemy_execute_time, sqlalchemy_queries
+    sqlalchemy_execute_time += time.time() - conn.info.pop("cursor_execute_start")
+    sqlalchemy_queries += 1
+
 
 @contextmanager
 def get_sqlalchemy_connection() -> Iterator[Connection]:
@@ -38,5 +109,8 @@ def get_sqlalchemy_connection() -> Iterator[Connection]:
             poolclass=NonClosingPool,
             pool_reset_on_return=None,
         )
+        event.listen(sqlalchemy_engine, "before_execute", before_execute)
+        event.listen(sqlalchemy_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(sqlalchemy_engine, "after_cursor_execute", after_cursor_execute)
     with sqlalchemy_engine.connect().execution_options(autocommit=False) as sa_connection:
         yield sa_connection
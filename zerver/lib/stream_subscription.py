@@ -3,14 +3,16 @@ from collections import defaultdict
 from collections.abc import Set as AbstractSet
 from dataclasses import dataclass
 from operator import itemgetter
-from typing import Any, Literal
+from typing import Any, Literal, NamedTuple
 
 from django.db import connection, transaction
-from django.db.models import F, Q, QuerySet
+from django.db.models import F, QuerySet
 from psycopg2 import sql
 from psycopg2.extras import execute_values
 
-from zerver.models import AlertWord, Recipient, Stream, Subscription, UserProfile, UserTopic
+from zerver.lib.alert_words import alert_words_in_realm
+from zerver.lib.cache import cache_with_key, stream_recipient_snapshot_cache_key
+from zerver.models import Recipient, Stream, Subscription, UserProfile
 
 
 @dataclass
@@ -255,15 +257,63 @@ def subscriber_ids_with_stream_history_access(stream: Stream) -> set[int]:
     )
 
 
+class SubscriberSendInfo(NamedTuple):
+    user_profile_id: int
+    is_muted: bool
+    long_term_idle: bool
+    push_notifications: bool | None
+    email_notifications: bool | None
+    wildcard_mentions_notify: bool | None
+    user_profile_push_notifications: bool
+    user_profile_email_notifications: bool
+    user_profile_wildcard_mentions_notify: bool
+    followed_topic_push_notifications: bool
+    followed_topic_email_notifications: bool
+    followed_topic_wildcard_mentions_notify: bool
+
+
+@cache_with_key(stream_recipient_snapshot_cache_key, timeout=3600)
+def get_stream_recipient_snapshot(recipient_id: int) -> list[SubscriberSendInfo]:
+    """The active subscribers of a channel, with the settings which
+    determine how they are notified of messages sent to it.
+
+    This is needed to send every message to the channel, so it is
+    cached; the cache is flushed when subscriptions to the channel, or
+    the relevant settings of its subscribers, change (see
+    flush_subscription and flush_user_profile), both immediately and
+    once the change commits.  The short timeout bounds how long a
+    snapshot cached concurrently with a change can remain stale.
+    """
+    rows = (
+        Subscription.objects.filter(recipient_id=recipient_id, active=True, is_user_active=True)
+        .order_by("user_profile_id")
+        .values_list(
+            "user_profile_id",
+            "is_muted",
+            "user_profile__long_term_idle",
+            "push_notifications",
+            "email_notifications",
+            "wildcard_mentions_notify",
+            "user_profile__enable_stream_push_notifications",
+            "user_profile__enable_stream_email_notifications",
+            "user_profile__wildcard_mentions_notify",
+            "user_profile__enable_followed_topic_push_notifications",
+            "user_profile__enable_followed_topic_email_notifications",
+            "user_profile__enable_followed_topic_wildcard_mentions_notify",
+        )
+    )
+    return [SubscriberSendInfo(*row) for row in rows]
+
+
 def get_subscriptions_for_send_message(
     *,
     realm_id: int,
-    stream_id: int,
-    topic_name: str,
+    recipient_id: int,
     possible_stream_wildcard_mention: bool,
     topic_participant_user_ids: AbstractSet[int],
     possibly_mentioned_user_ids: AbstractSet[int],
-) -> QuerySet[Subscription]:
+    followed_topic_user_ids: AbstractSet[int],
+) -> list[SubscriberSendInfo]:
     """This function optimizes an important use case for large
     streams. Open realms often have many long_term_idle users, which
     can result in 10,000s of long_term_idle recipients in default
@@ -271,10 +321,9 @@ def get_subscriptions_for_send_message(
     for long_term_idle unless message flags or notifications should be
     generated.
 
-    However, it's expensive even to fetch and process them all in
-    Python at all. This function returns all recipients of a stream
-    message that could possibly require action in the send-message
-    codepath.
+    However, it's expensive even to process them all in Python at
+    all. This function returns all recipients of a stream message
+    that could possibly require action in the send-message codepath.
 
     Basically, it returns all subscribers, excluding all long-term
     idle users who it can prove will not receive a UserMessage row or
@@ -292,36 +341,37 @@ def get_subscriptions_for_send_message(
     parsed the message, will do the precise determination.
     """
 
-    query = get_active_subscriptions_for_stream_id(
-        stream_id,
-        include_deactivated_users=False,
-    )
-
+    subscribers = get_stream_recipient_snapshot(recipient_id)
     if possible_stream_wildcard_mention:
-        return query
-
-    query = query.filter(
-        Q(user_profile__long_term_idle=False)
-        | Q(push_notifications=True)
-        | (Q(push_notifications=None) & Q(user_profile__enable_stream_push_notifications=True))
-        | Q(email_notifications=True)
-        | (Q(email_notifications=None) & Q(user_profile__enable_stream_email_notifications=True))
-        | Q(user_profile_id__in=possibly_mentioned_user_ids)
-        | Q(user_profile_id__in=topic_participant_user_ids)
-        | Q(
-            user_profile_id__in=AlertWord.objects.filter(realm_id=realm_id).values_list(
-                "user_profile_id"
+        return subscribers
+
+    alert_word_user_ids: AbstractSet[int] | None = None
+    result = []
+    for sub in subscribers:
+        if (
+            not sub.long_term_idle
+            or (
+                sub.push_notifications
+                if sub.push_notifications is not None
+                else sub.user_profile_push_notifications
             )
-        )
-        | Q(
-            user_profile_id__in=UserTopic.objects.filter(
-                stream_id=stream_id,
-                topic_name__iexact=topic_name,
-                visibility_policy=UserTopic.VisibilityPolicy.FOLLOWED,
-            ).values_list("user_profile_id")
-        )
-    )
-    return query
+            or (
+                sub.email_notifications
+                if sub.email_notifications is not None
+                else sub.user_profile_email_notifications
+            )
+            or sub.user_profile_id in possibly_mentioned_user_ids
+            or sub.user_profile_id in topic_participant_user_ids
+            or sub.user_profile_id in followed_topic_user_ids
+        ):
+            result.append(sub)
+            continue
+
+        if alert_word_user_ids is None:
+            alert_word_user_ids = alert_words_in_realm(realm_id).keys()
+        if sub.user_profile_id in alert_word_user_ids:
+            result.append(sub)
+    return result
 
 
 def update_all_subscriber_counts_for_user(
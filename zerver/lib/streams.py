@@ -1176,7 +1176,9 @@ def bulk_can_access_stream_metadata_user_ids(streams: list[Stream]) -> dict[int,
     return result
 
 
-def can_access_stream_history(user_profile: UserProfile, stream: Stream) -> bool:
+def can_access_stream_history(
+    user_profile: UserProfile, stream: Stream, *, has_content_access: bool = False
+) -> bool:
     """Determine whether the provided user is allowed to access the
     history of the target stream.
 
@@ -1190,7 +1192,9 @@ def can_access_stream_history(user_profile: UserProfile, stream: Stream) -> bool
 
     Note that this function should only be used in contexts where
     access_stream is being called elsewhere to confirm that the user
-    can actually see this stream.
+    can actually see this stream.  Callers that have already done so,
+    with require_content_access=True, can pass has_content_access to
+    avoid repeating the subscription lookup.
     """
 
     if user_profile.realm_id != stream.realm_id:
@@ -1203,6 +1207,11 @@ def can_access_stream_history(user_profile: UserProfile, stream: Stream) -> bool
         return True
 
     if stream.is_history_public_to_subscribers():
+        if has_content_access:
+            # The only check access_stream_common would add here is
+            # that the stream is active.
+            return not stream.deactivated
+
         # In this case, we check if the user is subscribed.
         error = _("Invalid channel name '{channel_name}'").format(channel_name=stream.name)
         try:
@@ -1213,20 +1222,24 @@ def can_access_stream_history(user_profile: UserProfile, stream: Stream) -> bool
     return False
 
 
-def can_access_stream_history_by_name(user_profile: UserProfile, stream_name: str) -> bool:
+def can_access_stream_history_by_name(
+    user_profile: UserProfile, stream_name: str, *, has_content_access: bool = False
+) -> bool:
     try:
         stream = get_stream(stream_name, user_profile.realm)
     except Stream.DoesNotExist:
         return False
-    return can_access_stream_history(user_profile, stream)
+    return can_access_stream_history(user_profile, stream, has_content_access=has_content_access)
 
 
-def can_access_stream_history_by_id(user_profile: UserProfile, stream_id: int) -> bool:
+def can_access_stream_history_by_id(
+    user_profile: UserProfile, stream_id: int, *, has_content_access: bool = False
+) -> bool:
     try:
         stream = get_stream_by_id_in_realm(stream_id, user_profile.realm)
     except Stream.DoesNotExist:
         return False
-    return can_access_stream_history(user_profile, stream)
+    return can_access_stream_history(user_profile, stream, has_content_access=has_content_access)
 
 
 def can_delete_any_message_in_channel(user_profile: UserProfile, stream: Stream) -> bool:
@@ -1,5 +1,4 @@
 from django.db import connection
-from psycopg2.extras import execute_values
 from psycopg2.sql import SQL, Composable, Literal
 
 from zerver.models import UserMessage
@@ -59,18 +58,38 @@ def bulk_insert_ums(ums: list[UserMessageLite]) -> None:
     if not ums:
         return
 
-    vals = [(um.user_profile_id, um.message_id, um.flags) for um in ums]
+    bulk_insert_um_columns(
+        [um.user_profile_id for um in ums],
+        [um.message_id for um in ums],
+        [um.flags for um in ums],
+    )
+
+
+def bulk_insert_um_columns(
+    user_profile_ids: list[int], message_ids: list[int], flags: list[int]
+) -> None:
+    """
+    Inserts UserMessage rows, passed as a list of values for each
+    column.  Each column is sent as a single array parameter, which
+    PostgreSQL UNNESTs back into rows, in a single query; for
+    messages to large channels, this is several times faster than
+    execute_values, which formats a VALUES entry for each row, and
+    sends them 100 rows per query.
+    """
+    assert len(user_profile_ids) == len(message_ids) == len(flags)
+    if not user_profile_ids:
+        return
+
     query = SQL(
         """
-        INSERT into
-            zerver_usermessage (user_profile_id, message_id, flags)
-        VALUES %s
+        INSERT INTO zerver_usermessage (user_profile_id, message_id, flags)
+        SELECT * FROM UNNEST(%s::integer[], %s::integer[], %s::bigint[])
         ON CONFLICT DO NOTHING
-    """
+        """
     )
 
     with connection.cursor() as cursor:
-        execute_values(cursor.cursor, query, vals)
+        cursor.execute(query, [user_profile_ids, message_ids, flags])
 
 
 def bulk_insert_all_ums(
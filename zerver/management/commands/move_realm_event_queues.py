@@ -0,0 +1,75 @@
+from argparse import ArgumentParser
+from collections import defaultdict
+from typing import Any
+
+import orjson
+from django.conf import settings
+from django.core.management.base import CommandError
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.models import UserProfile
+from zerver.tornado.django_api import requests_client
+from zerver.tornado.sharding import (
+    get_realm_tornado_ports,
+    get_tornado_url,
+    get_user_id_tornado_port,
+)
+
+# Number of users whose queues are handed off per request; notices for
+# users are held back while their queues are in transit.
+HANDOFF_BATCH_SIZE = 500
+
+
+class Command(ZulipBaseCommand):
+    help = """\
+Move a realm's live event queues to another Tornado process, without
+restarting Tornado or clients having to re-register.
+
+Run this before installing a sharding configuration which moves the
+realm to PORT; until /etc/zulip/sharding.json is updated (Django picks
+it up without a restart) and nginx is reloaded, the old Tornado
+processes forward the realm's events and requests to PORT.
+"""
+
+    @override
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--port", type=int, required=True, help="Port of the Tornado process to move to"
+        )
+        self.add_realm_args(parser, required=True)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None  # Should be ensured by parser
+        port = options["port"]
+        if port not in settings.TORNADO_PORTS:
+            raise CommandError(f"{port} is not a Tornado port")
+
+        realm_ports = get_realm_tornado_ports(realm)
+        # With multiple processes per port, each user's queues move to
+        # the process serving them once the realm is on PORT alone.
+        user_ids_by_ports: dict[tuple[int, int], list[int]] = defaultdict(list)
+        for user_id in UserProfile.objects.filter(realm=realm).values_list("id", flat=True):
+            user_port = get_user_id_tornado_port(realm_ports, user_id)
+            target_port = get_user_id_tornado_port([port], user_id)
+            if user_port != target_port:
+                user_ids_by_ports[user_port, target_port].append(user_id)
+
+        for (source_port, target_port), user_ids in user_ids_by_ports.items():
+            moved = 0
+            for i in range(0, len(user_ids), HANDOFF_BATCH_SIZE):
+                resp = requests_client().post(
+                    get_tornado_url(source_port) + "/api/internal/hand_off_event_queues",
+                    data=dict(
+                        user_ids=orjson.dumps(user_ids[i : i + HANDOFF_BATCH_SIZE]),
+                        port=orjson.dumps(target_port),
+                        realm_host=realm.host,
+                        secret=settings.SHARED_SECRET,
+                    ),
+                    timeout=60,
+                )
+                resp.raise_for_status()
+                moved += resp.json()["queues"]
+            print(f"Moved {moved} event queues from port {source_port} to port {target_port}.")
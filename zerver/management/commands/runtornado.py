@@ -1,6 +1,8 @@
 import asyncio
 import logging
+import os
 import signal
+import sys
 from contextlib import AsyncExitStack
 from typing import Any
 from urllib.parse import SplitResult
@@ -10,6 +12,7 @@ from django.conf import settings
 from django.core.management.base import CommandError, CommandParser
 from typing_extensions import override
 
+from scripts.lib.zulip_tools import get_tornado_process_port
 from zerver.lib.management import ZulipBaseCommand
 
 if settings.PRODUCTION:
@@ -34,6 +37,36 @@ if settings.USING_RABBITMQ:
 asyncio.set_event_loop_policy(NoAutoCreateEventLoopPolicy())
 
 
+def fork_tornado_processes(num_processes: int) -> int:
+    """Forks num_processes processes, returning the number of the
+    process in each of them.  The parent process never returns; it
+    passes SIGINT and SIGTERM on to the processes, and exits once they
+    all have -- stopping the rest if any of them fails."""
+    children: dict[int, int] = {}
+    for process_num in range(num_processes):
+        pid = os.fork()
+        if pid == 0:
+            return process_num
+        children[pid] = process_num
+
+    def stop_children(signum: int, frame: object) -> None:
+        for pid in children:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGINT, stop_children)
+    signal.signal(signal.SIGTERM, stop_children)
+
+    exit_code = 0
+    while children:
+        pid, status = os.wait()
+        process_num = children.pop(pid)
+        if os.waitstatus_to_exitcode(status) != 0 and exit_code == 0:
+            logging.error("Tornado process %d exited with status %d", process_num, status)
+            exit_code = 1
+            stop_children(signal.SIGTERM, None)
+    sys.exit(exit_code)
+
+
 class Command(ZulipBaseCommand):
     help = "Starts a Tornado Web server wrapping Django."
 
@@ -57,6 +90,7 @@ class Command(ZulipBaseCommand):
         assert isinstance(addrport, str)
 
         from tornado import httpserver
+        from tornado.netutil import bind_sockets
 
         if addrport.isdigit():
             addr, port = "", int(addrport)
@@ -74,6 +108,18 @@ class Command(ZulipBaseCommand):
                 level=logging.INFO, format="%(asctime)s %(levelname)-8s %(message)s"
             )
 
+        # With TORNADO_PROCESSES_PER_PORT set, we run that many
+        # processes, which share the port using SO_REUSEPORT; each of
+        # them handles the events of a partition of the port's users
+        # (see get_user_id_tornado_port), and is addressed as its own
+        # port, which it also listens on.
+        shared_port = None
+        if settings.TORNADO_PROCESSES_PER_PORT > 1:
+            if options["autoreload"]:
+                raise CommandError("--autoreload is not supported with multiple processes per port")
+            process_num = fork_tornado_processes(settings.TORNADO_PROCESSES_PER_PORT)
+            shared_port, port = port, get_tornado_process_port(port, process_num)
+
         async def inner_run() -> None:
             from django.utils import translation
 
@@ -128,6 +174,8 @@ class Command(ZulipBaseCommand):
                 stack.push_async_callback(http_server.close_all_connections)
                 stack.callback(http_server.stop)
                 http_server.listen(port, address=addr)
+                if shared_port is not None:
+                    http_server.add_sockets(bind_sockets(shared_port, addr, reuse_port=True))
 
                 from zerver.tornado.ioloop_logging import logging_data
 
@@ -32,6 +32,11 @@ from zerver.lib.db_connections import reset_queries
 from zerver.lib.debug import maybe_tracemalloc_listen
 from zerver.lib.exceptions import ErrorCode, JsonableError, MissingAuthenticationError, WebhookError
 from zerver.lib.markdown import get_markdown_requests, get_markdown_time
+from zerver.lib.mention import get_mention_cache_hits, get_mention_cache_misses
+from zerver.lib.message_cache import (
+    get_message_dict_local_cache_hits,
+    get_message_dict_local_cache_misses,
+)
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.lib.push_notifications import FailedToConnectBouncerError, InternalBouncerServerError
 from zerver.lib.rate_limiter import RateLimitResult
@@ -43,11 +48,17 @@ from zerver.lib.response import (
     json_unauthorized,
 )
 from zerver.lib.server_initialization import server_initialized
+from zerver.lib.sqlalchemy_utils import (
+    get_sqlalchemy_compile_time,
+    get_sqlalchemy_execute_time,
+    get_sqlalchemy_queries,
+)
 from zerver.lib.subdomains import get_subdomain
 from zerver.lib.typed_endpoint import INTENTIONALLY_UNDOCUMENTED, ApiParamConfig, typed_endpoint
 from zerver.lib.user_agent import parse_user_agent
 from zerver.models import Realm
 from zerver.models.realms import get_realm
+from zerver.tornado.django_api import finish_tornado_notice_batch, start_tornado_notice_batch
 from zproject.config import get_config
 
 ParamT = ParamSpec("ParamT")
@@ -104,6 +115,13 @@ def record_request_start_data(log_data: MutableMapping[str, Any]) -> None:
     log_data["markdown_requests_start"] = get_markdown_requests()
     log_data["ai_time_start"] = get_ai_time()
     log_data["ai_requests_start"] = get_ai_time()
+    log_data["mention_cache_hits_start"] = get_mention_cache_hits()
+    log_data["mention_cache_misses_start"] = get_mention_cache_misses()
+    log_data["message_dict_local_cache_hits_start"] = get_message_dict_local_cache_hits()
+    log_data["message_dict_local_cache_misses_start"] = get_message_dict_local_cache_misses()
+    log_data["sqlalchemy_compile_time_start"] = get_sqlalchemy_compile_time()
+    log_data["sqlalchemy_execute_time_start"] = get_sqlalchemy_execute_time()
+    log_data["sqlalchemy_queries_start"] = get_sqlalchemy_queries()
 
 
 def timedelta_ms(timedelta: float) -> float:
@@ -199,6 +217,55 @@ def write_log_line(
         if ai_time_delta > 0.005:
             ai_output = f" (ai: {format_timedelta(ai_time_delta)}/{ai_count_delta})"
 
+    mention_cache_output = ""
+    if "mention_cache_hits_start" in log_data:
+        mention_cache_hits_delta = get_mention_cache_hits() - log_data["mention_cache_hits_start"]
+        mention_cache_lookups = (
+            mention_cache_hits_delta
+            + get_mention_cache_misses()
+            - log_data["mention_cache_misses_start"]
+        )
+
+        if mention_cache_lookups > 0:
+            mention_cache_output = f" (mention: {mention_cache_hits_delta}/{mention_cache_lookups})"
+
+    message_dict_local_cache_output = ""
+    if "message_dict_local_cache_hits_start" in log_data:
+        message_dict_local_cache_hits_delta = (
+            get_message_dict_local_cache_hits() - log_data["message_dict_local_cache_hits_start"]
+        )
+        message_dict_local_cache_misses_delta = (
+            get_message_dict_local_cache_misses()
+            - log_data["message_dict_local_cache_misses_start"]
+        )
+        message_dict_local_cache_lookups = (
+            message_dict_local_cache_hits_delta + message_dict_local_cache_misses_delta
+        )
+
+        if message_dict_local_cache_lookups > 0:
+            message_dict_local_cache_output = (
+                f" (msg-local: {message_dict_local_cache_hits_delta}"
+                f"/{message_dict_local_cache_lookups})"
+            )
+
+    # Time spent compiling the SQLAlchemy queries we build for narrows,
+    # separately from executing them; the latter is also included in
+    # the database time below.
+    sqlalchemy_output = ""
+    if "sqlalchemy_queries_start" in log_data:
+        sqlalchemy_queries_delta = get_sqlalchemy_queries() - log_data["sqlalchemy_queries_start"]
+        if sqlalchemy_queries_delta > 0:
+            sqlalchemy_compile_time_delta = (
+                get_sqlalchemy_compile_time() - log_data["sqlalchemy_compile_time_start"]
+            )
+            sqlalchemy_execute_time_delta = (
+                get_sqlalchemy_execute_time() - log_data["sqlalchemy_execute_time_start"]
+            )
+            sqlalchemy_output = (
+                f" (sa: {format_timedelta(sqlalchemy_compile_time_delta)} compile"
+                f", {format_timedelta(sqlalchemy_execute_time_delta)}/{sqlalchemy_queries_delta}q)"
+            )
+
     # Get the amount of time spent doing database queries
     db_time_output = ""
     queries = connection.connection.queries if connection.connection is not None else []
@@ -214,7 +281,7 @@ def write_log_line(
         logger_client = f"({requester_for_logs} via {client_name})"
     else:
         logger_client = f"({requester_for_logs} via {client_name}/{client_version})"
-    logger_timing = f"{format_timedelta(time_delta):>5}{optional_orig_delta}{remote_cache_output}{markdown_output}{ai_output}{db_time_output}{startup_output} {path}"
+    logger_timing = f"{format_timedelta(time_delta):>5}{optional_orig_delta}{remote_cache_output}{markdown_output}{ai_output}{mention_cache_output}{message_dict_local_cache_output}{sqlalchemy_output}{db_time_output}{startup_output} {path}"
     logger_line = f"{remote_ip:<15} {method:<7} {status_code:3} {logger_timing}{extra_request_data} {logger_client}"
     if status_code in [200, 304] and method == "GET" and path.startswith("/static"):
         logger.debug(logger_line)
@@ -555,6 +622,19 @@ class FlushDisplayRecipientCache(MiddlewareMixin):
         return response
 
 
+class BatchTornadoNotices(MiddlewareMixin):
+    def process_request(self, request: HttpRequest) -> None:
+        # Events sent while processing the request are published to
+        # Tornado in batches; see TornadoNoticeBatch.
+        start_tornado_notice_batch()
+
+    def process_response(
+        self, request: HttpRequest, response: HttpResponseBase
+    ) -> HttpResponseBase:
+        finish_tornado_notice_batch()
+        return response
+
+
 class HostDomainMiddleware(MiddlewareMixin):
     def process_request(self, request: HttpRequest) -> HttpResponse | None:
         # Match against ALLOWED_HOSTS, which is rather permissive;
@@ -1,5 +1,7 @@
+from typing import Any
+
 from django.db import models
-from django.db.models import CASCADE
+from django.db.models import CASCADE, QuerySet
 from django.db.models.signals import post_delete, post_save
 
 from zerver.lib.cache import (
@@ -35,5 +37,27 @@ def flush_alert_word(*, instance: AlertWord, **kwargs: object) -> None:
     flush_realm_alert_words(realm_id)
 
 
+def flush_deleted_alert_word(
+    *, instance: AlertWord, origin: models.Model | QuerySet[Any] | None = None, **kwargs: object
+) -> None:
+    if not isinstance(origin, AlertWord) and not (
+        isinstance(origin, QuerySet) and origin.model is AlertWord
+    ):
+        # Deleting a user or realm deletes all of their alert words,
+        # so it's cheaper to just flush the caches.
+        flush_realm_alert_words(instance.realm_id)
+        return
+
+    from zerver.lib.alert_words import AlertWordAutomatonUpdate, AlertWordDeletionNotes
+
+    # Rather than having the realm's alert word automaton rebuilt, we
+    # remove the deleted words from the cached one, all at once.
+    updates = AlertWordDeletionNotes.get_notes(origin).updates
+    if instance.realm_id not in updates:
+        cache_delete(realm_alert_words_cache_key(instance.realm_id))
+        updates[instance.realm_id] = AlertWordAutomatonUpdate(instance.realm_id)
+    updates[instance.realm_id].removed_words.append((instance.user_profile_id, instance.word))
+
+
 post_save.connect(flush_alert_word, sender=AlertWord)
-post_delete.connect(flush_alert_word, sender=AlertWord)
+post_delete.connect(flush_deleted_alert_word, sender=AlertWord)
@@ -10,7 +10,7 @@ from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext_lazy
 from typing_extensions import override
 
-from zerver.lib.cache import flush_stream
+from zerver.lib.cache import flush_stream, flush_subscription
 from zerver.lib.types import GroupPermissionSetting
 from zerver.models.channel_folders import ChannelFolder
 from zerver.models.groups import SystemGroups, UserGroup
@@ -442,6 +442,9 @@ class Subscription(models.Model):
     ]
 
 
+post_save.connect(flush_subscription, sender=Subscription)
+
+
 class DefaultStream(models.Model):
     realm = models.ForeignKey(Realm, on_delete=CASCADE)
     stream = models.ForeignKey(Stream, on_delete=CASCADE)
@@ -1428,6 +1428,40 @@ def send_message(client: Client) -> tuple[int, str]:
     return message_id, request["content"]
 
 
+@openapi_test_function("/messages/bulk:post")
+def send_messages_bulk(client: Client) -> None:
+    user_id = 10
+    ensure_users([user_id], ["hamlet"])
+    # {code_example|start}
+    # Send a channel message and a direct message.
+    request = {
+        "messages": json.dumps(
+            [
+                {
+                    "type": "channel",
+                    "to": "Denmark",
+                    "topic": "Castle",
+                    "content": "Build failed.",
+                },
+                {
+                    "type": "direct",
+                    "to": [user_id],
+                    "content": "Build failed.",
+                },
+            ]
+        ),
+    }
+    result = client.call_endpoint(url="/messages/bulk", method="POST", request=request)
+    # {code_example|end}
+    assert_success_response(result)
+    validate_against_openapi_schema(result, "/messages/bulk", "post", "200")
+
+    # Confirm the messages were actually sent.
+    for message_result in result["messages"]:
+        assert message_result["result"] == "success"
+        validate_message(client, message_result["id"], "Build failed.")
+
+
 @openapi_test_function("/messages/{message_id}/reactions:post")
 def add_reaction(client: Client, message_id: int) -> None:
     request: dict[str, Any] = {}
@@ -2107,6 +2141,7 @@ def test_messages(client: Client, nonadmin_client: Client) -> None:
     check_thumbnail_status(client)
     render_message(client)
     message_id, content = send_message(client)
+    send_messages_bulk(client)
     set_message_edit_typing_status(client, message_id)
     add_reaction(client, message_id)
     remove_reaction(client, message_id)
@@ -1,7 +1,15 @@
+from unittest import mock
+
 import orjson
 
 from zerver.actions.alert_words import do_add_alert_words, do_remove_alert_words
-from zerver.lib.alert_words import alert_words_in_realm, user_alert_words
+from zerver.lib.alert_words import (
+    alert_words_in_realm,
+    get_alert_word_automaton,
+    make_alert_word_automaton,
+    user_alert_words,
+)
+from zerver.lib.cache import cache_incr, realm_alert_words_automaton_version_cache_key
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import most_recent_message, most_recent_usermessage
 from zerver.models import AlertWord, UserProfile
@@ -47,7 +55,7 @@ class AlertWordTests(ZulipTestCase):
         Also verifies the cache-flushing behavior.
         """
         user = self.get_user()
-        realm_alert_words = alert_words_in_realm(user.realm)
+        realm_alert_words = alert_words_in_realm(user.realm_id)
         self.assert_length(realm_alert_words.get(user.id, []), 0)
 
         # Add several words, including multi-word and non-ascii words.
@@ -55,21 +63,21 @@ class AlertWordTests(ZulipTestCase):
 
         words = user_alert_words(user)
         self.assertEqual(set(words), set(self.interesting_alert_word_list))
-        realm_alert_words = alert_words_in_realm(user.realm)
+        realm_alert_words = alert_words_in_realm(user.realm_id)
         self.assert_length(realm_alert_words[user.id], 3)
 
         # Test the case-insensitivity of adding words
         do_add_alert_words(user, {"ALert", "ALERT"})
         words = user_alert_words(user)
         self.assertEqual(set(words), set(self.interesting_alert_word_list))
-        realm_alert_words = alert_words_in_realm(user.realm)
+        realm_alert_words = alert_words_in_realm(user.realm_id)
         self.assert_length(realm_alert_words[user.id], 3)
 
         # Test the case-insensitivity of removing words
         do_remove_alert_words(user, {"ALert"})
         words = user_alert_words(user)
         self.assertEqual(set(words), set(self.interesting_alert_word_list) - {"alert"})
-        realm_alert_words = alert_words_in_realm(user.realm)
+        realm_alert_words = alert_words_in_realm(user.realm_id)
         self.assert_length(realm_alert_words[user.id], 2)
 
     def test_remove_word(self) -> None:
@@ -115,12 +123,67 @@ class AlertWordTests(ZulipTestCase):
         user2 = self.example_user("othello")
         do_add_alert_words(user2, ["another"])
 
-        realm_words = alert_words_in_realm(user2.realm)
+        realm_words = alert_words_in_realm(user2.realm_id)
         self.assert_length(realm_words, 2)
         self.assertEqual(set(realm_words.keys()), {user1.id, user2.id})
         self.assertEqual(set(realm_words[user1.id]), set(self.interesting_alert_word_list))
         self.assertEqual(set(realm_words[user2.id]), {"another"})
 
+    def test_alert_word_automaton_cache(self) -> None:
+        user = self.get_user()
+        othello = self.example_user("othello")
+        realm = user.realm
+
+        def alert_word_user_ids() -> dict[str, set[int]]:
+            with self.assert_database_query_count(0, keep_cache_warm=True):
+                alert_word_automaton = get_alert_word_automaton(realm)
+            if alert_word_automaton is None:
+                return {}
+            return {word: user_ids for word, (_word, user_ids) in alert_word_automaton.items()}
+
+        # Build and cache the automaton.
+        get_alert_word_automaton(realm)
+
+        # Once they commit, changes to alert words update the cached
+        # automaton in place, so it doesn't need to be rebuilt from
+        # the database.
+        with self.captureOnCommitCallbacks(execute=True):
+            do_add_alert_words(user, ["Milk"])
+        self.assertEqual(alert_word_user_ids()["milk"], {user.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            do_add_alert_words(othello, ["milk", "eggs", "flour"])
+        self.assertEqual(alert_word_user_ids()["milk"], {user.id, othello.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            do_remove_alert_words(user, ["MILK"])
+        self.assertEqual(alert_word_user_ids()["milk"], {othello.id})
+
+        # Removing several words updates it once, for all of them.
+        with (
+            self.captureOnCommitCallbacks(execute=True),
+            mock.patch(
+                "zerver.lib.alert_words.make_alert_word_automaton",
+                wraps=make_alert_word_automaton,
+            ) as m,
+        ):
+            do_remove_alert_words(othello, ["milk", "eggs", "flour"])
+        m.assert_called_once()
+        self.assertEqual(alert_word_user_ids().keys() & {"milk", "eggs", "flour"}, set())
+
+        # Until a change commits, the cached automaton isn't used.
+        do_add_alert_words(user, ["butter"])
+        with self.assert_database_query_count(1, keep_cache_warm=True):
+            alert_word_automaton = get_alert_word_automaton(realm)
+        assert alert_word_automaton is not None
+        self.assertTrue(alert_word_automaton.exists("butter"))
+
+        # If the version was changed by something else, we rebuild it.
+        cache_incr(realm_alert_words_automaton_version_cache_key(realm.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            do_add_alert_words(user, ["cheese"])
+        with self.assert_database_query_count(1, keep_cache_warm=True):
+            get_alert_word_automaton(realm)
+        self.assertEqual(alert_word_user_ids()["cheese"], {user.id})
+
     def test_json_list_default(self) -> None:
         user = self.get_user()
         self.login_user(user)
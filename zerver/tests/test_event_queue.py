@@ -1,3 +1,5 @@
+import os
+import tempfile
 import time
 from collections.abc import Callable, Collection
 from typing import Any
@@ -25,16 +27,34 @@ from zerver.tornado.event_queue import (
     MAX_QUEUE_TIMEOUT_SECS,
     MOBILE_EVENT_QUEUE_TIMEOUT_SECS,
     ClientDescriptor,
+    abort_client_descriptor_handoff,
     access_client_descriptor,
     add_client_gc_hook,
     allocate_client_descriptor,
     clients,
+    complete_client_descriptor_handoff,
+    do_gc_event_queues,
+    dump_event_queues,
+    flush_event_queue_journal,
     gc_event_queues,
+    get_unsent_handoff_client_descriptors,
+    load_event_queues,
     mark_clients_offline,
+    materialize_event,
     maybe_enqueue_notifications,
     missedmessage_hook,
     persistent_queue_filename,
+    process_notification,
+    receive_client_descriptors,
     receiver_is_off_zulip,
+    serialize_message_payloads,
+    start_client_descriptor_handoff,
+)
+from zerver.tornado.event_queue_journal import EventQueueJournal
+from zerver.tornado.sharding import (
+    get_user_id_tornado_port,
+    prune_user_tornado_port_overrides,
+    user_tornado_port_overrides,
 )
 from zerver.tornado.views import cleanup_event_queue, get_events
 
@@ -1267,8 +1287,8 @@ class FileReloadLogicTest(ZulipTestCase):
                 persistent_queue_filename(9800), "/home/zulip/tornado/event_queues.json"
             )
             self.assertEqual(
-                persistent_queue_filename(9800, last=True),
-                "/home/zulip/tornado/event_queues.json.last",
+                persistent_queue_filename(9800, journal=True),
+                "/home/zulip/tornado/event_queues.json.journal",
             )
         with self.settings(
             JSON_PERSISTENT_QUEUE_FILENAME_PATTERN="/home/zulip/tornado/event_queues%s.json",
@@ -1278,10 +1298,99 @@ class FileReloadLogicTest(ZulipTestCase):
                 persistent_queue_filename(9800), "/home/zulip/tornado/event_queues.9800.json"
             )
             self.assertEqual(
-                persistent_queue_filename(9800, last=True),
-                "/home/zulip/tornado/event_queues.9800.last.json",
+                persistent_queue_filename(9800, journal=True),
+                "/home/zulip/tornado/event_queues.9800.journal.json",
             )
 
+    def test_event_queue_journal_replay(self) -> None:
+        hamlet = self.example_user("hamlet")
+        queue_data = dict(
+            all_public_streams=False,
+            apply_markdown=False,
+            client_gravatar=True,
+            client_type_name="website",
+            event_types=None,
+            last_connection_time=time.time(),
+            queue_timeout=600,
+            realm_id=hamlet.realm_id,
+            user_profile_id=hamlet.id,
+        )
+
+        def umfe(messages: list[int]) -> dict[str, Any]:
+            return dict(
+                type="update_message_flags",
+                operation="add",
+                flag="read",
+                all=False,
+                timestamp=1,
+                messages=messages,
+            )
+
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            self.settings(
+                JSON_PERSISTENT_QUEUE_FILENAME_PATTERN=os.path.join(tmpdir, "event_queues%s.json")
+            ),
+            mock.patch(
+                "zerver.tornado.event_queue.event_queue_journal",
+                EventQueueJournal(persistent_queue_filename(9800, journal=True), next_seq=0),
+            ),
+        ):
+            client = allocate_client_descriptor(queue_data)
+            other_client = allocate_client_descriptor(queue_data)
+            gc_client = allocate_client_descriptor(queue_data)
+            queue = client.event_queue
+            queue.push(umfe([1, 2]))
+            queue.push({"type": "unknown", "timestamp": "1"})
+            queue.push(umfe([3]))
+            # Materializing the virtual events affects how the next
+            # event is collapsed, so must be replayed faithfully.
+            queue.contents()
+            queue.push(umfe([4]))
+            queue.prune(1)
+
+            # Snapshot the queues, then make further changes which
+            # are only recorded in the journal.
+            dump_event_queues(9800)
+            queue.push(umfe([5]))
+            shared_event = {"type": "unknown", "timestamp": "2"}
+            queue.push(shared_event, {"flags": ["read"]})
+            other_client.event_queue.push(shared_event, {"flags": []})
+            do_gc_event_queues({gc_client.event_queue.id}, {hamlet.id}, {hamlet.realm_id})
+            expected = client.to_dict()
+            other_expected = other_client.to_dict()
+
+            # Simulate a restart of the Tornado process.
+            flush_event_queue_journal()
+            with open(persistent_queue_filename(9800, journal=True), "rb") as f:
+                records = [orjson.loads(line) for line in f]
+            # The shared event is only written once, for both queues.
+            self.assertEqual(
+                [data["targets"] for seq, op, queue_id, data in records if op == "push"],
+                [
+                    [[queue.id, None]],
+                    [[queue.id, {"flags": ["read"]}], [other_client.event_queue.id, {"flags": []}]],
+                ],
+            )
+            clients.clear()
+            load_event_queues(9800)
+
+            self.assertEqual(list(clients), [queue.id, other_client.event_queue.id])
+            self.assertEqual(clients[queue.id].to_dict(), expected)
+            self.assertEqual(clients[other_client.event_queue.id].to_dict(), other_expected)
+
+            # Records which were already included in a snapshot, but
+            # which we did not truncate from the journal before
+            # stopping, are not replayed a second time.
+            with open(persistent_queue_filename(9800, journal=True), "rb") as f:
+                journal_contents = f.read()
+            dump_event_queues(9800)
+            with open(persistent_queue_filename(9800, journal=True), "ab") as f:
+                f.write(journal_contents)
+            clients.clear()
+            load_event_queues(9800)
+            self.assertEqual(clients[queue.id].to_dict(), expected)
+
 
 class PruneInternalDataTest(ZulipTestCase):
     def test_prune_internal_data(self) -> None:
@@ -1369,6 +1478,50 @@ class EventQueueTest(ZulipTestCase):
         self.assertEqual(queue.contents(), [out_dict])
         self.verify_to_dict_end_to_end(client)
 
+    def test_shared_event(self) -> None:
+        queue = self.get_client_descriptor().event_queue
+        other_queue = self.get_client_descriptor().event_queue
+        other_queue.push({"type": "unknown"})
+
+        event = dict(type="message", message=dict(id=1))
+        queue.push(event, dict(flags=["read"]))
+        other_queue.push(event, dict(flags=[]))
+
+        # The event is not copied into each queue...
+        self.assertIs(queue.queue[0][1], event)
+        self.assertIs(other_queue.queue[1][1], event)
+
+        # ...but each client sees its own ID and overlaid fields.
+        self.assertEqual(
+            queue.contents(), [dict(type="message", message=dict(id=1), flags=["read"], id=0)]
+        )
+        self.assertEqual(
+            other_queue.contents()[1],
+            dict(type="message", message=dict(id=1), flags=[], id=1),
+        )
+        self.assertEqual(event, dict(type="message", message=dict(id=1)))
+
+    def test_serialize_message_payloads(self) -> None:
+        message = dict(id=1, content="hello")
+        events = [
+            dict(type="message", message=message, flags=["read"], id=0),
+            dict(type="unknown", id=1),
+        ]
+        other_events = [dict(type="message", message=message, flags=[], id=0)]
+        expected = orjson.dumps(events)
+
+        serialize_message_payloads(events)
+        serialize_message_payloads(other_events)
+
+        # The message payload is only encoded once.
+        self.assertIsInstance(events[0]["message"], orjson.Fragment)
+        self.assertIs(events[0]["message"], other_events[0]["message"])
+        self.assertEqual(orjson.dumps(events), expected)
+        self.assertEqual(
+            orjson.loads(orjson.dumps(other_events)),
+            [dict(type="message", message=message, flags=[], id=0)],
+        )
+
     def test_event_collapsing(self) -> None:
         client = self.get_client_descriptor()
         queue = client.event_queue
@@ -1563,7 +1716,10 @@ class EventQueueTest(ZulipTestCase):
         self.verify_to_dict_end_to_end(client)
 
         queue.push({"type": "unknown", "timestamp": "1"})
-        self.assertEqual(list(queue.queue), [{"id": 1, "type": "unknown", "timestamp": "1"}])
+        self.assertEqual(
+            [materialize_event(queued_event) for queued_event in queue.queue],
+            [{"id": 1, "type": "unknown", "timestamp": "1"}],
+        )
         self.assertEqual(queue.virtual_events, {"flags/add/read": event})
         # And we can still reconstruct newest_pruned_id etc. correctly
         self.verify_to_dict_end_to_end(client)
@@ -1584,6 +1740,101 @@ class EventQueueTest(ZulipTestCase):
         queue.prune(1)
         self.verify_to_dict_end_to_end(client)
 
+    def test_client_descriptor_handoff(self) -> None:
+        client = self.get_client_descriptor()
+        hamlet_id = client.user_profile_id
+        realm_host = self.example_user("hamlet").realm.host
+        queue_id = client.event_queue.id
+        cordelia = self.example_user("cordelia")
+        cordelia_client = allocate_client_descriptor(
+            dict(
+                all_public_streams=False,
+                apply_markdown=False,
+                client_gravatar=True,
+                client_type_name="website",
+                event_types=None,
+                last_connection_time=time.time(),
+                queue_timeout=600,
+                realm_id=cordelia.realm_id,
+                user_profile_id=cordelia.id,
+            )
+        )
+        client.add_event({"type": "unknown", "value": 1})
+        notice = {"event": {"type": "unknown", "value": 2}, "users": [hamlet_id, cordelia.id]}
+
+        # Notices for users in the middle of a handoff are held back,
+        # and applied locally if the handoff is aborted.
+        queues = start_client_descriptor_handoff([hamlet_id])
+        self.assertEqual(queues, [client.to_dict()])
+        process_notification(notice)
+        self.assert_length(client.event_queue.contents(), 1)
+        self.assert_length(cordelia_client.event_queue.contents(), 1)
+        abort_client_descriptor_handoff()
+        self.assert_length(client.event_queue.contents(), 2)
+
+        # Once complete, they are forwarded to the new process.
+        queues = start_client_descriptor_handoff([hamlet_id])
+        process_notification(notice)
+
+        # Queues registered during the handoff are only removed once
+        # they have been sent to the new process too.
+        def allocate_hamlet_queue() -> ClientDescriptor:
+            return allocate_client_descriptor(
+                dict(
+                    all_public_streams=False,
+                    apply_markdown=False,
+                    client_gravatar=True,
+                    client_type_name="website",
+                    event_types=None,
+                    last_connection_time=time.time(),
+                    queue_timeout=600,
+                    realm_id=client.realm_id,
+                    user_profile_id=hamlet_id,
+                )
+            )
+
+        sent_client = allocate_hamlet_queue()
+        self.assertEqual(get_unsent_handoff_client_descriptors(), [sent_client.to_dict()])
+        self.assertEqual(get_unsent_handoff_client_descriptors(), [])
+        unsent_client = allocate_hamlet_queue()
+
+        with (
+            self.settings(USING_RABBITMQ=True),
+            mock.patch("zerver.tornado.event_queue.get_queue_client") as mock_queue_client,
+        ):
+            complete_client_descriptor_handoff(9801, realm_host)
+        mock_queue_client().json_publish.assert_called_once_with(
+            "notify_tornado", {"event": {"type": "unknown", "value": 2}, "users": [hamlet_id]}
+        )
+        self.assertNotIn(queue_id, clients)
+        self.assertNotIn(sent_client.event_queue.id, clients)
+        self.assertIn(unsent_client.event_queue.id, clients)
+        self.assertEqual(user_tornado_port_overrides, {hamlet_id: 9801})
+
+        # The receiving process restores the queue, and ignores a
+        # retried request for it.
+        self.assertEqual(receive_client_descriptors(queues, 9800, realm_host), 1)
+        self.assertEqual(clients[queue_id].to_dict(), queues[0])
+        self.assertEqual(access_client_descriptor(hamlet_id, queue_id), clients[queue_id])
+        self.assertEqual(user_tornado_port_overrides, {hamlet_id: 9800})
+        self.assertEqual(receive_client_descriptors(queues, 9800, realm_host), 0)
+
+        # The override is dropped once the sharding configuration agrees.
+        prune_user_tornado_port_overrides()
+        self.assertEqual(user_tornado_port_overrides, {hamlet_id: 9800})
+        with self.settings(TORNADO_PORTS=[9800]):
+            prune_user_tornado_port_overrides()
+        self.assertEqual(user_tornado_port_overrides, {})
+
+    def test_tornado_processes_per_port(self) -> None:
+        self.assertEqual(get_user_id_tornado_port([9800, 9801], 5), 9801)
+        with self.settings(TORNADO_PROCESSES_PER_PORT=2):
+            # Users are partitioned between the processes serving their
+            # port, each of which listens on a port of its own.
+            self.assertEqual(get_user_id_tornado_port([9800, 9801], 5), 10801)
+            self.assertEqual(get_user_id_tornado_port([9800, 9801], 7), 11801)
+            self.assertEqual(get_user_id_tornado_port([9800], 7), 11800)
+
 
 class OfflineEventQueueTest(ZulipTestCase):
     """Tests for the offline marking mechanism for long-lived event queues."""
@@ -1718,12 +1969,16 @@ class OfflineEventQueueTest(ZulipTestCase):
         self.assertIn(queue_id, clients)
         self.assertIn(long_lived_queue_id, clients)
 
-        # Set both queues idle past the EVENT_QUEUE_OFFLINE_TIMEOUT_SECS.
-        last_connection_time = time.time() - EVENT_QUEUE_OFFLINE_TIMEOUT_SECS - 1
-        client.last_connection_time = last_connection_time
-        long_lived_client.last_connection_time = last_connection_time
+        # Nothing is due to be checked yet.
+        gc_event_queues(port=9993)
+        self.assertIn(queue_id, clients)
+        self.assertFalse(long_lived_client.offline)
 
-        with mock.patch("zerver.tornado.event_queue.maybe_enqueue_notifications") as mock_enqueue:
+        # Leave both queues idle past the EVENT_QUEUE_OFFLINE_TIMEOUT_SECS.
+        with (
+            time_machine.travel(self.NOW + EVENT_QUEUE_OFFLINE_TIMEOUT_SECS + 1, tick=False),
+            mock.patch("zerver.tornado.event_queue.maybe_enqueue_notifications") as mock_enqueue,
+        ):
             gc_event_queues(port=9993)
 
             # The queue with default timeout is removed.
@@ -34,15 +34,25 @@ from zerver.models.clients import get_client
 from zerver.models.realms import get_realm
 from zerver.models.streams import get_stream
 from zerver.models.users import get_system_bot
-from zerver.tornado.django_api import EventQueueData
+from zerver.tornado.django_api import (
+    TORNADO_NOTICE_BATCH_MAX_DELAY_SECS,
+    EventQueueData,
+    batched_tornado_notices,
+    send_event_on_commit,
+    send_event_rollback_unsafe,
+)
 from zerver.tornado.event_queue import (
     DEFAULT_EVENT_QUEUE_TIMEOUT_SECS,
     MOBILE_EVENT_QUEUE_TIMEOUT_SECS,
+    ClientDescriptor,
     allocate_client_descriptor,
     clear_client_event_queues_for_testing,
     get_client_info_for_message_event,
+    get_wrapped_process_notification,
     mark_clients_to_reload,
+    materialize_event,
     process_message_event,
+    process_notification,
     send_web_reload_client_events,
 )
 from zerver.tornado.exceptions import BadEventQueueIdError
@@ -352,6 +362,76 @@ class EventsEndpointTest(ZulipTestCase):
         self.assertEqual(str(context.exception), "Missing 'data' argument")
         self.assertEqual(context.exception.http_status_code, 400)
 
+    def test_batched_tornado_notices(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        with (
+            self.settings(USING_RABBITMQ=True),
+            mock.patch("zerver.tornado.django_api.queue_json_publish_rollback_unsafe") as m,
+        ):
+            with batched_tornado_notices():
+                send_event_rollback_unsafe(hamlet.realm, dict(type="other", x=1), [hamlet.id])
+                send_event_rollback_unsafe(hamlet.realm, dict(type="other", x=2), [cordelia.id])
+                m.assert_not_called()
+            m.assert_called_once_with(
+                "notify_tornado",
+                dict(
+                    notices=[
+                        dict(event=dict(type="other", x=1), users=[hamlet.id]),
+                        dict(event=dict(type="other", x=2), users=[cordelia.id]),
+                    ]
+                ),
+            )
+
+        # Tornado processes each notice in the batch separately.
+        processed: list[dict[str, Any]] = []
+        with mock.patch("zerver.tornado.event_queue.process_notification", processed.append):
+            get_wrapped_process_notification("notify_tornado")(
+                [
+                    m.call_args.args[1],
+                    dict(event=dict(type="other", x=3), users=[hamlet.id]),
+                ]
+            )
+        self.assertEqual(
+            [notice["event"]["x"] for notice in processed],
+            [1, 2, 3],
+        )
+
+    def test_tornado_metrics(self) -> None:
+        hamlet = self.example_user("hamlet")
+        process_notification(dict(event=dict(type="other"), users=[hamlet.id]))
+
+        result = self.client_get("/api/internal/metrics")
+        self.assertEqual(result.status_code, 200)
+        metrics = result.content.decode()
+        self.assertIn("zulip_tornado_event_queues ", metrics)
+        self.assertIn('zulip_tornado_notice_users_total{event_type="other"}', metrics)
+        self.assertIn("zulip_tornado_ioloop_lag_seconds_bucket", metrics)
+
+        result = self.client_get("/api/internal/metrics", REMOTE_ADDR="203.0.113.1")
+        self.assert_json_error(result, "Access denied", status_code=403)
+
+    def test_batched_tornado_notices_deadline(self) -> None:
+        hamlet = self.example_user("hamlet")
+        now = time.monotonic()
+        with (
+            self.settings(USING_RABBITMQ=True),
+            mock.patch("zerver.tornado.django_api.queue_json_publish_rollback_unsafe") as m,
+            mock.patch("zerver.tornado.django_api.time.monotonic", return_value=now) as mock_time,
+            batched_tornado_notices(),
+        ):
+            send_event_rollback_unsafe(hamlet.realm, dict(type="other", x=1), [hamlet.id])
+            m.assert_not_called()
+
+            # An overdue batch is published when another event is
+            # scheduled, even before it is added to the batch.
+            mock_time.return_value = now + TORNADO_NOTICE_BATCH_MAX_DELAY_SECS
+            with self.captureOnCommitCallbacks(execute=False):
+                send_event_on_commit(hamlet.realm, dict(type="other", x=2), [hamlet.id])
+            m.assert_called_once_with(
+                "notify_tornado", dict(event=dict(type="other", x=1), users=[hamlet.id])
+            )
+
     def test_web_reload_clients(self) -> None:
         # Minimal testing of the /api/internal/web_reload_clients endpoint
         post_data = {
@@ -970,6 +1050,45 @@ class ClientDescriptorsTest(ZulipTestCase):
         dct = client_info[client.event_queue.id]
         self.assertEqual(dct["is_sender"], True)
 
+    def test_get_client_info_for_narrowed_clients(self) -> None:
+        hamlet = self.example_user("hamlet")
+        realm = hamlet.realm
+
+        def allocate_narrowed_client(narrow: list[list[str]]) -> ClientDescriptor:
+            queue_data = dict(
+                all_public_streams=False,
+                apply_markdown=True,
+                client_gravatar=True,
+                client_type_name="website",
+                event_types=["message"],
+                last_connection_time=time.time(),
+                queue_timeout=0,
+                realm_id=realm.id,
+                user_profile_id=hamlet.id,
+                user_recipient_id=hamlet.recipient_id,
+                narrow=narrow,
+            )
+            return allocate_client_descriptor(queue_data)
+
+        channel_client = allocate_narrowed_client([["channel", "Denmark"], ["topic", "lunch"]])
+        mentioned_client = allocate_narrowed_client([["is", "mentioned"]])
+
+        # Clients narrowed to a channel are only considered for
+        # messages to that channel.
+        client_info = get_client_info_for_message_event(
+            dict(realm_id=realm.id, stream_name="denmark"),
+            users=[],
+        )
+        self.assertEqual(
+            set(client_info), {channel_client.event_queue.id, mentioned_client.event_queue.id}
+        )
+
+        client_info = get_client_info_for_message_event(
+            dict(realm_id=realm.id, stream_name="Verona"),
+            users=[],
+        )
+        self.assertEqual(set(client_info), {mentioned_client.event_queue.id})
+
     def test_get_client_info_for_normal_users(self) -> None:
         hamlet = self.example_user("hamlet")
         cordelia = self.example_user("cordelia")
@@ -1055,8 +1174,10 @@ class ClientDescriptorsTest(ZulipTestCase):
                 assert event["type"] == "message"
                 return True
 
-            def add_event(self, event: dict[str, Any]) -> None:
-                self.events.append(event)
+            def add_event(
+                self, event: dict[str, Any], overlay: dict[str, Any] | None = None
+            ) -> None:
+                self.events.append({**event, **(overlay or {})})
 
         client1 = MockClient(
             user_profile_id=hamlet.id,
@@ -1260,7 +1381,7 @@ class ReloadWebClientsTest(ZulipTestCase):
         mark_clients_to_reload([client.event_queue.id])
         send_web_reload_client_events()
         self.assert_length(client.event_queue.queue, 1)
-        reload_event = client.event_queue.queue[0]
+        reload_event = materialize_event(client.event_queue.queue[0])
 
         check_web_reload_client_event("web_reload_client_event", reload_event)
         self.assertEqual(
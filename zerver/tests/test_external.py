@@ -144,6 +144,27 @@ class RateLimitTests(ZulipTestCase):
 
         self.do_test_hit_ratelimits(lambda: self.send_api_message(user, "some stuff"))
 
+    @ratelimit_rule(60, 5, domain="api_by_user")
+    def test_bulk_send_ratelimits_each_message(self) -> None:
+        user = self.example_user("cordelia")
+        othello = self.example_user("othello")
+        RateLimitedUser(user).clear_history()
+        messages = [{"type": "direct", "to": [othello.id], "content": "some stuff"}] * 3
+
+        def send_messages() -> "TestHttpResponse":
+            return self.api_post(
+                user, "/api/v1/messages/bulk", {"messages": orjson.dumps(messages).decode()}
+            )
+
+        with time_machine.travel(time.time(), tick=False):
+            result = send_messages()
+            self.assert_json_success(result)
+            self.assertEqual(result["X-RateLimit-Remaining"], "2")
+
+            # The second request would make 6 API calls in all.
+            result = send_messages()
+            self.assertEqual(result.status_code, 429)
+
     @ratelimit_rule(1, 5, domain="email_change_by_user")
     def test_hit_change_email_ratelimit_as_user(self) -> None:
         user = self.example_user("cordelia")
@@ -23,12 +23,14 @@ from zerver.actions.realm_settings import do_set_realm_property
 from zerver.actions.streams import do_change_stream_group_based_setting
 from zerver.actions.user_groups import (
     add_subgroups_to_user_group,
+    bulk_add_members_to_user_groups,
     check_add_user_group,
     do_deactivate_user_group,
 )
-from zerver.actions.user_settings import do_change_user_setting
+from zerver.actions.user_settings import do_change_full_name, do_change_user_setting
 from zerver.actions.users import change_user_is_active
 from zerver.lib.alert_words import get_alert_word_automaton
+from zerver.lib.cache import cache_set, realm_mention_data_version_cache_key
 from zerver.lib.camo import get_camo_url
 from zerver.lib.create_user import create_user
 from zerver.lib.emoji import codepoint_to_name, get_emoji_url
@@ -41,6 +43,7 @@ from zerver.lib.markdown import (
     MessageRenderingResult,
     clear_web_link_regex_for_testing,
     content_has_emoji_syntax,
+    get_possibly_matching_linkifiers,
     image_preview_enabled,
     markdown_convert,
     possible_linked_stream_names,
@@ -56,6 +59,8 @@ from zerver.lib.mention import (
     MentionBackend,
     MentionData,
     PossibleMentions,
+    get_mention_cache_hits,
+    get_mention_data_version,
     get_possible_mentions_info,
     possible_mentions,
     possible_user_group_mentions,
@@ -310,6 +315,50 @@ class MarkdownMiscTest(ZulipTestCase):
         mention_data = MentionData(mention_backend, content, message_sender=None)
         self.assertEqual(mention_data.get_group_members(group.id), {hamlet.id})
 
+    def test_mention_data_cache(self) -> None:
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        othello = self.example_user("othello")
+        group = NamedUserGroup.objects.get(realm_for_sharding=realm, name="hamletcharacters")
+        content = f"@**King Hamlet** @**|{cordelia.id}** @*hamletcharacters*"
+        MentionData(MentionBackend(realm.id), content, message_sender=None)
+
+        # Later messages, even with another MentionBackend, look up
+        # the users and group members in the realm's shared cache;
+        # only the group itself is fetched from the database.
+        hits = get_mention_cache_hits()
+        with self.assert_database_query_count(1, keep_cache_warm=True):
+            mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(get_mention_cache_hits(), hits + 3)
+        self.assertEqual(mention_data.get_user_ids(), {hamlet.id, cordelia.id})
+        self.assertEqual(mention_data.get_group_members(group.id), {hamlet.id, cordelia.id})
+
+        # Changing group membership invalidates the cache.
+        bulk_add_members_to_user_groups([group], [othello.id], acting_user=None)
+        mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(
+            mention_data.get_group_members(group.id), {hamlet.id, cordelia.id, othello.id}
+        )
+
+        # As does renaming a user.
+        do_change_full_name(hamlet, "Prince Hamlet", acting_user=None)
+        mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(mention_data.get_user_ids(), {cordelia.id})
+        mention_data = MentionData(
+            MentionBackend(realm.id), "@**prince hamlet**", message_sender=None
+        )
+        self.assertEqual(mention_data.get_user_ids(), {hamlet.id})
+
+        # Lookups cached by another process before the change commits
+        # are flushed again once it does.
+        stale_version = get_mention_data_version(realm.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            do_change_full_name(hamlet, "King Hamlet", acting_user=None)
+            cache_set(realm_mention_data_version_cache_key(realm.id), stale_version)
+        mention_data = MentionData(MentionBackend(realm.id), content, message_sender=None)
+        self.assertEqual(mention_data.get_user_ids(), {hamlet.id, cordelia.id})
+
     def test_bulk_user_group_mentions(self) -> None:
         realm = get_realm("zulip")
         hamlet = self.example_user("hamlet")
@@ -474,6 +523,55 @@ class MarkdownMiscTest(ZulipTestCase):
             )
             self.assertEqual(render_tex("foo"), "<i>html</i>")
 
+    def test_rendered_content_cache(self) -> None:
+        realm = get_realm("zulip")
+        bot = self.example_user("default_bot")
+        msg = Message(sender=bot, sending_client=get_client("test"), realm=realm)
+
+        content = "Build #123 failed: https://ci.example.com/builds/123"
+        rendered = markdown_convert(content, message=msg, message_realm=realm, sent_by_bot=True)
+        self.assertTrue(msg.has_link)
+
+        # Rendering the same content again skips Markdown entirely,
+        # but still sets the message's attributes.
+        msg = Message(sender=bot, sending_client=get_client("test"), realm=realm)
+        with mock.patch("zerver.lib.markdown.unsafe_timeout") as m:
+            cached = markdown_convert(content, message=msg, message_realm=realm, sent_by_bot=True)
+        m.assert_not_called()
+        self.assertEqual(cached, rendered)
+        self.assertTrue(msg.has_link)
+
+        # Adding a linkifier changes the key, so we render again.
+        RealmFilter(
+            realm=realm,
+            pattern=r"#(?P<id>[0-9]+)",
+            url_template=r"https://trac.example.com/ticket/{id}",
+        ).save()
+        converted = markdown_convert(content, message=msg, message_realm=realm, sent_by_bot=True)
+        self.assertIn(
+            '<a href="https://trac.example.com/ticket/123">#123</a>', converted.rendered_content
+        )
+
+        # So does changing the realm's default code block language.
+        code_content = "```\nprint(1)\n```"
+        markdown_convert(code_content, message=msg, message_realm=realm, sent_by_bot=True)
+        do_set_realm_property(realm, "default_code_block_language", "python", acting_user=None)
+        converted = markdown_convert(
+            code_content, message=msg, message_realm=realm, sent_by_bot=True
+        )
+        self.assertIn('data-code-language="Python"', converted.rendered_content)
+
+        # Messages from humans, and content with mentions, aren't cached.
+        for uncached_content, sent_by_bot in [(content, False), ("@**King Hamlet** #123", True)]:
+            markdown_convert(
+                uncached_content, message=msg, message_realm=realm, sent_by_bot=sent_by_bot
+            )
+            with mock.patch("zerver.lib.markdown.unsafe_timeout", return_value="<p>x</p>") as m:
+                markdown_convert(
+                    uncached_content, message=msg, message_realm=realm, sent_by_bot=sent_by_bot
+                )
+            m.assert_called_once()
+
 
 class MarkdownListPreprocessorTest(ZulipTestCase):
     # We test that the preprocessor inserts blank lines at correct places.
@@ -1982,6 +2080,75 @@ class MarkdownLinkifierTest(ZulipTestCase):
                 ],
             )
 
+    def test_possibly_matching_linkifiers(self) -> None:
+        realm = get_realm("zulip")
+        RealmFilter.objects.filter(realm=realm).delete()
+        for pattern in [r"#(?P<id>[0-9]+)", r"ZUL-(?P<id>[0-9]+)", r"(?P<id>[a-f0-9]{40})"]:
+            RealmFilter(
+                realm=realm, pattern=pattern, url_template="https://example.com/{id}"
+            ).save()
+        linkifiers = linkifiers_for_realm(realm.id)
+
+        def matching_patterns(text: str) -> list[str]:
+            return [
+                linkifier["pattern"]
+                for linkifier in get_possibly_matching_linkifiers(linkifiers, text)
+            ]
+
+        self.assertEqual(matching_patterns("No ticket here"), [])
+        self.assertEqual(matching_patterns("ZUL-12"), [r"ZUL-(?P<id>[0-9]+)"])
+        # The order of the linkifiers is preserved.
+        self.assertEqual(
+            matching_patterns(f"ZUL-12 fixed in {'a' * 40}, see #12"),
+            [r"#(?P<id>[0-9]+)", r"ZUL-(?P<id>[0-9]+)", r"(?P<id>[a-f0-9]{40})"],
+        )
+        # The source pattern matching somewhere is necessary, but not
+        # sufficient, for the linkifier to apply.
+        self.assertEqual(
+            matching_patterns("ZUL-12x #3"), [r"#(?P<id>[0-9]+)", r"ZUL-(?P<id>[0-9]+)"]
+        )
+        converted = markdown_convert("ZUL-12x #3", message_realm=realm)
+        self.assertEqual(
+            converted.rendered_content,
+            '<p>ZUL-12x <a href="https://example.com/3">#3</a></p>',
+        )
+        self.assertEqual(
+            topic_links(realm.id, "ZUL-12 and #3"),
+            [
+                {"url": "https://example.com/12", "text": "ZUL-12"},
+                {"url": "https://example.com/3", "text": "#3"},
+            ],
+        )
+
+        # In a linkifier applied to a later paragraph, ^ matches at
+        # the start of that paragraph, which isn't the start of the
+        # message, so such linkifiers are always tried.
+        RealmFilter(
+            realm=realm, pattern=r"^TASK-(?P<id>[0-9]+)", url_template="https://example.com/{id}"
+        ).save()
+        linkifiers = linkifiers_for_realm(realm.id)
+        self.assertEqual(matching_patterns("No ticket here"), [r"^TASK-(?P<id>[0-9]+)"])
+        converted = markdown_convert("Tasks:\n\nTASK-1", message_realm=realm)
+        self.assertEqual(
+            converted.rendered_content,
+            '<p>Tasks:</p>\n<p><a href="https://example.com/1">TASK-1</a></p>',
+        )
+
+        # As are those using \A and \z.
+        RealmFilter(
+            realm=realm, pattern=r"\ABUG-(?P<id>[0-9]+)\z", url_template="https://example.com/{id}"
+        ).save()
+        linkifiers = linkifiers_for_realm(realm.id)
+        self.assertEqual(
+            matching_patterns("No ticket here"),
+            [r"^TASK-(?P<id>[0-9]+)", r"\ABUG-(?P<id>[0-9]+)\z"],
+        )
+        converted = markdown_convert("Bugs:\n\nBUG-2", message_realm=realm)
+        self.assertEqual(
+            converted.rendered_content,
+            '<p>Bugs:</p>\n<p><a href="https://example.com/2">BUG-2</a></p>',
+        )
+
 
 class MarkdownAlertTest(ZulipTestCase):
     def test_alert_words(self) -> None:
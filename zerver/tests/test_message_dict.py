@@ -1,14 +1,29 @@
 from typing import Any
 from unittest import mock
 
+import orjson
 from django.test import override_settings
 from django.utils.timezone import now as timezone_now
 
-from zerver.lib.cache import cache_delete, to_dict_cache_key_id
+from zerver.lib.cache import (
+    cache_delete,
+    cache_get_many,
+    to_dict_cache_key_id,
+    to_dict_version_cache_key_id,
+)
 from zerver.lib.display_recipient import get_display_recipient
 from zerver.lib.markdown import version as markdown_version
 from zerver.lib.message import messages_for_ids
-from zerver.lib.message_cache import MessageDict, sew_messages_and_reactions
+from zerver.lib.message_cache import (
+    MessageDict,
+    bulk_fetch_message_dicts,
+    extract_message_dict,
+    get_message_dict_local_cache_hits,
+    get_message_dict_local_cache_misses,
+    message_dict_local_cache,
+    sew_messages_and_reactions,
+    stringify_message_dict,
+)
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import make_client
@@ -404,6 +419,28 @@ class MessageHydrationTest(ZulipTestCase):
         )
         self.assertEqual(obj["type"], "private")
 
+    def test_message_dict_encoding(self) -> None:
+        hamlet = self.example_user("hamlet")
+        message_id = self.send_stream_message(hamlet, "Denmark", content="foo")
+        message_dict = MessageDict.ids_to_dict([message_id])[0]
+        self.assertNotIn("edit_history", message_dict)
+        self.assertEqual(extract_message_dict(stringify_message_dict(message_dict)), message_dict)
+
+        result = self.api_post(
+            hamlet, f"/api/v1/messages/{message_id}/reactions", {"emoji_name": "smile"}
+        )
+        self.assert_json_success(result)
+        result = self.api_patch(hamlet, f"/api/v1/messages/{message_id}", {"content": "bar"})
+        self.assert_json_success(result)
+        message_dict = MessageDict.ids_to_dict([message_id])[0]
+        self.assert_length(message_dict["edit_history"], 1)
+        self.assert_length(message_dict["reactions"], 1)
+        encoded_message_dict = stringify_message_dict(message_dict)
+        self.assertEqual(extract_message_dict(encoded_message_dict), message_dict)
+
+        # The field names are not stored with each message.
+        self.assertLess(len(encoded_message_dict), len(orjson.dumps(message_dict)))
+
     def test_messages_for_ids(self) -> None:
         hamlet = self.example_user("hamlet")
         cordelia = self.example_user("cordelia")
@@ -449,6 +486,61 @@ class MessageHydrationTest(ZulipTestCase):
         self.assertIn('class="user-mention"', new_message["content"])
         self.assertEqual(new_message["flags"], ["mentioned"])
 
+    def test_message_dict_local_cache(self) -> None:
+        hamlet = self.example_user("hamlet")
+        message_id = self.send_stream_message(hamlet, "Denmark", content="foo")
+
+        # Sending the message cached its dict and version, which we
+        # fetch together the first time.
+        message_dict_local_cache.pop(message_id, None)
+        with (
+            self.assert_database_query_count(0, keep_cache_warm=True),
+            mock.patch(
+                "zerver.lib.message_cache.cache_get_many", wraps=cache_get_many
+            ) as cache_get_many_mock,
+        ):
+            bulk_fetch_message_dicts([message_id])
+        cache_get_many_mock.assert_called_once()
+
+        # Fetching the message again only needs its version from
+        # memcached; the dict comes from the process-local cache.
+        hits = get_message_dict_local_cache_hits()
+        with (
+            self.assert_database_query_count(0, keep_cache_warm=True),
+            mock.patch(
+                "zerver.lib.message_cache.cache_get_many", wraps=cache_get_many
+            ) as cache_get_many_mock,
+        ):
+            message_dict = bulk_fetch_message_dicts([message_id])[message_id]
+        self.assertEqual(
+            cache_get_many_mock.call_args.args[0], [to_dict_version_cache_key_id(message_id)]
+        )
+        self.assertEqual(get_message_dict_local_cache_hits(), hits + 1)
+        self.assertEqual(message_dict["content"], "foo")
+
+        # Updating the message's dict in memcached, as adding a
+        # reaction does, invalidates the local copy.
+        result = self.api_post(
+            hamlet, f"/api/v1/messages/{message_id}/reactions", {"emoji_name": "smile"}
+        )
+        self.assert_json_success(result)
+        misses = get_message_dict_local_cache_misses()
+        message_dict = bulk_fetch_message_dicts([message_id])[message_id]
+        self.assertEqual(get_message_dict_local_cache_misses(), misses + 1)
+        self.assertEqual(message_dict["reactions"][0]["emoji_name"], "smile")
+
+        # As does flushing it when the message is saved.
+        message = Message.objects.get(id=message_id)
+        message.content = "bar"
+        message.save(update_fields=["content"])
+        message_dict = bulk_fetch_message_dicts([message_id])[message_id]
+        self.assertEqual(get_message_dict_local_cache_misses(), misses + 2)
+        self.assertEqual(message_dict["content"], "bar")
+
+        # Which deletes its version, so it isn't cached locally until
+        # its dict is next updated.
+        self.assertNotIn(message_id, message_dict_local_cache)
+
     def test_message_for_ids_for_restricted_user_access(self) -> None:
         self.set_up_db_for_testing_user_access()
         hamlet = self.example_user("hamlet")
@@ -15,11 +15,13 @@ from typing_extensions import override
 from analytics.lib.counts import COUNT_STATS
 from analytics.models import RealmCount
 from zerver.actions.message_edit import build_message_edit_request, do_update_message
+from zerver.actions.message_flags import do_update_message_flags
 from zerver.actions.reactions import check_add_reaction
 from zerver.actions.realm_settings import do_set_realm_property
 from zerver.actions.streams import do_deactivate_stream
 from zerver.actions.uploads import do_claim_attachments
 from zerver.actions.user_settings import do_change_avatar_fields, do_change_user_setting
+from zerver.actions.user_topics import do_set_user_topic_visibility_policy
 from zerver.actions.users import do_deactivate_user
 from zerver.lib.avatar import avatar_url
 from zerver.lib.display_recipient import get_display_recipient
@@ -47,7 +49,11 @@ from zerver.lib.narrow import (
 )
 from zerver.lib.narrow_helpers import NeverNegatedNarrowTerm
 from zerver.lib.narrow_predicate import build_narrow_predicate
-from zerver.lib.sqlalchemy_utils import get_sqlalchemy_connection
+from zerver.lib.sqlalchemy_utils import (
+    get_sqlalchemy_compiled_cache_misses,
+    get_sqlalchemy_connection,
+    get_sqlalchemy_queries,
+)
 from zerver.lib.streams import StreamDict, create_streams_if_needed, get_public_streams_queryset
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import (
@@ -1425,6 +1431,16 @@ class IncludeHistoryTest(ZulipTestCase):
         self.assertFalse(ok_to_include_history(narrow, user_profile, False))
         self.assertTrue(ok_to_include_history(narrow, subscribed_user_profile, False))
 
+        # When the caller has already checked the user's access to the
+        # channel, we only look up the channel, without repeating the
+        # subscription lookup.
+        with self.assert_database_query_count(1):
+            self.assertTrue(
+                ok_to_include_history(
+                    narrow, subscribed_user_profile, False, has_channel_content_access=True
+                )
+            )
+
         # History doesn't apply to direct messages.
         narrow = [
             NarrowParameter(operator="is", operand="dm"),
@@ -4645,6 +4661,120 @@ class GetOldMessagesTest(ZulipTestCase):
             {unsub_message_id, muted_message_id, first_message_id, extra_message_id},
         )
 
+    def test_first_unread_anchor_cache(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+
+        stream = self.make_stream("Cache")
+        self.subscribe(hamlet, "Cache")
+        self.subscribe(cordelia, "Cache")
+
+        first_message_id = self.send_stream_message(cordelia, "Cache", topic_name="one")
+        second_message_id = self.send_stream_message(cordelia, "Cache", topic_name="two")
+
+        narrow = [NarrowParameter(operator="channel", operand="Cache")]
+
+        def find_anchor(narrow: list[NarrowParameter]) -> tuple[int, list[Any]]:
+            query, inner_msg_id_col = get_base_query_for_search(
+                realm_id=hamlet.realm_id,
+                user_profile=hamlet,
+                need_user_message=True,
+            )
+            query = query.add_columns(column("flags", Integer))
+            query, _is_search, is_dm_narrow = add_narrow_conditions(
+                user_profile=hamlet,
+                inner_msg_id_col=inner_msg_id_col,
+                query=query,
+                narrow=narrow,
+                realm=hamlet.realm,
+                is_web_public_query=False,
+            )
+
+            with (
+                queries_captured(keep_cache_warm=True) as queries,
+                get_sqlalchemy_connection() as sa_conn,
+            ):
+                anchor = find_first_unread_anchor(
+                    sa_conn=sa_conn,
+                    user_profile=hamlet,
+                    narrow=narrow,
+                    query=query,
+                    is_dm_narrow=is_dm_narrow,
+                    inner_msg_id_col=inner_msg_id_col,
+                    need_user_message=True,
+                )
+            return anchor, queries
+
+        # Concurrently sent messages can commit out of ID order, so
+        # recent anchors aren't cached: here, the first message
+        # commits after the second.
+        first_user_message = UserMessage.objects.get(
+            user_profile=hamlet, message_id=first_message_id
+        )
+        first_user_message.delete()
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, second_message_id)
+        first_user_message.save()
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, first_message_id)
+        self.assertGreater(len(queries), 1)
+
+        # Older anchors are cached.
+        Message.objects.filter(id__in=[first_message_id, second_message_id]).update(
+            date_sent=timezone_now() - timedelta(minutes=5)
+        )
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, first_message_id)
+        self.assertGreater(len(queries), 1)
+
+        # The cached anchor only needs to be checked against the
+        # user's unread messages.
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, first_message_id)
+        self.assert_length(queries, 1)
+        self.assertIn("zerver_usermessage", queries[0].sql)
+
+        # Receiving a new message doesn't affect the cached anchor.
+        self.send_stream_message(cordelia, "Cache", topic_name="three")
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, first_message_id)
+        self.assert_length(queries, 1)
+
+        # But a message fanned out by the message_fanout queue worker
+        # resets the cache, since it may be older than messages which
+        # already have their UserMessage rows.
+        with override_settings(MESSAGE_FANOUT_QUEUE_MIN_RECIPIENTS=2):
+            self.send_stream_message(cordelia, "Cache", topic_name="four")
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, first_message_id)
+        self.assertGreater(len(queries), 1)
+
+        # Once the cached anchor is read, it is recomputed.
+        do_update_message_flags(hamlet, "add", "read", [first_message_id])
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, second_message_id)
+        self.assertGreater(len(queries), 1)
+
+        # Marking an older message as unread invalidates the cache.
+        with self.captureOnCommitCallbacks(execute=True):
+            do_update_message_flags(hamlet, "remove", "read", [first_message_id])
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, first_message_id)
+
+        # So does muting the topic of the cached anchor.
+        with self.captureOnCommitCallbacks(execute=True):
+            do_set_user_topic_visibility_policy(
+                hamlet, stream, "one", visibility_policy=UserTopic.VisibilityPolicy.MUTED
+            )
+        anchor, queries = find_anchor(narrow)
+        self.assertEqual(anchor, second_message_id)
+
+        # Narrows with search terms are never cached.
+        search_narrow = [*narrow, NarrowParameter(operator="is", operand="starred")]
+        find_anchor(search_narrow)
+        _anchor, queries = find_anchor(search_narrow)
+        self.assertGreater(len(queries), 1)
+
     def test_parse_anchor_value(self) -> None:
         hamlet = self.example_user("hamlet")
         cordelia = self.example_user("cordelia")
@@ -5278,6 +5408,33 @@ AND NOT (recipient_id = %(recipient_id_4)s AND upper(subject) = upper(%(param_3)
         self.assertEqual(params["recipient_id_4"], channel_verona_id)
         self.assertEqual(params["param_3"], "Hi")
 
+    def test_narrow_queries_share_compiled_statements(self) -> None:
+        self.login("hamlet")
+
+        def get_topic_messages(topic_name: str) -> None:
+            narrow = [
+                dict(operator="channel", operand="Verona"),
+                dict(operator="topic", operand=topic_name),
+            ]
+            self.get_and_check_messages(
+                dict(
+                    anchor="newest",
+                    num_before=10,
+                    num_after=0,
+                    narrow=orjson.dumps(narrow).decode(),
+                )
+            )
+
+        get_topic_messages("first topic")
+        compiled_cache_misses = get_sqlalchemy_compiled_cache_misses()
+        queries = get_sqlalchemy_queries()
+
+        # A narrow of the same shape reuses the compiled statements,
+        # even though its operands differ.
+        get_topic_messages("second topic")
+        self.assertEqual(get_sqlalchemy_compiled_cache_misses(), compiled_cache_misses)
+        self.assertGreater(get_sqlalchemy_queries(), queries)
+
     def test_get_messages_queries(self) -> None:
         query_ids = self.get_query_ids()
 
@@ -154,6 +154,50 @@ class MessagePOSTTest(ZulipTestCase):
             )
             self.assert_json_success(result)
 
+    def test_send_messages_bulk(self) -> None:
+        user = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        verona = get_stream("Verona", user.realm)
+        messages = [
+            {"type": "channel", "to": "Verona", "topic": "alerts", "content": "First"},
+            {"type": "stream", "to": verona.id, "topic": "alerts", "content": "Second"},
+            {"type": "direct", "to": [othello.id], "content": "Third"},
+            {"type": "private", "to": othello.email, "content": "Fourth"},
+            {"type": "channel", "to": "nonexistent", "topic": "alerts", "content": "Fifth"},
+            {"type": "direct", "to": [99999], "content": "Sixth"},
+        ]
+        result = self.api_post(
+            user, "/api/v1/messages/bulk", {"messages": orjson.dumps(messages).decode()}
+        )
+        results = self.assert_json_success(result)["messages"]
+        self.assert_length(results, 6)
+
+        for message_result, content in zip(
+            results[:4], ["First", "Second", "Third", "Fourth"], strict=True
+        ):
+            self.assertEqual(message_result["result"], "success")
+            message = Message.objects.get(id=message_result["id"])
+            self.assertEqual(message.content, content)
+            self.assertEqual(message.sender_id, user.id)
+        self.assertEqual(
+            results[4],
+            dict(
+                result="error",
+                msg="Channel 'nonexistent' does not exist",
+                code="STREAM_DOES_NOT_EXIST",
+                stream="nonexistent",
+            ),
+        )
+        self.assertEqual(
+            results[5], dict(result="error", msg="Invalid user ID 99999", code="BAD_REQUEST")
+        )
+
+        messages = [{"type": "direct", "to": [othello.id], "content": "Spam"}] * 101
+        result = self.api_post(
+            user, "/api/v1/messages/bulk", {"messages": orjson.dumps(messages).decode()}
+        )
+        self.assert_json_error(result, "Too many messages; at most 100 can be sent at once.")
+
     def test_message_to_stream_with_nonexistent_id(self) -> None:
         cordelia = self.example_user("cordelia")
         bot = self.create_test_bot(
@@ -2004,9 +2048,112 @@ class StreamMessagesTest(ZulipTestCase):
                 skip_capture_on_commit_callbacks=True,
             )
         users = events[0]["users"]
-        user_ids = {u["id"] for u in users}
+        user_ids = {u if isinstance(u, int) else u["id"] for u in users}
         return user_ids
 
+    def test_message_event_users(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        othello = self.example_user("othello")
+        stream_name = "Test stream"
+        for user in [hamlet, cordelia, othello]:
+            self.subscribe(user, stream_name)
+
+        with self.capture_send_event_calls(expected_num_events=1) as events:
+            self.send_stream_message(
+                hamlet,
+                stream_name,
+                content="test @**Cordelia, Lear's daughter**",
+                skip_capture_on_commit_callbacks=True,
+            )
+        users = events[0]["users"]
+
+        # Recipients without flags are sent as just their user ID.
+        self.assertIn(othello.id, users)
+        self.assertIn(
+            dict(id=cordelia.id, flags=["mentioned"], mentioned_user_group_id=None), users
+        )
+
+    @override_settings(MESSAGE_FANOUT_QUEUE_MIN_RECIPIENTS=3)
+    def test_message_fanout_queue(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        othello = self.example_user("othello")
+        stream_name = "Test stream"
+        for user in [hamlet, cordelia, othello]:
+            self.subscribe(user, stream_name)
+        do_change_user_setting(
+            hamlet,
+            "automatically_follow_topics_policy",
+            UserProfile.AUTOMATICALLY_CHANGE_VISIBILITY_POLICY_NEVER,
+            acting_user=None,
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            message_id = self.send_stream_message(
+                hamlet, stream_name, content="test", skip_capture_on_commit_callbacks=True
+            )
+
+        # The UserMessage rows are only created once the
+        # message_fanout queue worker has processed the message.
+        self.assertFalse(UserMessage.objects.filter(message_id=message_id).exists())
+
+        with self.capture_send_event_calls(expected_num_events=1) as events:
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(
+            set(
+                UserMessage.objects.filter(message_id=message_id).values_list(
+                    "user_profile_id", flat=True
+                )
+            ),
+            {hamlet.id, cordelia.id, othello.id},
+        )
+        self.assertTrue(
+            UserMessage.objects.get(user_profile=hamlet, message_id=message_id).flags.read
+        )
+        self.assertEqual(events[0]["event"]["message_dict"]["id"], message_id)
+        self.assertEqual(
+            events[0]["users"][0], dict(id=hamlet.id, flags=["read"], mentioned_user_group_id=None)
+        )
+
+        # Messages to channels with fewer recipients are fanned out
+        # before the request returns.
+        self.unsubscribe(othello, stream_name)
+        message_id = self.send_stream_message(hamlet, stream_name, content="test")
+        self.assertEqual(UserMessage.objects.filter(message_id=message_id).count(), 2)
+
+    @override_settings(MESSAGE_FANOUT_QUEUE_MIN_RECIPIENTS=3)
+    def test_message_fanout_queue_moved_message(self) -> None:
+        hamlet = self.example_user("hamlet")
+        stream_name = "Test stream"
+        for user in [hamlet, self.example_user("cordelia"), self.example_user("othello")]:
+            self.subscribe(user, stream_name)
+        private_stream = self.make_stream(
+            "Private stream", invite_only=True, history_public_to_subscribers=False
+        )
+        do_change_user_setting(
+            hamlet,
+            "automatically_follow_topics_policy",
+            UserProfile.AUTOMATICALLY_CHANGE_VISIBILITY_POLICY_NEVER,
+            acting_user=None,
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            message_id = self.send_stream_message(
+                hamlet, stream_name, content="test", skip_capture_on_commit_callbacks=True
+            )
+
+        # If the message is moved before the message_fanout queue
+        # worker gets to it, the old channel's subscribers must not
+        # be given access to it.
+        Message.objects.filter(id=message_id).update(recipient=private_stream.recipient)
+        with self.capture_send_event_calls(expected_num_events=0):
+            for callback in callbacks:
+                callback()
+        self.assertFalse(UserMessage.objects.filter(message_id=message_id).exists())
+
     def test_unsub_mention(self) -> None:
         cordelia = self.example_user("cordelia")
         hamlet = self.example_user("hamlet")
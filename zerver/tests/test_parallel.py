@@ -9,10 +9,11 @@ from threading import Barrier
 
 from django.db import connection
 
-from zerver.lib.parallel import _disconnect, run_parallel, run_parallel_queue
+from zerver.lib.markdown import render_message_markdown, render_messages_markdown
+from zerver.lib.parallel import _disconnect, map_parallel, run_parallel, run_parallel_queue
 from zerver.lib.partial import partial
 from zerver.lib.test_classes import ZulipTestCase
-from zerver.models import Realm
+from zerver.models import Message, Realm
 
 
 class RunNotParallelTest(ZulipTestCase):
@@ -153,6 +154,12 @@ class RunNotParallelTest(ZulipTestCase):
             ],
         )
 
+    def test_map_not_parallel(self) -> None:
+        self.assertEqual(
+            list(map_parallel(lambda item: item * 2, range(100, 105), processes=1)),
+            [200, 202, 204, 206, 208],
+        )
+
 
 def write_number(
     output_dir: str, barrier: Barrier, fail: set[int], item: int
@@ -308,3 +315,22 @@ class RunParallelTest(ZulipTestCase):
             with open(output_path) as output_file:
                 all_lines.update(int(line) for line in output_file)
         self.assertEqual(all_lines, {4})
+
+    def test_map_parallel(self) -> None:  # nocoverage
+        self.skip_in_parallel_harness()
+        self.assertEqual(
+            list(map_parallel(str, range(100, 110), processes=4, chunksize=3)),
+            [str(n) for n in range(100, 110)],
+        )
+
+    def test_parallel_render_messages(self) -> None:  # nocoverage
+        self.skip_in_parallel_harness()
+        messages_and_contents = [
+            (message, message.content)
+            for message in Message.objects.select_related("sender", "realm").order_by("id")[:20]
+        ]
+        serial = [
+            render_message_markdown(message, content).rendered_content
+            for message, content in messages_and_contents
+        ]
+        self.assertEqual(list(render_messages_markdown(messages_and_contents, processes=4)), serial)
@@ -582,7 +582,8 @@ class SoftDeactivationMessageTest(ZulipTestCase):
         self.subscribe(cordelia, stream_name)
         self.subscribe(sender, stream_name)
 
-        stream_id = get_stream(stream_name, cordelia.realm).id
+        recipient_id = get_stream(stream_name, cordelia.realm).recipient_id
+        assert recipient_id is not None
 
         def send_stream_message(content: str) -> None:
             self.send_stream_message(sender, stream_name, content, topic_name)
@@ -625,11 +626,11 @@ class SoftDeactivationMessageTest(ZulipTestCase):
                 len(
                     get_subscriptions_for_send_message(
                         realm_id=realm_id,
-                        stream_id=stream_id,
-                        topic_name=topic_name,
+                        recipient_id=recipient_id,
                         possible_stream_wildcard_mention=possible_stream_wildcard_mention,
                         topic_participant_user_ids=topic_participant_user_ids,
                         possibly_mentioned_user_ids=possibly_mentioned_user_ids,
+                        followed_topic_user_ids=set(),
                     )
                 ),
                 expected_count,
@@ -40,12 +40,17 @@ from zerver.actions.users import (
 )
 from zerver.lib.avatar import avatar_url, get_avatar_field, get_gravatar_url
 from zerver.lib.bulk_create import create_users
+from zerver.lib.cache import cache_set, stream_recipient_snapshot_cache_key
 from zerver.lib.create_user import copy_default_settings
 from zerver.lib.events import do_events_register
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.mention import silent_mention_syntax_for_user
 from zerver.lib.send_email import clear_scheduled_emails, queue_scheduled_emails, send_future_email
-from zerver.lib.stream_subscription import get_user_subscribed_streams
+from zerver.lib.stream_subscription import (
+    SubscriberSendInfo,
+    get_stream_recipient_snapshot,
+    get_user_subscribed_streams,
+)
 from zerver.lib.stream_topic import StreamTopicTarget
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import (
@@ -3272,6 +3277,57 @@ class RecipientInfoTest(ZulipTestCase):
         self.assertEqual(info.followed_topic_push_user_ids, set())
         self.assertEqual(info.stream_wildcard_mention_in_followed_topic_user_ids, set())
 
+    def test_stream_recipient_snapshot(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        stream = self.make_stream("Snapshot stream")
+        self.subscribe(hamlet, stream.name)
+        assert stream.recipient_id is not None
+
+        def get_snapshot() -> dict[int, SubscriberSendInfo]:
+            return {
+                sub.user_profile_id: sub
+                for sub in get_stream_recipient_snapshot(stream.recipient_id)
+            }
+
+        self.assertEqual(get_snapshot().keys(), {hamlet.id})
+        with self.assert_database_query_count(0):
+            get_snapshot()
+
+        # Changes to the subscribers, their subscription settings, or
+        # their notification settings flush the cached snapshot.
+        self.subscribe(cordelia, stream.name)
+        self.assertEqual(get_snapshot().keys(), {hamlet.id, cordelia.id})
+
+        sub = get_subscription(stream.name, cordelia)
+        sub.push_notifications = True
+        sub.save(update_fields=["push_notifications"])
+        self.assertTrue(get_snapshot()[cordelia.id].push_notifications)
+
+        do_change_user_setting(
+            cordelia, "enable_stream_email_notifications", True, acting_user=None
+        )
+        self.assertTrue(get_snapshot()[cordelia.id].user_profile_email_notifications)
+
+        cordelia.long_term_idle = True
+        cordelia.save(update_fields=["long_term_idle"])
+        self.assertTrue(get_snapshot()[cordelia.id].long_term_idle)
+
+        # A snapshot cached by another process before the change
+        # commits is flushed again once it does.
+        stale_snapshot = get_stream_recipient_snapshot(stream.recipient_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            cordelia.long_term_idle = False
+            cordelia.save(update_fields=["long_term_idle"])
+            cache_set(stream_recipient_snapshot_cache_key(stream.recipient_id), stale_snapshot)
+        self.assertFalse(get_snapshot()[cordelia.id].long_term_idle)
+
+        do_deactivate_user(cordelia, acting_user=None)
+        self.assertEqual(get_snapshot().keys(), {hamlet.id})
+
+        self.unsubscribe(hamlet, stream.name)
+        self.assertEqual(get_snapshot(), {})
+
     def test_get_recipient_info_invalid_recipient_type(self) -> None:
         hamlet = self.example_user("hamlet")
         realm = hamlet.realm
@@ -1,5 +1,8 @@
+import threading
+import time
 from collections import defaultdict
-from collections.abc import Iterable, Mapping, Sequence
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import lru_cache
 from typing import Any, Literal
@@ -197,6 +200,86 @@ def send_notification_http(port: int, data: Mapping[str, Any]) -> None:
         )
 
 
+# Limits on how many notices, and for how long, TornadoNoticeBatch holds
+# before publishing them.
+TORNADO_NOTICE_BATCH_MAX_SIZE = 100
+TORNADO_NOTICE_BATCH_MAX_DELAY_SECS = 1
+
+
+class TornadoNoticeBatch(threading.local):
+    """Bulk actions (e.g. subscribing many users, or marking many
+    messages as read) can send thousands of events.  Rather than
+    publishing a RabbitMQ message for each, while a batch is active,
+    the notices for each Tornado port are accumulated and published
+    together, as a single {"notices": [...]} message.
+
+    The batch is published when the request or worker batch finishes,
+    or once it holds TORNADO_NOTICE_BATCH_MAX_SIZE notices.  Since a
+    batch cannot be published from another thread, its age is only
+    checked against TORNADO_NOTICE_BATCH_MAX_DELAY_SECS at safe points:
+    when a notice is added to it, and when another event is scheduled
+    by send_event_on_commit.
+
+    This is thread-local, since queue workers may run in threads."""
+
+    def __init__(self) -> None:
+        self.active = False
+        self.notices: dict[int, list[dict[str, Any]]] = defaultdict(list)
+        self.size = 0
+        self.start_time = 0.0
+
+    def add(self, port: int, notice: dict[str, Any]) -> None:
+        if self.size == 0:
+            self.start_time = time.monotonic()
+        self.notices[port].append(notice)
+        self.size += 1
+        if self.size >= TORNADO_NOTICE_BATCH_MAX_SIZE:
+            self.flush()
+        else:
+            self.flush_if_overdue()
+
+    def flush_if_overdue(self) -> None:
+        if (
+            self.size > 0
+            and time.monotonic() - self.start_time >= TORNADO_NOTICE_BATCH_MAX_DELAY_SECS
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        notices = self.notices
+        self.notices = defaultdict(list)
+        self.size = 0
+        for port, port_notices in notices.items():
+            queue_json_publish_rollback_unsafe(
+                notify_tornado_queue_name(port),
+                port_notices[0] if len(port_notices) == 1 else dict(notices=port_notices),
+            )
+
+
+tornado_notice_batch = TornadoNoticeBatch()
+
+
+def start_tornado_notice_batch() -> None:
+    # Batched notices are only understood by Tornado's RabbitMQ
+    # consumer; without RabbitMQ, notices are processed immediately.
+    if settings.USING_RABBITMQ:
+        tornado_notice_batch.active = True
+
+
+def finish_tornado_notice_batch() -> None:
+    tornado_notice_batch.active = False
+    tornado_notice_batch.flush()
+
+
+@contextmanager
+def batched_tornado_notices() -> Iterator[None]:
+    start_tornado_notice_batch()
+    try:
+        yield
+    finally:
+        finish_tornado_notice_batch()
+
+
 # The core function for sending an event from Django to Tornado (which
 # will then push it to web and mobile clients for the target users).
 #
@@ -219,7 +302,7 @@ def send_event_rollback_unsafe(
     """`users` is a list of user IDs, or in some special cases like message
     send/update or embeds, dictionaries containing extra data."""
     realm_ports = get_realm_tornado_ports(realm)
-    if len(realm_ports) == 1:
+    if len(realm_ports) == 1 and settings.TORNADO_PROCESSES_PER_PORT == 1:
         port_user_map = {realm_ports[0]: list(users)}
     else:
         port_user_map = defaultdict(list)
@@ -228,6 +311,9 @@ def send_event_rollback_unsafe(
             port_user_map[get_user_id_tornado_port(realm_ports, user_id)].append(user)
 
     for port, port_users in port_user_map.items():
+        if tornado_notice_batch.active:
+            tornado_notice_batch.add(port, dict(event=event, users=port_users))
+            continue
         queue_json_publish_rollback_unsafe(
             notify_tornado_queue_name(port),
             dict(event=event, users=port_users),
@@ -238,6 +324,9 @@ def send_event_rollback_unsafe(
 def send_event_on_commit(
     realm: Realm, event: Mapping[str, Any], users: Iterable[int] | Iterable[Mapping[str, Any]]
 ) -> None:
+    # The batched notices are for already-committed changes, so a long
+    # request or worker batch can safely publish them here.
+    tornado_notice_batch.flush_if_overdue()
     if not settings.USING_RABBITMQ:
         # In tests, round-trip the event through JSON, as happens with
         # RabbitMQ.  zerver.lib.queue also enforces this, but the
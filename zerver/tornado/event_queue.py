@@ -1,13 +1,14 @@
 # See https://zulip.readthedocs.io/en/latest/subsystems/events-system.html for
 # high-level documentation on how this system works.
 import copy
+import heapq
 import logging
 import os
 import random
 import time
 import traceback
 import uuid
-from collections import deque
+from collections import ChainMap, deque
 from collections.abc import Callable, Collection, Iterable, Mapping, MutableMapping, Sequence
 from collections.abc import Set as AbstractSet
 from contextlib import suppress
@@ -25,9 +26,10 @@ from version import API_FEATURE_LEVEL, ZULIP_MERGE_BASE, ZULIP_VERSION
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.message_cache import MessageDict
 from zerver.lib.narrow_helpers import narrow_dataclasses_from_tuples
-from zerver.lib.narrow_predicate import build_narrow_predicate
+from zerver.lib.narrow_predicate import build_narrow_predicate, get_narrow_channel_name
 from zerver.lib.notification_data import UserMessageNotificationsData
 from zerver.lib.queue import (
+    get_queue_client,
     mobile_notifications_queue_name,
     queue_json_publish_rollback_unsafe,
     retry_event,
@@ -35,17 +37,45 @@ from zerver.lib.queue import (
 from zerver.lib.topic import ORIG_TOPIC, TOPIC_NAME
 from zerver.middleware import async_request_timer_restart
 from zerver.models import CustomProfileField, Message
-from zerver.tornado.descriptors import clear_descriptor_by_handler_id, set_descriptor_by_handler_id
+from zerver.tornado.descriptors import (
+    clear_descriptor_by_handler_id,
+    is_current_port,
+    set_descriptor_by_handler_id,
+)
+from zerver.tornado.event_queue_journal import EventQueueJournal, read_event_queue_journal
 from zerver.tornado.exceptions import BadEventQueueIdError
 from zerver.tornado.handlers import finish_handler, get_handler_by_id, handler_stats_string
+from zerver.tornado.metrics import notice_processing_time, notice_users, setup_ioloop_lag_monitoring
+from zerver.tornado.sharding import (
+    maybe_reload_sharding_config,
+    notify_tornado_queue_name,
+    set_user_tornado_port_override,
+    user_tornado_port_override_hosts,
+    user_tornado_port_overrides,
+)
 
 # The idle timeout used to be a week, but we found that in that
 # situation, queues from dead browser sessions would grow quite large
 # due to the accumulation of message data in those queues.
 DEFAULT_EVENT_QUEUE_TIMEOUT_SECS = 60 * 10
-# We garbage-collect every minute; this is totally fine given that the
-# GC scan takes ~2ms with 1000 event queues.
+# We garbage-collect every minute.  Each run only examines the queues
+# whose deadlines have passed (see gc_check_times), and examines at
+# most EVENT_QUEUE_GC_MAX_CHECKS_PER_SLICE of them before yielding
+# the IOLoop to handle other work.
 EVENT_QUEUE_GC_FREQ_MSECS = 1000 * 60 * 1
+EVENT_QUEUE_GC_MAX_CHECKS_PER_SLICE = 1000
+
+# Changes to event queues are buffered in memory and appended to the
+# on-disk journal this often; this bounds how much we lose on a crash.
+EVENT_QUEUE_JOURNAL_FLUSH_FREQ_MSECS = 1000
+# How often we consider writing a compacted snapshot of all event
+# queues, which lets us truncate the journal.  Since writing the
+# snapshot blocks the IOLoop, we only do so once the journal has
+# grown large enough, or old enough, to be worth replacing; this
+# bounds both the journal's size and how long replaying it takes.
+EVENT_QUEUE_SNAPSHOT_FREQ_MSECS = 1000 * 60 * 1
+EVENT_QUEUE_SNAPSHOT_MAX_JOURNAL_BYTES = 64 * 1024 * 1024
+EVENT_QUEUE_SNAPSHOT_MAX_AGE_SECS = 60 * 10
 
 # Capped limit for how long a client can request an event queue
 # to live
@@ -66,6 +96,10 @@ MOBILE_EVENT_QUEUE_TIMEOUT_SECS = 12 * 60 * 60
 # wireless routers that kill "inactive" http connections.
 HEARTBEAT_MIN_FREQ_SECS = 45
 
+# How many encoded message payloads to keep in
+# serialized_message_payloads.
+SERIALIZED_MESSAGE_PAYLOAD_CACHE_SIZE = 1000
+
 
 def create_heartbeat_event() -> dict[str, str]:
     return dict(type="heartbeat")
@@ -119,8 +153,11 @@ class ClientDescriptor:
         self.all_public_streams = all_public_streams
         self.client_type_name = client_type_name
         self._timeout_handle: Any = None  # TODO: should be return type of ioloop.call_later
+        # When this client's entry in gc_check_times is due; not serialized.
+        self.gc_check_time: float | None = None
         self.narrow = narrow
         self.narrow_predicate = build_narrow_predicate(modern_narrow)
+        self.narrow_channel_name = get_narrow_channel_name(modern_narrow)
         self.bulk_message_deletion = bulk_message_deletion
         self.stream_typing_notifications = stream_typing_notifications
         self.pronouns_field_type_supported = pronouns_field_type_supported
@@ -215,14 +252,14 @@ class ClientDescriptor:
         ret.offline = d.get("offline", False)
         return ret
 
-    def add_event(self, event: Mapping[str, Any]) -> None:
+    def add_event(self, event: Mapping[str, Any], overlay: Mapping[str, Any] | None = None) -> None:
         if self.current_handler_id is not None:
             handler = get_handler_by_id(self.current_handler_id)
             if handler is not None:
                 assert handler._request is not None
                 async_request_timer_restart(handler._request)
 
-        self.event_queue.push(event)
+        self.event_queue.push(event, overlay)
         self.finish_current_handler()
 
     def finish_current_handler(self) -> bool:
@@ -232,7 +269,7 @@ class ClientDescriptor:
             finish_handler(
                 self.current_handler_id,
                 self.event_queue.id,
-                self.event_queue.contents(),
+                serialize_message_payloads(self.event_queue.contents()),
             )
         except Exception:
             logging.exception(
@@ -299,12 +336,32 @@ class ClientDescriptor:
             and now - self.last_connection_time >= EVENT_QUEUE_OFFLINE_TIMEOUT_SECS
         )
 
+    def next_gc_check_time(self) -> float:
+        # The earliest time at which expired() or should_mark_offline()
+        # could become true, assuming we don't hear from the client.
+        check_time = self.last_connection_time + self.queue_timeout
+        if not self.offline:
+            check_time = min(
+                check_time, self.last_connection_time + EVENT_QUEUE_OFFLINE_TIMEOUT_SECS
+            )
+        return check_time
+
     def connect_handler(self, handler_id: int, client_name: str) -> None:
+        was_offline = self.offline
         self.current_handler_id = handler_id
         self.current_client_name = client_name
         set_descriptor_by_handler_id(handler_id, self)
         self.last_connection_time = time.time()
         self.offline = False
+        if was_offline:
+            # Connection times are otherwise only saved in snapshots,
+            # since journaling every long-poll would be expensive; but
+            # coming back online affects notifications, so must not be
+            # lost.
+            journal_event_queue_change("connect", self.event_queue.id, self.last_connection_time)
+            # Coming back online makes the offline deadline, which may
+            # be earlier than our scheduled GC check, relevant again.
+            schedule_gc_check(self, self.last_connection_time)
 
         def timeout_callback() -> None:
             self._timeout_handle = None
@@ -354,12 +411,30 @@ def compute_full_event_type(event: Mapping[str, Any]) -> str:
     return event["type"]
 
 
+# Events are stored in an EventQueue as a tuple of the event ID, the
+# event itself, and an optional overlay of client-specific fields
+# (e.g. the user's flags on a message).  The event and overlay are
+# shared with every other queue the event was sent to, so they must
+# never be modified; the full event is only constructed, by
+# materialize_event, when it is returned to the client.  This avoids
+# materializing a copy of each event for every queue, which is
+# expensive for events sent to thousands of clients.
+QueuedEvent = tuple[int, Mapping[str, Any], Mapping[str, Any] | None]
+
+
+def materialize_event(queued_event: QueuedEvent) -> dict[str, Any]:
+    event_id, event, overlay = queued_event
+    if overlay is None:
+        return {**event, "id": event_id}
+    return {**event, **overlay, "id": event_id}
+
+
 class EventQueue:
     def __init__(self, id: str) -> None:
         # When extending this list of properties, one must be sure to
         # update to_dict and from_dict.
 
-        self.queue: deque[dict[str, Any]] = deque()
+        self.queue: deque[QueuedEvent] = deque()
         self.next_event_id: int = 0
         # will only be None for migration from old versions
         self.newest_pruned_id: int | None = -1
@@ -373,7 +448,7 @@ class EventQueue:
         d = dict(
             id=self.id,
             next_event_id=self.next_event_id,
-            queue=list(self.queue),
+            queue=[materialize_event(queued_event) for queued_event in self.queue],
             virtual_events=self.virtual_events,
         )
         if self.newest_pruned_id is not None:
@@ -385,21 +460,21 @@ class EventQueue:
         ret = cls(d["id"])
         ret.next_event_id = d["next_event_id"]
         ret.newest_pruned_id = d.get("newest_pruned_id")
-        ret.queue = deque(d["queue"])
+        ret.queue = deque((event["id"], event, None) for event in d["queue"])
         ret.virtual_events = d.get("virtual_events", {})
         return ret
 
-    def push(self, orig_event: Mapping[str, Any]) -> None:
-        # By default, we make a shallow copy of the event dictionary
-        # to push into the target event queue; this allows the calling
-        # code to send the same "event" object to multiple queues.
-        # This behavior is important because the event_queue system is
-        # about to mutate the event dictionary, minimally to add the
-        # event_id attribute.
-        event = dict(orig_event)
-        event["id"] = self.next_event_id
+    def push(self, orig_event: Mapping[str, Any], overlay: Mapping[str, Any] | None = None) -> None:
+        # The event (and overlay) objects are not copied, since they
+        # are usually shared between many queues; callers must not
+        # modify them after pushing them.  The event ID is stored
+        # alongside them, and only added to the event returned to
+        # the client by materialize_event.
+        if event_queue_journal is not None:
+            event_queue_journal.record_push(self.id, orig_event, overlay)
+        event_id = self.next_event_id
         self.next_event_id += 1
-        full_event_type = compute_full_event_type(event)
+        full_event_type = compute_full_event_type(orig_event)
         if full_event_type.startswith("flags/") and not full_event_type.startswith(
             "flags/remove/read"
         ):
@@ -418,56 +493,66 @@ class EventQueue:
             # the ordering of "mark as read" and "mark as unread"
             # updates for a given message.
             if full_event_type not in self.virtual_events:
-                self.virtual_events[full_event_type] = copy.deepcopy(event)
+                # The virtual event is modified as later events are
+                # collapsed into it, so it needs its own copy of the
+                # messages list.
+                virtual_event = materialize_event((event_id, orig_event, overlay))
+                virtual_event["messages"] = list(virtual_event["messages"])
+                self.virtual_events[full_event_type] = virtual_event
                 return
 
             # Update the virtual event with the values from the event
             virtual_event = self.virtual_events[full_event_type]
-            virtual_event["id"] = event["id"]
-            virtual_event["messages"] += event["messages"]
-            if "timestamp" in event:
-                virtual_event["timestamp"] = event["timestamp"]
+            virtual_event["id"] = event_id
+            virtual_event["messages"] += orig_event["messages"]
+            if "timestamp" in orig_event:
+                virtual_event["timestamp"] = orig_event["timestamp"]
 
         else:
-            self.queue.append(event)
+            self.queue.append((event_id, orig_event, overlay))
 
     # Note that pop ignores virtual events.  This is fine in our
     # current usage since virtual events should always be resolved to
     # a real event before being given to users.
     def pop(self) -> dict[str, Any]:
-        return self.queue.popleft()
+        return materialize_event(self.queue.popleft())
 
     def empty(self) -> bool:
         return len(self.queue) == 0 and len(self.virtual_events) == 0
 
     # See the comment on pop; that applies here as well
     def prune(self, through_id: int) -> None:
-        while len(self.queue) != 0 and self.queue[0]["id"] <= through_id:
-            self.newest_pruned_id = self.queue[0]["id"]
-            self.pop()
+        if len(self.queue) != 0 and self.queue[0][0] <= through_id:
+            journal_event_queue_change("prune", self.id, through_id)
+        while len(self.queue) != 0 and self.queue[0][0] <= through_id:
+            self.newest_pruned_id = self.queue[0][0]
+            self.queue.popleft()
 
     def contents(self, include_internal_data: bool = False) -> list[dict[str, Any]]:
-        contents: list[dict[str, Any]] = []
-        virtual_id_map: dict[str, dict[str, Any]] = {}
-        for event_type in self.virtual_events:
-            virtual_id_map[self.virtual_events[event_type]["id"]] = self.virtual_events[event_type]
-        virtual_ids = sorted(virtual_id_map.keys())
-
-        # Merge the virtual events into their final place in the queue
-        index = 0
-        length = len(virtual_ids)
-        for event in self.queue:
-            while index < length and virtual_ids[index] < event["id"]:
-                contents.append(virtual_id_map[virtual_ids[index]])
-                index += 1
-            contents.append(event)
-        while index < length:
-            contents.append(virtual_id_map[virtual_ids[index]])
-            index += 1
-
-        self.virtual_events = {}
-        self.queue = deque(contents)
-
+        if self.virtual_events:
+            # Merging the virtual events into the queue changes how
+            # future events are collapsed, so it must be replayed.
+            journal_event_queue_change("contents", self.id)
+
+            # Merge the virtual events into their final place in the queue
+            virtual_events = sorted(
+                ((event["id"], event, None) for event in self.virtual_events.values()),
+                key=lambda queued_event: queued_event[0],
+            )
+            queue: deque[QueuedEvent] = deque()
+            index = 0
+            length = len(virtual_events)
+            for queued_event in self.queue:
+                while index < length and virtual_events[index][0] < queued_event[0]:
+                    queue.append(virtual_events[index])
+                    index += 1
+                queue.append(queued_event)
+            queue.extend(virtual_events[index:])
+
+            self.virtual_events = {}
+            self.queue = queue
+
+        contents = [materialize_event(queued_event) for queued_event in self.queue]
         if include_internal_data:
             return contents
         return prune_internal_data(contents)
@@ -477,19 +562,47 @@ def prune_internal_data(events: list[dict[str, Any]]) -> list[dict[str, Any]]:
     """Prunes the internal_data data structures, which are not intended to
     be exposed to API clients.
     """
-    # This performs the most shallow copy possible, since events may
-    # have significant data.
-    if not any(event["type"] == "message" for event in events):
-        return events
-    new_events = []
-    for orig_event in events:
-        if orig_event["type"] == "message" and "internal_data" in orig_event:
-            event = dict(orig_event)
-            del event["internal_data"]
-            new_events.append(event)
-        else:
-            new_events.append(orig_event)
-    return new_events
+    # The events returned by EventQueue.contents are freshly
+    # materialized, and not shared with anything else, so we can
+    # modify them in place rather than copying them.
+    for event in events:
+        if event["type"] == "message":
+            event.pop("internal_data", None)
+    return events
+
+
+# Maps the id() of message payloads shared between many clients' events
+# (see process_message_event) to the payload and its JSON encoding.
+# We keep a reference to the payload so that its id() cannot be reused
+# while it is in the cache.
+serialized_message_payloads: dict[int, tuple[Mapping[str, Any], orjson.Fragment]] = {}
+
+
+def serialize_message_payloads(events: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Replaces the message payloads in events being returned to a
+    client with their pre-encoded JSON, so that a message sent to many
+    clients is only encoded once for each variant of the payload,
+    rather than once for every client.
+
+    The events must be freshly materialized by EventQueue.contents,
+    since they are modified in place.
+    """
+    for event in events:
+        if event["type"] != "message":
+            continue
+        message = event["message"]
+        cached = serialized_message_payloads.get(id(message))
+        if cached is None or cached[0] is not message:
+            cached = (
+                message,
+                orjson.Fragment(orjson.dumps(message, option=orjson.OPT_PASSTHROUGH_DATETIME)),
+            )
+            if len(serialized_message_payloads) >= SERIALIZED_MESSAGE_PAYLOAD_CACHE_SIZE:
+                # Evict the oldest entry; dicts preserve insertion order.
+                del serialized_message_payloads[next(iter(serialized_message_payloads))]
+            serialized_message_payloads[id(message)] = cached
+        event["message"] = cached[1]
+    return events
 
 
 # Queue-ids which still need to be sent a web_reload_client event.
@@ -501,8 +614,26 @@ web_reload_clients: dict[str, Literal[True]] = {}
 clients: dict[str, ClientDescriptor] = {}
 # maps user id to list of client descriptors
 user_clients: dict[int, list[ClientDescriptor]] = {}
-# maps realm id to list of client descriptors with all_public_streams=True
+# maps realm id to list of client descriptors with all_public_streams=True,
+# or a narrow, that do not appear in realm_clients_by_narrow_channel
 realm_clients_all_streams: dict[int, list[ClientDescriptor]] = {}
+# maps realm id to (lowercased) channel name to list of client
+# descriptors whose narrows only accept messages in that channel.
+# Indexing these lets us avoid evaluating the narrows of every
+# narrowed client in the realm for every message to a public channel.
+realm_clients_by_narrow_channel: dict[int, dict[str, list[ClientDescriptor]]] = {}
+
+# Min-heap of (time, queue id) pairs, recording when gc_event_queues
+# next needs to check each client.  Checks only need to happen at a
+# client's deadlines (see next_gc_check_time); as reconnecting only
+# pushes those later, we check the client again when the entry comes
+# due, rather than updating the heap on every connection.  Entries
+# whose time is not the client's gc_check_time are stale and ignored.
+gc_check_times: list[tuple[float, str]] = []
+
+# Journal of changes to the above event queues; None if we are not
+# persisting event queues (e.g. in tests).
+event_queue_journal: EventQueueJournal | None = None
 
 # list of registered gc hooks.
 # each one will be called with a user profile id, queue, and bool
@@ -511,14 +642,37 @@ realm_clients_all_streams: dict[int, list[ClientDescriptor]] = {}
 # that is about to be deleted
 gc_hooks: list[Callable[[int, ClientDescriptor, bool], None]] = []
 
+# Users whose event queues are in the middle of being handed off to
+# another Tornado process (see start_client_descriptor_handoff), and
+# the notices for them that are held back until the handoff finishes,
+# and the IDs of the queues sent to the other process so far.
+handoff_user_ids: set[int] = set()
+handoff_notices: list[Mapping[str, Any]] = []
+handoff_queue_ids: set[str] = set()
+
 
 def clear_client_event_queues_for_testing() -> None:
+    global event_queue_journal
     assert settings.TEST_SUITE
+    event_queue_journal = None
     clients.clear()
+    serialized_message_payloads.clear()
     web_reload_clients.clear()
     user_clients.clear()
     realm_clients_all_streams.clear()
+    realm_clients_by_narrow_channel.clear()
+    gc_check_times.clear()
     gc_hooks.clear()
+    handoff_user_ids.clear()
+    handoff_notices.clear()
+    handoff_queue_ids.clear()
+    user_tornado_port_overrides.clear()
+    user_tornado_port_override_hosts.clear()
+
+
+def journal_event_queue_change(op: str, queue_id: str | None, data: Any = None) -> None:
+    if event_queue_journal is not None:
+        event_queue_journal.record(op, queue_id, data)
 
 
 def add_client_gc_hook(hook: Callable[[int, ClientDescriptor, bool], None]) -> None:
@@ -548,9 +702,19 @@ def get_client_descriptors_for_realm_all_streams(realm_id: int) -> list[ClientDe
     return realm_clients_all_streams.get(realm_id, [])
 
 
+def get_client_descriptors_for_narrow_channel(
+    realm_id: int, channel_name: str
+) -> list[ClientDescriptor]:
+    return realm_clients_by_narrow_channel.get(realm_id, {}).get(channel_name.lower(), [])
+
+
 def add_to_client_dicts(client: ClientDescriptor) -> None:
     user_clients.setdefault(client.user_profile_id, []).append(client)
-    if client.all_public_streams or client.narrow != []:
+    if client.narrow_channel_name is not None:
+        realm_clients_by_narrow_channel.setdefault(client.realm_id, {}).setdefault(
+            client.narrow_channel_name, []
+        ).append(client)
+    elif client.all_public_streams or client.narrow != []:
         realm_clients_all_streams.setdefault(client.realm_id, []).append(client)
 
 
@@ -558,16 +722,28 @@ def allocate_client_descriptor(new_queue_data: MutableMapping[str, Any]) -> Clie
     queue_id = str(uuid.uuid4())
     new_queue_data["event_queue"] = EventQueue(queue_id).to_dict()
     client = ClientDescriptor.from_dict(new_queue_data)
+    journal_event_queue_change("client", queue_id, client.to_dict())
     clients[queue_id] = client
     add_to_client_dicts(client)
+    schedule_gc_check(client, time.time())
     return client
 
 
+def schedule_gc_check(client: ClientDescriptor, now: float) -> None:
+    # Clients which are connected, and thus past their deadlines
+    # without being expired or offline, are checked at the next GC.
+    client.gc_check_time = max(client.next_gc_check_time(), now + EVENT_QUEUE_GC_FREQ_MSECS / 1000)
+    heapq.heappush(gc_check_times, (client.gc_check_time, client.event_queue.id))
+
+
 def do_gc_event_queues(
-    to_remove: AbstractSet[str], affected_users: AbstractSet[int], affected_realms: AbstractSet[int]
+    to_remove: AbstractSet[str],
+    affected_users: AbstractSet[int],
+    affected_realms: AbstractSet[int],
+    run_gc_hooks: bool = True,
 ) -> None:
     def filter_client_dict(
-        client_dict: MutableMapping[int, list[ClientDescriptor]], key: int
+        client_dict: MutableMapping[Any, list[ClientDescriptor]], key: int | str
     ) -> None:
         if key not in client_dict:
             return
@@ -583,6 +759,12 @@ def do_gc_event_queues(
 
     for realm_id in affected_realms:
         filter_client_dict(realm_clients_all_streams, realm_id)
+        if realm_id in realm_clients_by_narrow_channel:
+            channel_clients = realm_clients_by_narrow_channel[realm_id]
+            for channel_name in list(channel_clients):
+                filter_client_dict(channel_clients, channel_name)
+            if len(channel_clients) == 0:
+                del realm_clients_by_narrow_channel[realm_id]
 
     # TODO: If a user has multiple queues and all of them are being
     # removed in the same sweep, `last_client_for_user` will be
@@ -593,13 +775,15 @@ def do_gc_event_queues(
     # ScheduledMessageNotificationEmail rows will be created.
     # The same issue exists in mark_clients_offline below.
     for id in to_remove:
+        journal_event_queue_change("gc", id)
         web_reload_clients.pop(id, None)
-        for cb in gc_hooks:
-            cb(
-                clients[id].user_profile_id,
-                clients[id],
-                clients[id].user_profile_id not in user_clients,
-            )
+        if run_gc_hooks:
+            for cb in gc_hooks:
+                cb(
+                    clients[id].user_profile_id,
+                    clients[id],
+                    clients[id].user_profile_id not in user_clients,
+                )
         del clients[id]
 
 
@@ -629,6 +813,7 @@ def mark_clients_offline(
             client.user_profile_id not in users_with_active_queues,
         )
         client.offline = True
+        journal_event_queue_change("offline", id)
 
 
 def gc_event_queues(port: int) -> None:
@@ -640,14 +825,30 @@ def gc_event_queues(port: int) -> None:
     affected_realms: set[int] = set()
     to_mark_offline: set[str] = set()
     offline_affected_users: set[int] = set()
-    for id, client in clients.items():
+    to_reschedule: list[ClientDescriptor] = []
+    checked = 0
+    while len(gc_check_times) != 0 and gc_check_times[0][0] <= start:
+        if checked >= EVENT_QUEUE_GC_MAX_CHECKS_PER_SLICE:
+            # Continue with the rest of the due queues once the IOLoop
+            # has had a chance to process other callbacks.
+            tornado.ioloop.IOLoop.current().add_callback(gc_event_queues, port)
+            break
+
+        check_time, id = heapq.heappop(gc_check_times)
+        client = clients.get(id)
+        if client is None or client.gc_check_time != check_time:
+            continue
+        checked += 1
+
         if client.expired(start):
             to_remove.add(id)
             affected_users.add(client.user_profile_id)
             affected_realms.add(client.realm_id)
-        elif client.should_mark_offline(start):
+            continue
+        if client.should_mark_offline(start):
             to_mark_offline.add(id)
             offline_affected_users.add(client.user_profile_id)
+        to_reschedule.append(client)
 
     # We don't need to call e.g. finish_current_handler on the clients
     # being removed because they are guaranteed to be idle (because
@@ -658,11 +859,15 @@ def gc_event_queues(port: int) -> None:
     # removed, so that last_client_for_user is computed correctly.
     mark_clients_offline(to_mark_offline, offline_affected_users)
 
+    for client in to_reschedule:
+        schedule_gc_check(client, start)
+
     if settings.PRODUCTION:
         logging.info(
-            "Tornado %d removed %d expired event queues owned by %d users in %.3fs."
-            "  Now %d active queues, %s",
+            "Tornado %d checked %d event queues, and removed %d expired event queues owned by"
+            " %d users in %.3fs.  Now %d active queues, %s",
             port,
+            checked,
             len(to_remove),
             len(affected_users),
             time.time() - start,
@@ -671,24 +876,191 @@ def gc_event_queues(port: int) -> None:
         )
 
 
-def persistent_queue_filename(port: int, last: bool = False) -> str:
+def start_client_descriptor_handoff(user_ids: Collection[int]) -> list[dict[str, Any]]:
+    """Begins handing off the given users' event queues to another
+    Tornado process, returning their serialized client descriptors.
+
+    Until the handoff is completed or aborted, notices for these users
+    are held back rather than applied, so that none of their events
+    are missing from the serialized queues the new process receives.
+    """
+    if handoff_user_ids:
+        raise JsonableError(_("An event queue handoff is already in progress"))
+    handoff_user_ids.update(user_ids)
+    return get_unsent_handoff_client_descriptors()
+
+
+def get_unsent_handoff_client_descriptors() -> list[dict[str, Any]]:
+    """Returns the serialized client descriptors of the queues, for the
+    users being handed off, which have not yet been sent to the other
+    process; these users may register new queues while the handoff is
+    in progress, which must also be sent before it is completed."""
+    unsent = [
+        client
+        for user_id in handoff_user_ids
+        for client in get_client_descriptors_for_user(user_id)
+        if client.event_queue.id not in handoff_queue_ids
+    ]
+    handoff_queue_ids.update(client.event_queue.id for client in unsent)
+    return [client.to_dict() for client in unsent]
+
+
+def complete_client_descriptor_handoff(port: int, realm_host: str) -> None:
+    """Called once the Tornado process on `port` has received the queues
+    from start_client_descriptor_handoff (and any later
+    get_unsent_handoff_client_descriptors); removes them here, and
+    forwards the held-back notices, and any future ones, for their
+    users to it."""
+    to_remove: set[str] = set()
+    affected_realms: set[int] = set()
+    for user_id in handoff_user_ids:
+        for client in get_client_descriptors_for_user(user_id):
+            if client.event_queue.id not in handoff_queue_ids:
+                # The other process never received this queue.
+                continue
+            # Finish any pending long-poll, so that the client's next
+            # request is redirected to the queue's new home.
+            client.finish_current_handler()
+            to_remove.add(client.event_queue.id)
+            affected_realms.add(client.realm_id)
+    set_user_tornado_port_overrides(handoff_user_ids, realm_host, port)
+
+    # The users' queues still exist on the other process, so this must
+    # not trigger the GC hooks' missed-message notifications.
+    do_gc_event_queues(to_remove, handoff_user_ids, affected_realms, run_gc_hooks=False)
+
+    handoff_user_ids.clear()
+    handoff_queue_ids.clear()
+    notices = handoff_notices.copy()
+    handoff_notices.clear()
+    for notice in notices:
+        forward_notice(port, notice)
+
+
+def forward_notice(port: int, notice: Mapping[str, Any]) -> None:
+    # Handoffs only happen between Tornado shards, which require RabbitMQ.
+    assert settings.USING_RABBITMQ
+    get_queue_client().json_publish(notify_tornado_queue_name(port), dict(notice))
+
+
+def abort_client_descriptor_handoff() -> None:
+    handoff_user_ids.clear()
+    handoff_queue_ids.clear()
+    notices = handoff_notices.copy()
+    handoff_notices.clear()
+    for notice in notices:
+        process_notification(notice)
+
+
+def receive_client_descriptors(queues: list[dict[str, Any]], port: int, realm_host: str) -> int:
+    """Adds event queues handed off by another Tornado process (see
+    start_client_descriptor_handoff) to this one, which runs on `port`.
+    Returns the number of queues added."""
+    now = time.time()
+    added = 0
+    set_user_tornado_port_overrides(
+        {queue_data["user_profile_id"] for queue_data in queues}, realm_host, port
+    )
+    for queue_data in queues:
+        client = ClientDescriptor.from_dict(queue_data)
+        queue_id = client.event_queue.id
+        if queue_id in clients:
+            # The request handing off this queue was retried.
+            continue
+        journal_event_queue_change("client", queue_id, client.to_dict())
+        clients[queue_id] = client
+        add_to_client_dicts(client)
+        schedule_gc_check(client, now)
+        added += 1
+    return added
+
+
+def set_user_tornado_port_overrides(user_ids: Collection[int], realm_host: str, port: int) -> None:
+    overrides = [[user_id, realm_host, port] for user_id in user_ids]
+    for user_id in user_ids:
+        set_user_tornado_port_override(user_id, realm_host, port)
+    # Without these, after a restart we would apply notices for users
+    # whose queues have moved, rather than forwarding them.
+    journal_event_queue_change("port_overrides", None, overrides)
+
+
+def divert_handed_off_users(notice: Mapping[str, Any]) -> Mapping[str, Any] | None:
+    """Removes, from a notice, the users whose event queues are being
+    handed off to, or now live in, another Tornado process, holding back
+    or forwarding the notice for them.  Returns the notice for the
+    remaining users, or None if there are none."""
+    users: list[int] | list[Mapping[str, Any]] = notice["users"]
+    kept: list[Any] = []
+    held: list[Any] = []
+    forwarded: dict[int, list[Any]] = {}
+    for user in users:
+        user_id = user if isinstance(user, int) else user["id"]
+        port = user_tornado_port_overrides.get(user_id)
+        if user_id in handoff_user_ids:
+            held.append(user)
+        elif port is not None and not is_current_port(port):
+            forwarded.setdefault(port, []).append(user)
+        else:
+            kept.append(user)
+
+    if held:
+        handoff_notices.append({**notice, "users": held})
+    for port, port_users in forwarded.items():
+        forward_notice(port, {**notice, "users": port_users})
+
+    if len(kept) == len(users):
+        return notice
+    if len(kept) == 0:
+        return None
+    return {**notice, "users": kept}
+
+
+def persistent_queue_filename(port: int, journal: bool = False) -> str:
     if settings.TORNADO_PROCESSES == 1:
         # Use non-port-aware, legacy version.
-        if last:
-            return settings.JSON_PERSISTENT_QUEUE_FILENAME_PATTERN % ("",) + ".last"
+        if journal:
+            return settings.JSON_PERSISTENT_QUEUE_FILENAME_PATTERN % ("",) + ".journal"
         return settings.JSON_PERSISTENT_QUEUE_FILENAME_PATTERN % ("",)
-    if last:
-        return settings.JSON_PERSISTENT_QUEUE_FILENAME_PATTERN % ("." + str(port) + ".last",)
+    if journal:
+        return settings.JSON_PERSISTENT_QUEUE_FILENAME_PATTERN % ("." + str(port) + ".journal",)
     return settings.JSON_PERSISTENT_QUEUE_FILENAME_PATTERN % ("." + str(port),)
 
 
+def flush_event_queue_journal() -> None:
+    if event_queue_journal is not None:
+        event_queue_journal.flush()
+
+
 def dump_event_queues(port: int) -> None:
+    """Writes a compacted snapshot of all event queues, after which
+    the journal of changes to them can be discarded."""
     start = time.perf_counter()
 
-    with open(persistent_queue_filename(port), "wb") as stored_queues:
+    journal_seq = -1
+    if event_queue_journal is not None:
+        event_queue_journal.flush()
+        journal_seq = event_queue_journal.last_seq()
+
+    # Write to a temporary file and rename it into place, so that a
+    # crash while dumping does not leave us without a snapshot.
+    filename = persistent_queue_filename(port)
+    with open(filename + ".tmp", "wb") as stored_queues:
         stored_queues.write(
-            orjson.dumps([(qid, client.to_dict()) for (qid, client) in clients.items()])
+            orjson.dumps(
+                dict(
+                    journal_seq=journal_seq,
+                    queues=[(qid, client.to_dict()) for (qid, client) in clients.items()],
+                    port_overrides=[
+                        [user_id, user_tornado_port_override_hosts[user_id], port]
+                        for user_id, port in user_tornado_port_overrides.items()
+                    ],
+                )
+            )
         )
+    os.replace(filename + ".tmp", filename)
+
+    if event_queue_journal is not None:
+        event_queue_journal.truncate()
 
     if len(clients) > 0 or settings.PRODUCTION:
         logging.info(
@@ -699,10 +1071,64 @@ def dump_event_queues(port: int) -> None:
         )
 
 
+def maybe_dump_event_queues(port: int) -> None:
+    if event_queue_journal is None or event_queue_journal.bytes_since_snapshot == 0:
+        return
+    if (
+        event_queue_journal.bytes_since_snapshot >= EVENT_QUEUE_SNAPSHOT_MAX_JOURNAL_BYTES
+        or time.time() - event_queue_journal.snapshot_time >= EVENT_QUEUE_SNAPSHOT_MAX_AGE_SECS
+    ):
+        dump_event_queues(port)
+
+
+def replay_event_queue_journal_record(op: str, queue_id: str | None, data: Any) -> None:
+    if op == "push":
+        # The event is shared between the queues, as it was originally.
+        event = data["event"]
+        for target_queue_id, overlay in data["targets"]:
+            target_client = clients.get(target_queue_id)
+            if target_client is not None:
+                target_client.event_queue.push(event, overlay)
+        return
+
+    if op == "port_overrides":
+        for user_id, realm_host, port in data:
+            set_user_tornado_port_override(user_id, realm_host, port)
+        return
+
+    assert queue_id is not None
+    if op == "client":
+        clients[queue_id] = ClientDescriptor.from_dict(data)
+        return
+
+    client = clients.get(queue_id)
+    if client is None:
+        # The queue was garbage-collected earlier in the journal.
+        return
+
+    if op == "prune":
+        client.event_queue.prune(data)
+    elif op == "contents":
+        client.event_queue.contents()
+    elif op == "connect":
+        client.last_connection_time = data
+        client.offline = False
+    elif op == "offline":
+        client.offline = True
+    elif op == "gc":
+        del clients[queue_id]
+    else:
+        raise AssertionError(f"Unknown event queue journal operation {op}")
+
+
 def load_event_queues(port: int) -> None:
-    global clients
+    global event_queue_journal
     start = time.perf_counter()
+    # Replaying the journal must not itself be journaled.
+    event_queue_journal = None
 
+    # Sequence number of the last journal record reflected in the snapshot.
+    journal_seq = -1
     try:
         with open(persistent_queue_filename(port), "rb") as stored_queues:
             data = orjson.loads(stored_queues.read())
@@ -712,24 +1138,54 @@ def load_event_queues(port: int) -> None:
         logging.exception("Tornado %d could not deserialize event queues", port, stack_info=True)
     else:
         try:
-            clients = {qid: ClientDescriptor.from_dict(client) for (qid, client) in data}
+            if isinstance(data, dict):
+                journal_seq = data["journal_seq"]
+                for user_id, realm_host, override_port in data.get("port_overrides", []):
+                    set_user_tornado_port_override(user_id, realm_host, override_port)
+                data = data["queues"]
+            # TODO/compatibility: Snapshots written before the
+            # introduction of the journal are a bare list of queues.
+            clients.update((qid, ClientDescriptor.from_dict(client)) for (qid, client) in data)
         except Exception:
             logging.exception(
                 "Tornado %d could not deserialize event queues", port, stack_info=True
             )
 
+    journal_filename = persistent_queue_filename(port, journal=True)
+    last_seq = journal_seq
+    replayed = 0
+    try:
+        for seq, op, queue_id, record_data in read_event_queue_journal(journal_filename):
+            if seq <= journal_seq:
+                # Already included in the snapshot; we must have
+                # stopped before truncating the journal.
+                continue
+            replay_event_queue_journal_record(op, queue_id, record_data)
+            last_seq = seq
+            replayed += 1
+    except Exception:
+        logging.exception("Tornado %d could not replay event queue journal", port, stack_info=True)
+
+    # Any changes from here on are appended to the journal.
+    event_queue_journal = EventQueueJournal(journal_filename, next_seq=last_seq + 1)
+    with suppress(FileNotFoundError):
+        event_queue_journal.bytes_since_snapshot = os.path.getsize(journal_filename)
+
     mark_clients_to_reload(clients.keys())
 
+    now = time.time()
     for client in clients.values():
         # Put code for migrations due to event queue data format changes here
 
         add_to_client_dicts(client)
+        schedule_gc_check(client, now)
 
     if len(clients) > 0 or settings.PRODUCTION:
         logging.info(
-            "Tornado %d loaded %d event queues in %.3fs",
+            "Tornado %d loaded %d event queues (replaying %d journal records) in %.3fs",
             port,
             len(clients),
+            replayed,
             time.perf_counter() - start,
         )
 
@@ -781,15 +1237,27 @@ async def setup_event_queue(
 ) -> None:
     if not settings.TEST_SUITE:
         load_event_queues(port)
+        # Writing a snapshot on shutdown, rather than just flushing the
+        # journal, preserves the connection times of queues, which are
+        # not journaled.
         autoreload.add_reload_hook(lambda: dump_event_queues(port))
 
-    with suppress(OSError):
-        os.rename(persistent_queue_filename(port), persistent_queue_filename(port, last=True))
+        # Set up persisting changes to event queues
+        journal_pc = tornado.ioloop.PeriodicCallback(
+            flush_event_queue_journal, EVENT_QUEUE_JOURNAL_FLUSH_FREQ_MSECS
+        )
+        journal_pc.start()
+        snapshot_pc = tornado.ioloop.PeriodicCallback(
+            lambda: maybe_dump_event_queues(port), EVENT_QUEUE_SNAPSHOT_FREQ_MSECS
+        )
+        snapshot_pc.start()
 
     # Set up event queue garbage collection
     pc = tornado.ioloop.PeriodicCallback(lambda: gc_event_queues(port), EVENT_QUEUE_GC_FREQ_MSECS)
     pc.start()
 
+    setup_ioloop_lag_monitoring()
+
     send_restart_events()
     if send_reloads:
         send_web_reload_client_events(immediate=settings.DEVELOPMENT)
@@ -843,7 +1311,7 @@ def fetch_events(
 
         if not client.event_queue.empty() or dont_block:
             response: dict[str, Any] = dict(
-                events=client.event_queue.contents(),
+                events=serialize_message_payloads(client.event_queue.contents()),
             )
             if orig_queue_id is None:
                 response["queue_id"] = queue_id
@@ -1088,8 +1556,28 @@ class ClientInfo(TypedDict):
     is_sender: bool
 
 
+# Shared flags list for message recipients sent without any; it is
+# never modified.  Sharing it lets process_message_event reuse the
+# overlay built for the recipient; see the `is` check there.
+NO_MESSAGE_FLAGS: list[str] = []
+
+
+def parse_message_event_user_data(
+    user_data: int | Mapping[str, Any],
+) -> tuple[int, Collection[str], int | None]:
+    if isinstance(user_data, int):
+        # Recipients with no flags and no mentioned user group are
+        # sent as just their user ID; see do_send_messages.
+        return user_data, NO_MESSAGE_FLAGS, None
+    return (
+        user_data["id"],
+        user_data.get("flags", NO_MESSAGE_FLAGS),
+        user_data.get("mentioned_user_group_id"),
+    )
+
+
 def get_client_info_for_message_event(
-    event_template: Mapping[str, Any], users: Iterable[Mapping[str, Any]]
+    event_template: Mapping[str, Any], users: Iterable[int | Mapping[str, Any]]
 ) -> dict[str, ClientInfo]:
     """
     Return client info for all the clients interested in a message.
@@ -1106,10 +1594,14 @@ def get_client_info_for_message_event(
         return (sender_queue_id is not None) and client.event_queue.id == sender_queue_id
 
     # If we're on a public stream, look for clients (typically belonging to
-    # bots) that are registered to get events for ALL streams.
+    # bots) that are registered to get events for ALL streams, and
+    # clients with narrows that might match the message.
     if "stream_name" in event_template and not event_template.get("invite_only"):
         realm_id = event_template["realm_id"]
-        for client in get_client_descriptors_for_realm_all_streams(realm_id):
+        for client in [
+            *get_client_descriptors_for_realm_all_streams(realm_id),
+            *get_client_descriptors_for_narrow_channel(realm_id, event_template["stream_name"]),
+        ]:
             send_to_clients[client.event_queue.id] = dict(
                 client=client,
                 flags=[],
@@ -1117,8 +1609,7 @@ def get_client_info_for_message_event(
             )
 
     for user_data in users:
-        user_profile_id: int = user_data["id"]
-        flags: Collection[str] = user_data.get("flags", [])
+        user_profile_id, flags, _ = parse_message_event_user_data(user_data)
 
         for client in get_client_descriptors_for_user(user_profile_id):
             send_to_clients[client.event_queue.id] = dict(
@@ -1131,7 +1622,7 @@ def get_client_info_for_message_event(
 
 
 def process_message_event(
-    event_template: Mapping[str, Any], users: Collection[Mapping[str, Any]]
+    event_template: Mapping[str, Any], users: Collection[int | Mapping[str, Any]]
 ) -> None:
     """See
     https://zulip.readthedocs.io/en/latest/subsystems/sending-messages.html
@@ -1226,7 +1717,7 @@ def process_message_event(
     sending_client: str = wide_dict["client"]
 
     @cache
-    def get_client_payload(
+    def get_client_event(
         *,
         apply_markdown: bool,
         client_gravatar: bool,
@@ -1234,7 +1725,10 @@ def process_message_event(
         can_access_sender: bool,
         is_incoming_1_to_1: bool,
     ) -> dict[str, Any]:
-        return MessageDict.finalize_payload(
+        # The message event is shared between all clients which want
+        # the same variant of the message payload; the fields specific
+        # to each user are stored in a separate overlay.
+        message_dict = MessageDict.finalize_payload(
             wide_dict,
             apply_markdown=apply_markdown,
             client_gravatar=client_gravatar,
@@ -1243,14 +1737,16 @@ def process_message_event(
             realm_host=realm_host,
             is_incoming_1_to_1=is_incoming_1_to_1,
         )
+        return dict(type="message", message=message_dict)
 
     # Extra user-specific data to include
     extra_user_data: dict[int, Any] = {}
+    # The user-specific fields of the event, shared between all of the
+    # user's clients; see materialize_event.
+    user_overlays: dict[int, dict[str, Any]] = {}
 
     for user_data in users:
-        user_profile_id: int = user_data["id"]
-        flags: Collection[str] = user_data.get("flags", [])
-        mentioned_user_group_id: int | None = user_data.get("mentioned_user_group_id")
+        user_profile_id, flags, mentioned_user_group_id = parse_message_event_user_data(user_data)
 
         # If the recipient was offline and the message was a (1:1 or group) direct message
         # to them or they were @-notified potentially notify more immediately
@@ -1285,6 +1781,7 @@ def process_message_event(
         internal_data.pop("user_id")
         internal_data["mentioned_user_group_id"] = mentioned_user_group_id
         extra_user_data[user_profile_id] = dict(internal_data=internal_data)
+        user_overlays[user_profile_id] = dict(flags=flags, internal_data=internal_data)
 
         # If the message isn't notifiable had the user been idle, then the user
         # shouldn't receive notifications even if they were online. In that case we can
@@ -1319,7 +1816,7 @@ def process_message_event(
             continue
 
         can_access_sender = client.user_profile_id not in user_ids_without_access_to_sender
-        message_dict = get_client_payload(
+        client_event = get_client_event(
             apply_markdown=client.apply_markdown,
             client_gravatar=client.client_gravatar,
             allow_empty_topic_name=client.empty_topic_name,
@@ -1329,26 +1826,32 @@ def process_message_event(
 
         # Make sure mirroring bots know whether stream is invite-only
         if "mirror" in client.client_type_name and event_template.get("invite_only"):
-            message_dict = message_dict.copy()
+            message_dict = client_event["message"].copy()
             message_dict["invite_only_stream"] = True
+            client_event = dict(type="message", message=message_dict)
 
-        user_event: dict[str, Any] = dict(type="message", message=message_dict, flags=flags)
-        if extra_data is not None:
-            user_event.update(extra_data)
+        overlay: dict[str, Any] | None = user_overlays.get(client.user_profile_id)
+        if overlay is None or overlay["flags"] is not flags:
+            # This client is not receiving the message as one of the
+            # message's recipients, e.g. because it is receiving all
+            # messages to public channels.
+            overlay = {"flags": flags}
+            if extra_data is not None:
+                overlay.update(extra_data)
 
         if is_sender:
             local_message_id = event_template.get("local_id", None)
             if local_message_id is not None:
-                user_event["local_message_id"] = local_message_id
+                overlay = {**overlay, "local_message_id": local_message_id}
 
-        if not client.accepts_event(user_event):
+        if not client.accepts_event(ChainMap(overlay, client_event)):
             continue
 
         # The below prevents mirroring loops.
         if "mirror" in sending_client and sending_client.lower() == client.client_type_name.lower():
             continue
 
-        client.add_event(user_event)
+        client.add_event(client_event, overlay)
 
 
 def process_presence_event(event: Mapping[str, Any], users: Iterable[int]) -> None:
@@ -1771,12 +2274,21 @@ def process_mark_message_unread_event(event: Mapping[str, Any], users: Iterable[
 
 
 def process_notification(notice: Mapping[str, Any]) -> None:
+    if user_tornado_port_overrides:
+        # Lets us drop the overrides once they are no longer needed.
+        maybe_reload_sharding_config()
+    if handoff_user_ids or user_tornado_port_overrides:
+        diverted_notice = divert_handed_off_users(notice)
+        if diverted_notice is None:
+            return
+        notice = diverted_notice
+
     event: Mapping[str, Any] = notice["event"]
     users: list[int] | list[Mapping[str, Any]] = notice["users"]
     start_time = time.perf_counter()
 
     if event["type"] == "message":
-        process_message_event(event, cast(list[Mapping[str, Any]], users))
+        process_message_event(event, cast(list[int | Mapping[str, Any]], users))
     elif event["type"] == "update_message":
         process_message_update_event(event, cast(list[Mapping[str, Any]], users))
     elif event["type"] == "delete_message":
@@ -1822,11 +2334,14 @@ def process_notification(notice: Mapping[str, Any]) -> None:
             client.cleanup()
     else:
         process_event(event, cast(list[int], users))
+    processing_time = time.perf_counter() - start_time
+    notice_processing_time.labels(event["type"]).observe(processing_time)
+    notice_users.labels(event["type"]).inc(len(users))
     logging.debug(
         "Tornado: Event %s for %s users took %sms",
         event["type"],
         len(users),
-        int(1000 * (time.perf_counter() - start_time)),
+        int(1000 * processing_time),
     )
 
 
@@ -1838,11 +2353,14 @@ def get_wrapped_process_notification(queue_name: str) -> Callable[[list[dict[str
             traceback.format_exc(),
         )
 
-    def wrapped_process_notification(notices: list[dict[str, Any]]) -> None:
-        for notice in notices:
-            try:
-                process_notification(notice)
-            except Exception:
-                retry_event(queue_name, notice, failure_processor)
+    def wrapped_process_notification(messages: list[dict[str, Any]]) -> None:
+        for message in messages:
+            # Django may publish several notices as one message; see
+            # TornadoNoticeBatch.  Each is retried separately.
+            for notice in message.get("notices", [message]):
+                try:
+                    process_notification(notice)
+                except Exception:
+                    retry_event(queue_name, notice, failure_processor)
 
     return wrapped_process_notification
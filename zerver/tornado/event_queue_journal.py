@@ -0,0 +1,116 @@
+# Append-only journal of changes to Tornado's event queues.
+#
+# Rather than only serializing every event queue at shutdown, which
+# loses them all on a crash, Tornado records each change to its
+# queues (new queue, pushed event, prune, etc.) as a line of JSON in
+# this journal, and writes a compacted snapshot of all queues (see
+# dump_event_queues) periodically and on shutdown.  On startup, the
+# snapshot is loaded and the journal entries newer than it are
+# replayed.
+#
+# Every record carries a monotonically increasing sequence number,
+# and each snapshot stores the sequence number of the last record it
+# includes; this lets us safely replay a journal that was not
+# truncated because we crashed just after writing a snapshot.
+#
+# A single notice usually pushes the same event object to many
+# queues, with only a small per-queue overlay (e.g. the message
+# flags).  Rather than writing a copy of the event for each queue,
+# pushes of the same event are grouped into a single "push" record,
+# which lists the queues (and their overlays) it was pushed to.
+import logging
+import time
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+import orjson
+
+
+class EventQueueJournal:
+    def __init__(self, filename: str, next_seq: int) -> None:
+        self.filename = filename
+        self.next_seq = next_seq
+        # Records are buffered in memory and written out in batches by
+        # flush(), to avoid a write() call for every event pushed.
+        self.buffer: list[bytes] = []
+        # Pushes which have not been encoded into the buffer yet,
+        # grouped by the (shared) event object pushed; see record_push.
+        self.pending_pushes: dict[int, tuple[Mapping[str, Any], list[Any]]] = {}
+        self.pending_push_queue_ids: set[str] = set()
+        # Used to decide when to write a new snapshot.
+        self.bytes_since_snapshot = 0
+        self.snapshot_time = time.time()
+
+    def record(self, op: str, queue_id: str | None, data: Any = None) -> None:
+        # Pushes recorded so far must be replayed before this change.
+        self.end_pushes()
+        self.append(op, queue_id, data)
+
+    def record_push(
+        self, queue_id: str, event: Mapping[str, Any], overlay: Mapping[str, Any] | None
+    ) -> None:
+        # Pushes to different queues can be replayed in any order, so
+        # we can group them by event, as long as no queue appears twice
+        # in the pending groups.  Holding a reference to the event in
+        # pending_pushes ensures that its id() is not reused meanwhile.
+        if queue_id in self.pending_push_queue_ids:
+            self.end_pushes()
+        self.pending_push_queue_ids.add(queue_id)
+        group = self.pending_pushes.get(id(event))
+        if group is None:
+            group = self.pending_pushes[id(event)] = (event, [])
+        group[1].append([queue_id, overlay])
+
+    def end_pushes(self) -> None:
+        if not self.pending_pushes:
+            return
+        pending_pushes = self.pending_pushes
+        self.pending_pushes = {}
+        self.pending_push_queue_ids = set()
+        for event, targets in pending_pushes.values():
+            self.append("push", None, dict(event=event, targets=targets))
+
+    def append(self, op: str, queue_id: str | None, data: Any) -> None:
+        record = orjson.dumps([self.next_seq, op, queue_id, data], option=orjson.OPT_APPEND_NEWLINE)
+        self.buffer.append(record)
+        self.next_seq += 1
+        self.bytes_since_snapshot += len(record)
+
+    def last_seq(self) -> int:
+        self.end_pushes()
+        return self.next_seq - 1
+
+    def flush(self) -> None:
+        self.end_pushes()
+        if not self.buffer:
+            return
+        with open(self.filename, "ab") as journal_file:
+            journal_file.writelines(self.buffer)
+        self.buffer = []
+
+    def truncate(self) -> None:
+        # Only safe once everything in the journal has been written
+        # to a snapshot, which requires the buffer to have been flushed.
+        assert not self.buffer
+        assert not self.pending_pushes
+        with open(self.filename, "wb"):
+            pass
+        self.bytes_since_snapshot = 0
+        self.snapshot_time = time.time()
+
+
+def read_event_queue_journal(filename: str) -> Iterator[tuple[int, str, str | None, Any]]:
+    try:
+        with open(filename, "rb") as journal_file:
+            for line in journal_file:
+                try:
+                    seq, op, queue_id, data = orjson.loads(line)
+                except (orjson.JSONDecodeError, ValueError):
+                    # If we crashed in the middle of a write, the final
+                    # record may be truncated; everything before it is
+                    # still valid.
+                    logging.warning("Ignoring truncated event queue journal record in %s", filename)
+                    return
+                yield seq, op, queue_id, data
+    except FileNotFoundError:
+        return
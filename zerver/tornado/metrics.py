@@ -0,0 +1,93 @@
+# Prometheus metrics for a Tornado process, served in the Prometheus
+# text format at /api/internal/metrics on the process's port.
+import time
+from collections.abc import Iterable
+
+import tornado.ioloop
+from prometheus_client import CollectorRegistry, Counter, Histogram, ProcessCollector
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.metrics_core import Metric
+from prometheus_client.registry import Collector
+from typing_extensions import override
+
+from zerver.tornado.descriptors import descriptors_by_handler_id
+from zerver.tornado.handlers import handlers
+
+# How often to measure how long callbacks wait to run on the IOLoop.
+IOLOOP_LAG_CHECK_FREQ_MSECS = 1000
+
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+
+ioloop_lag = Histogram(
+    "zulip_tornado_ioloop_lag_seconds",
+    "Time a callback waits to be run by the IOLoop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry=registry,
+)
+notice_processing_time = Histogram(
+    "zulip_tornado_notice_processing_seconds",
+    "Time spent processing notices of events from Django, by event type",
+    ["event_type"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+    registry=registry,
+)
+notice_users = Counter(
+    "zulip_tornado_notice_users",
+    "Users that notices of events from Django were sent to, by event type",
+    ["event_type"],
+    registry=registry,
+)
+
+
+class EventQueueCollector(Collector):
+    @override
+    def collect(self) -> Iterable[Metric]:
+        # We do the import during runtime to avoid a cyclic dependency
+        # with zerver.tornado.event_queue.
+        from zerver.tornado.event_queue import clients
+
+        queue_lengths = [len(client.event_queue.queue) for client in clients.values()]
+        yield GaugeMetricFamily(
+            "zulip_tornado_event_queues", "Number of event queues", len(queue_lengths)
+        )
+        yield GaugeMetricFamily(
+            "zulip_tornado_offline_event_queues",
+            "Number of event queues marked offline",
+            sum(client.offline for client in clients.values()),
+        )
+        yield GaugeMetricFamily(
+            "zulip_tornado_queued_events",
+            "Number of events in all event queues",
+            sum(queue_lengths),
+        )
+        yield GaugeMetricFamily(
+            "zulip_tornado_max_event_queue_length",
+            "Number of events in the longest event queue",
+            max(queue_lengths, default=0),
+        )
+        yield GaugeMetricFamily(
+            "zulip_tornado_long_polling_handlers",
+            "Number of requests waiting for events on an event queue",
+            len(descriptors_by_handler_id),
+        )
+        yield GaugeMetricFamily(
+            "zulip_tornado_handlers", "Number of requests being handled", len(handlers)
+        )
+
+
+registry.register(EventQueueCollector())
+
+
+def measure_ioloop_lag() -> None:
+    scheduled = time.monotonic()
+
+    def record_ioloop_lag() -> None:
+        ioloop_lag.observe(time.monotonic() - scheduled)
+
+    tornado.ioloop.IOLoop.current().add_callback(record_ioloop_lag)
+
+
+def setup_ioloop_lag_monitoring() -> None:
+    pc = tornado.ioloop.PeriodicCallback(measure_ioloop_lag, IOLOOP_LAG_CHECK_FREQ_MSECS)
+    pc.start()
@@ -1,44 +1,132 @@
 import json
 import os
 import re
+import time
 from re import Pattern
 
 from django.conf import settings
 
+from scripts.lib.zulip_tools import get_tornado_process_port
 from zerver.models import Realm, UserProfile
 
+SHARDING_CONFIG_FILENAME = "/etc/zulip/sharding.json"
+# How often to check whether the sharding configuration has changed,
+# so that rebalancing shards does not require restarting Django.
+SHARDING_CONFIG_CHECK_FREQ_SECS = 5
+# How long a sharding configuration must have been in place before we
+# rely on it rather than on user_tornado_port_overrides; this gives
+# every Django process time to pick it up, and any notices they
+# enqueued according to the previous configuration time to drain.
+SHARDING_CONFIG_SETTLE_SECS = 60
+
 shard_map: dict[str, int | list[int]] = {}
 shard_regexes: list[tuple[Pattern[str], int | list[int]]] = []
-if os.path.exists("/etc/zulip/sharding.json"):
-    with open("/etc/zulip/sharding.json") as f:
-        data = json.loads(f.read())
-        shard_map = data.get(
-            "shard_map",
-            data,  # backwards compatibility
-        )
-        shard_regexes = [
-            (re.compile(regex, re.IGNORECASE), port)
-            for regex, port in data.get("shard_regexes", [])
-        ]
+sharding_config_mtime: float | None = None
+sharding_config_checked_time = 0.0
 
+# Only populated in Tornado processes: maps user IDs whose event
+# queues were handed off between Tornado processes (see
+# hand_off_event_queues) to the port now hosting them, for use until
+# the sharding configuration is updated to match; and those user IDs
+# to their realm's host, to tell when it has been.
+user_tornado_port_overrides: dict[int, int] = {}
+user_tornado_port_override_hosts: dict[int, str] = {}
 
-def get_realm_tornado_ports(realm: Realm) -> list[int]:
-    if realm.host in shard_map:
-        ports = shard_map[realm.host]
+
+def load_sharding_config() -> None:
+    global shard_map, shard_regexes, sharding_config_mtime
+    try:
+        mtime: float | None = os.stat(SHARDING_CONFIG_FILENAME).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    if mtime == sharding_config_mtime:
+        return
+
+    new_shard_map: dict[str, int | list[int]] = {}
+    new_shard_regexes: list[tuple[Pattern[str], int | list[int]]] = []
+    if mtime is not None:
+        with open(SHARDING_CONFIG_FILENAME) as f:
+            data = json.loads(f.read())
+            new_shard_map = data.get(
+                "shard_map",
+                data,  # backwards compatibility
+            )
+            new_shard_regexes = [
+                (re.compile(regex, re.IGNORECASE), port)
+                for regex, port in data.get("shard_regexes", [])
+            ]
+    shard_map, shard_regexes = new_shard_map, new_shard_regexes
+    sharding_config_mtime = mtime
+
+
+def maybe_reload_sharding_config() -> None:
+    global sharding_config_checked_time
+    now = time.monotonic()
+    if now - sharding_config_checked_time < SHARDING_CONFIG_CHECK_FREQ_SECS:
+        return
+    sharding_config_checked_time = now
+    load_sharding_config()
+    if user_tornado_port_overrides:
+        prune_user_tornado_port_overrides()
+
+
+load_sharding_config()
+
+
+def get_realm_host_tornado_ports(realm_host: str) -> list[int]:
+    if realm_host in shard_map:
+        ports = shard_map[realm_host]
         return [ports] if isinstance(ports, int) else ports
 
     for regex, ports in shard_regexes:
-        if regex.match(realm.host):
+        if regex.match(realm_host):
             return [ports] if isinstance(ports, int) else ports
 
     return [settings.TORNADO_PORTS[0]]
 
 
+def get_realm_tornado_ports(realm: Realm) -> list[int]:
+    maybe_reload_sharding_config()
+    return get_realm_host_tornado_ports(realm.host)
+
+
 def get_user_id_tornado_port(realm_ports: list[int], user_id: int) -> int:
-    return realm_ports[user_id % len(realm_ports)]
+    port = realm_ports[user_id % len(realm_ports)]
+    if settings.TORNADO_PROCESSES_PER_PORT == 1:
+        return port
+    # Partition the port's users between the processes serving it;
+    # we divide out the choice of port first, so that every process
+    # gets a share of the port's users.
+    process_num = user_id // len(realm_ports) % settings.TORNADO_PROCESSES_PER_PORT
+    return get_tornado_process_port(port, process_num)
+
+
+def set_user_tornado_port_override(user_id: int, realm_host: str, port: int) -> None:
+    user_tornado_port_overrides[user_id] = port
+    user_tornado_port_override_hosts[user_id] = realm_host
+
+
+def prune_user_tornado_port_overrides() -> None:
+    # Drop the overrides which the sharding configuration agrees with,
+    # once it has settled.
+    if (
+        sharding_config_mtime is not None
+        and time.time() - sharding_config_mtime < SHARDING_CONFIG_SETTLE_SECS
+    ):
+        return
+    realm_ports: dict[str, list[int]] = {}
+    for user_id, port in list(user_tornado_port_overrides.items()):
+        realm_host = user_tornado_port_override_hosts[user_id]
+        if realm_host not in realm_ports:
+            realm_ports[realm_host] = get_realm_host_tornado_ports(realm_host)
+        if get_user_id_tornado_port(realm_ports[realm_host], user_id) == port:
+            del user_tornado_port_overrides[user_id]
+            del user_tornado_port_override_hosts[user_id]
 
 
 def get_user_tornado_port(user: UserProfile) -> int:
+    if user.id in user_tornado_port_overrides:
+        return user_tornado_port_overrides[user.id]
     return get_user_id_tornado_port(get_realm_tornado_ports(user.realm), user.id)
 
 
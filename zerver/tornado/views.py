@@ -1,17 +1,25 @@
+import logging
 import time
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
 from typing import Annotated, Any, Literal, TypeVar
+from urllib.parse import urlencode
 
+import orjson
+import tornado.ioloop
 from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse
 from django.utils.translation import gettext as _
+from django.views.decorators.http import require_safe
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel, Json, PositiveInt, StringConstraints, model_validator
+from tornado.httpclient import AsyncHTTPClient
 from typing_extensions import ParamSpec
 
 from zerver.decorator import internal_api_view, process_client
-from zerver.lib.exceptions import JsonableError
+from zerver.lib.exceptions import AccessDeniedError, JsonableError
 from zerver.lib.queue import get_queue_client
+from zerver.lib.rate_limiter import is_local_addr
 from zerver.lib.request import RequestNotes
 from zerver.lib.response import AsynchronousResponse, json_success
 from zerver.lib.sessions import narrow_request_user
@@ -20,12 +28,23 @@ from zerver.models import UserProfile
 from zerver.models.clients import get_client
 from zerver.tornado.descriptors import is_current_port
 from zerver.tornado.event_queue import (
+    abort_client_descriptor_handoff,
     access_client_descriptor,
+    complete_client_descriptor_handoff,
     fetch_events,
+    get_unsent_handoff_client_descriptors,
     process_notification,
+    receive_client_descriptors,
     send_web_reload_client_events,
+    start_client_descriptor_handoff,
+)
+from zerver.tornado.handlers import get_handler_by_id
+from zerver.tornado.metrics import registry
+from zerver.tornado.sharding import (
+    get_tornado_url,
+    get_user_tornado_port,
+    notify_tornado_queue_name,
 )
-from zerver.tornado.sharding import get_user_tornado_port, notify_tornado_queue_name
 
 P = ParamSpec("P")
 T = TypeVar("T")
@@ -38,6 +57,44 @@ def in_tornado_thread(f: Callable[P, T]) -> Callable[P, T]:
     return async_to_sync(wrapped)
 
 
+def finish_asynchronously(
+    request: HttpRequest, f: Callable[[], Awaitable[dict[str, Any]]]
+) -> HttpResponse:
+    """Runs f on the IOLoop, and finishes the request with its result
+    (see zulip_finish) once it completes.  Used for views which wait
+    on another Tornado process, which must not block the thread that
+    Tornado runs all Django views in."""
+    handler_id = RequestNotes.get_notes(request).tornado_handler_id
+    assert handler_id is not None
+
+    async def run() -> None:
+        try:
+            result = await f()
+        except Exception:
+            logging.exception("Error finishing asynchronous request", stack_info=True)
+            result = dict(result="error", msg="Internal server error")
+        handler = get_handler_by_id(handler_id)
+        if handler is not None:
+            await handler.zulip_finish(result, request)
+
+    in_tornado_thread(lambda: tornado.ioloop.IOLoop.current().add_callback(run))()
+    return AsynchronousResponse()
+
+
+async def post_to_tornado(port: int, path: str, body: str, timeout: float) -> dict[str, Any]:
+    response = await AsyncHTTPClient().fetch(
+        get_tornado_url(port) + path,
+        method="POST",
+        body=body,
+        request_timeout=timeout,
+        raise_error=False,
+    )
+    if response.code == 599:
+        # We got no response at all, e.g. because of a timeout.
+        return dict(result="error", msg=f"Tornado on port {port} did not respond")
+    return orjson.loads(response.body)
+
+
 @internal_api_view(True)
 @typed_endpoint
 def notify(request: HttpRequest, *, data: Json[dict[str, Any]]) -> HttpResponse:
@@ -67,6 +124,80 @@ def web_reload_clients(
     )
 
 
+@require_safe
+def metrics(request: HttpRequest) -> HttpResponse:
+    # Unlike other internal endpoints, this uses GET, and no secret,
+    # so that it can be scraped by Prometheus; only check that the
+    # request comes from this host.
+    if not is_local_addr(request.META["REMOTE_ADDR"]):
+        raise AccessDeniedError
+    output = in_tornado_thread(generate_latest)(registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
+
+
+@internal_api_view(True)
+@typed_endpoint
+def hand_off_event_queues(
+    request: HttpRequest, *, user_ids: Json[list[int]], port: Json[int], realm_host: str
+) -> HttpResponse:
+    # Moves the given users' event queues, with their contents, to the
+    # Tornado process on `port`, without the clients having to
+    # re-register.  Used for rebalancing Tornado shards; see the
+    # move_realm_event_queues management command.
+    def start_handoff() -> bytes:
+        # Serialize in the Tornado thread, which owns the queues.
+        return orjson.dumps(start_client_descriptor_handoff(user_ids))
+
+    def get_body(queues: bytes) -> str:
+        return urlencode(
+            dict(
+                queues=queues,
+                port=orjson.dumps(port),
+                realm_host=realm_host,
+                secret=settings.SHARED_SECRET,
+            )
+        )
+
+    body = get_body(in_tornado_thread(start_handoff)())
+
+    async def hand_off() -> dict[str, Any]:
+        nonlocal body
+        added = 0
+        while True:
+            try:
+                result = await post_to_tornado(
+                    port, "/api/internal/receive_event_queues", body, timeout=30
+                )
+            except Exception:
+                abort_client_descriptor_handoff()
+                raise
+            if result["result"] != "success":
+                abort_client_descriptor_handoff()
+                return result
+            added += result["queues"]
+            # The users may have registered new queues while we were
+            # waiting, which must be handed off too, before completing
+            # the handoff makes them unreachable here.
+            queues = get_unsent_handoff_client_descriptors()
+            if not queues:
+                break
+            body = get_body(orjson.dumps(queues))
+        complete_client_descriptor_handoff(port, realm_host)
+        return {**result, "queues": added}
+
+    return finish_asynchronously(request, hand_off)
+
+
+@internal_api_view(True)
+@typed_endpoint
+def receive_event_queues(
+    request: HttpRequest, *, queues: Json[list[dict[str, Any]]], port: Json[int], realm_host: str
+) -> HttpResponse:
+    assert is_current_port(port)
+    added = in_tornado_thread(receive_client_descriptors)(queues, port, realm_host)
+    return json_success(request, {"queues": added})
+
+
 @typed_endpoint
 def cleanup_event_queue(
     request: HttpRequest, user_profile: UserProfile, *, queue_id: str
@@ -102,7 +233,16 @@ def cleanup_event_queue(
 def get_events_internal(request: HttpRequest, *, user_profile_id: Json[int]) -> HttpResponse:
     user_profile = narrow_request_user(request, user_id=user_profile_id)
     assert isinstance(user_profile, UserProfile)
-    assert is_current_port(get_user_tornado_port(user_profile))
+    user_port = get_user_tornado_port(user_profile)
+    if not is_current_port(user_port):
+        # This user's event queues were handed off to another Tornado
+        # process (see hand_off_event_queues), and Django has not yet
+        # picked up the updated sharding configuration.
+        body = request.POST.urlencode()
+        return finish_asynchronously(
+            request,
+            lambda: post_to_tornado(user_port, "/api/v1/events/internal", body, timeout=10),
+        )
 
     process_client(request, user_profile, client_name="internal")
     return get_events_backend(request, user_profile)
@@ -3,22 +3,28 @@ from dataclasses import asdict
 from email.headerregistry import Address
 from typing import Annotated, Literal, cast
 
+import orjson
 from django.core import validators
 from django.core.exceptions import ValidationError
 from django.http import HttpRequest, HttpResponse
 from django.utils.translation import gettext as _
-from pydantic import Json
+from pydantic import BaseModel, Json
 
 from zerver.actions.message_send import (
+    check_message,
     check_send_message,
     compute_irc_user_fullname,
     compute_jabber_user_fullname,
     create_mirror_user_if_needed,
+    do_send_messages,
     extract_private_recipients,
     extract_stream_indicator,
 )
+from zerver.lib.addressee import Addressee
 from zerver.lib.exceptions import JsonableError
 from zerver.lib.markdown import render_message_markdown
+from zerver.lib.message import SendMessageRequest
+from zerver.lib.rate_limiter import rate_limit_user
 from zerver.lib.request import RequestNotes
 from zerver.lib.response import json_success
 from zerver.lib.typed_endpoint import (
@@ -102,6 +108,43 @@ def same_realm_jabber_user(user_profile: UserProfile, email: str) -> bool:
     return RealmDomain.objects.filter(realm=user_profile.realm, domain=domain).exists()
 
 
+def get_recipient_type_name(req_type: Literal["direct", "private", "stream", "channel"]) -> str:
+    if req_type == "direct":
+        # For now, use "private" from Message.API_RECIPIENT_TYPES.
+        # TODO: Use "direct" here, as well as in events and
+        # message (created, schdeduled, drafts) objects/dicts.
+        return "private"
+    elif req_type == "channel":
+        # For now, use "stream" from Message.API_RECIPIENT_TYPES.
+        # TODO: Use "channel" here, as well as in events and
+        # message (created, schdeduled, drafts) objects/dicts.
+        return "stream"
+    return req_type
+
+
+def get_message_to(recipient_type_name: str, req_to: str | None) -> Sequence[int] | Sequence[str]:
+    # If to is None, then we default to an
+    # empty list of recipients.
+    if req_to is None:
+        return []
+
+    if recipient_type_name == "stream":
+        stream_indicator = extract_stream_indicator(req_to)
+
+        # For legacy reasons check_send_message expects
+        # a list of streams, instead of a single stream.
+        #
+        # Also, mypy can't detect that a single-item
+        # list populated from a Union[int, str] is actually
+        # a Union[Sequence[int], Sequence[str]].
+        if isinstance(stream_indicator, int):
+            return [stream_indicator]
+        else:
+            return [stream_indicator]
+
+    return extract_private_recipients(req_to)
+
+
 @typed_endpoint
 def send_message_backend(
     request: HttpRequest,
@@ -127,38 +170,8 @@ def send_message_backend(
         str | None, ApiParamConfig("widget_content", documentation_status=DOCUMENTATION_PENDING)
     ] = None,
 ) -> HttpResponse:
-    recipient_type_name = req_type
-    if recipient_type_name == "direct":
-        # For now, use "private" from Message.API_RECIPIENT_TYPES.
-        # TODO: Use "direct" here, as well as in events and
-        # message (created, schdeduled, drafts) objects/dicts.
-        recipient_type_name = "private"
-    elif recipient_type_name == "channel":
-        # For now, use "stream" from Message.API_RECIPIENT_TYPES.
-        # TODO: Use "channel" here, as well as in events and
-        # message (created, schdeduled, drafts) objects/dicts.
-        recipient_type_name = "stream"
-
-    # If to is None, then we default to an
-    # empty list of recipients.
-    message_to: Sequence[int] | Sequence[str] = []
-
-    if req_to is not None:
-        if recipient_type_name == "stream":
-            stream_indicator = extract_stream_indicator(req_to)
-
-            # For legacy reasons check_send_message expects
-            # a list of streams, instead of a single stream.
-            #
-            # Also, mypy can't detect that a single-item
-            # list populated from a Union[int, str] is actually
-            # a Union[Sequence[int], Sequence[str]].
-            if isinstance(stream_indicator, int):
-                message_to = [stream_indicator]
-            else:
-                message_to = [stream_indicator]
-        else:
-            message_to = extract_private_recipients(req_to)
+    recipient_type_name = get_recipient_type_name(req_type)
+    message_to = get_message_to(recipient_type_name, req_to)
 
     # Temporary hack: We're transitioning `forged` from accepting
     # `yes` to accepting `true` like all of our normal booleans.
@@ -244,6 +257,87 @@ def send_message_backend(
     return json_success(request, data=data)
 
 
+# The maximum number of messages that can be sent with a single
+# request to the bulk message sending endpoint.
+MAX_MESSAGES_PER_BULK_SEND = 100
+
+
+class BulkSendMessageData(BaseModel):
+    type: Literal["direct", "private", "stream", "channel"]
+    to: str | int | list[int] | list[str]
+    content: str
+    topic: str | None = None
+
+
+@typed_endpoint
+def send_messages_bulk_backend(
+    request: HttpRequest,
+    user_profile: UserProfile,
+    *,
+    messages: Json[list[BulkSendMessageData]],
+    read_by_sender: Json[bool] | None = None,
+) -> HttpResponse:
+    """Sends several messages, e.g. alerts from an integration, in a
+    single request and transaction.  Each message is validated
+    separately, so that invalid messages do not prevent the others
+    from being sent; the response has a result for each message.
+    """
+    if len(messages) > MAX_MESSAGES_PER_BULK_SEND:
+        raise JsonableError(
+            _("Too many messages; at most {max_messages} can be sent at once.").format(
+                max_messages=MAX_MESSAGES_PER_BULK_SEND
+            )
+        )
+    if len(messages) > 1:
+        # Each message counts against the user's API rate limit, as if
+        # sent in a request of its own; the request itself already has.
+        rate_limit_user(request, user_profile, domain="api_by_user", cost=len(messages) - 1)
+
+    client = RequestNotes.get_notes(request).client
+    assert client is not None
+    if read_by_sender is None:
+        read_by_sender = client.default_read_by_sender()
+
+    results: list[dict[str, object]] = []
+    send_message_requests: list[SendMessageRequest] = []
+    for message in messages:
+        try:
+            recipient_type_name = get_recipient_type_name(message.type)
+            if isinstance(message.to, str):
+                req_to = message.to
+            else:
+                req_to = orjson.dumps(message.to).decode()
+            addressee = Addressee.legacy_build(
+                user_profile,
+                recipient_type_name,
+                get_message_to(recipient_type_name, req_to),
+                message.topic,
+            )
+            send_message_requests.append(
+                check_message(user_profile, client, addressee, message.content, user_profile.realm)
+            )
+        except JsonableError as e:
+            results.append(dict(result="error", msg=e.msg, **e.data))
+        else:
+            results.append(dict(result="success"))
+
+    sent_message_results = iter(
+        do_send_messages(
+            send_message_requests, mark_as_read=[user_profile.id] if read_by_sender else []
+        )
+    )
+    for result in results:
+        if result["result"] != "success":
+            continue
+        sent_message_result = next(sent_message_results)
+        result["id"] = sent_message_result.message_id
+        if sent_message_result.automatic_new_visibility_policy:
+            result["automatic_new_visibility_policy"] = (
+                sent_message_result.automatic_new_visibility_policy
+            )
+    return json_success(request, data={"messages": results})
+
+
 @typed_endpoint
 def zcommand_backend(
     request: HttpRequest, user_profile: UserProfile, *, command: str
@@ -21,6 +21,7 @@ from zerver.lib.partial import partial
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.lib.pysa import mark_sanitized
 from zerver.lib.queue import SimpleQueueClient
+from zerver.tornado.django_api import finish_tornado_notice_batch, start_tornado_notice_batch
 
 logger = logging.getLogger(__name__)
 
@@ -193,6 +194,7 @@ class QueueProcessingWorker(ABC):
                     self.update_statistics()
 
                 time_start = time.time()
+                start_tornado_notice_batch()
                 if self.MAX_CONSUME_SECONDS and not self.threaded and not self.disable_timeout:
                     try:
                         signal.signal(
@@ -213,6 +215,7 @@ class QueueProcessingWorker(ABC):
             except Exception as e:
                 self._handle_consume_exception(events, e)
             finally:
+                finish_tornado_notice_batch()
                 flush_per_request_caches()
                 reset_queries()
 
@@ -0,0 +1,25 @@
+# Documented in https://zulip.readthedocs.io/en/latest/subsystems/queuing.html
+from collections.abc import Mapping
+from typing import Any
+
+from typing_extensions import override
+
+from zerver.actions.message_send import do_fan_out_queued_messages
+from zerver.worker.base import QueueProcessingWorker, assign_queue
+
+
+@assign_queue("message_fanout")
+class MessageFanoutWorker(QueueProcessingWorker):
+    """Creates the UserMessage rows, and sends the events and
+    notifications, for messages to channels with at least
+    settings.MESSAGE_FANOUT_QUEUE_MIN_RECIPIENTS recipients; see
+    use_message_fanout_queue.
+
+    We process each message as soon as it arrives, rather than
+    batching messages with a LoopQueueProcessingWorker, since the
+    batch timeout would delay the delivery of the message.
+    """
+
+    @override
+    def consume(self, event: Mapping[str, Any]) -> None:
+        do_fan_out_queued_messages([event])
@@ -0,0 +1,89 @@
+from functools import partial
+from timeit import timeit
+from typing import Any
+
+from django.core.management.base import CommandParser
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.markdown import (
+    DEFAULT_MARKDOWN_KEY,
+    MessageRenderingResult,
+    ZulipMarkdown,
+    get_possibly_matching_linkifiers,
+)
+from zerver.lib.types import LinkifierDict
+
+CONTENT = """Deployed ZUL-1234 to **staging**; see https://ci.example.com/builds/5678 for the logs.
+
+* Fixed the `render` timeout
+* Updated the translations"""
+
+
+def render(linkifiers: list[LinkifierDict], only_matching: bool = False) -> None:
+    if only_matching:
+        linkifiers = get_possibly_matching_linkifiers(linkifiers, CONTENT)
+    md_engine = ZulipMarkdown(
+        linkifiers=linkifiers, linkifiers_key=DEFAULT_MARKDOWN_KEY, email_gateway=False
+    )
+    md_engine.zulip_message = None
+    md_engine.zulip_realm = None
+    md_engine.zulip_db_data = None
+    md_engine.zulip_rendering_result = MessageRenderingResult(
+        rendered_content="",
+        mentions_topic_wildcard=False,
+        mentions_stream_wildcard=False,
+        mentions_user_ids=set(),
+        mentions_user_group_ids=set(),
+        alert_words=set(),
+        links_for_preview=set(),
+        user_ids_with_alert_words=set(),
+        potential_attachment_path_ids=[],
+        thumbnail_spinners=set(),
+    )
+    md_engine.image_preview_enabled = False
+    md_engine.url_embed_preview_enabled = False
+    md_engine.url_embed_data = None
+    md_engine.convert(CONTENT)
+
+
+class Command(ZulipBaseCommand):
+    help = """Times rendering a typical message for realms with several numbers
+of linkifiers, with every linkifier registered as an inline pattern, and
+with only those that can match the message registered."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--sizes",
+            help="Numbers of linkifiers to time",
+            default=[0, 10, 100, 500],
+            nargs="+",
+            type=int,
+        )
+        parser.add_argument("--reps", help="Iterations for each size", default=20, type=int)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        for size in options["sizes"]:
+            linkifiers = [
+                LinkifierDict(
+                    pattern=rf"PROJ{i}-(?P<id>[0-9]+)" if i else r"ZUL-(?P<id>[0-9]+)",
+                    url_template="https://tracker.example.com/{id}",
+                    id=i,
+                    example_input=None,
+                    reverse_template=None,
+                    alternative_url_templates=[],
+                )
+                for i in range(size)
+            ]
+
+            all_duration = timeit(partial(render, linkifiers), number=options["reps"])
+            matching_duration = timeit(
+                partial(render, linkifiers, only_matching=True), number=options["reps"]
+            )
+            print(
+                f"{size} linkifiers: {all_duration / options['reps'] * 1000:.2f}ms per message "
+                f"with all linkifiers, {matching_duration / options['reps'] * 1000:.2f}ms "
+                "with only those that can match"
+            )
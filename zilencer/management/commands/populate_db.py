@@ -76,7 +76,7 @@ from zerver.models import (
     UserPresence,
     UserProfile,
 )
-from zerver.models.alert_words import flush_alert_word
+from zerver.models.alert_words import flush_deleted_alert_word
 from zerver.models.clients import get_client
 from zerver.models.groups import NamedUserGroup, SystemGroups
 from zerver.models.onboarding_steps import OnboardingStep
@@ -137,7 +137,7 @@ def clear_database() -> None:
     # The after-delete signal on this just updates caches, and slows
     # down the deletion noticeably.  Remove the signal and replace it
     # after we're done.
-    post_delete.disconnect(flush_alert_word, sender=AlertWord)
+    post_delete.disconnect(flush_deleted_alert_word, sender=AlertWord)
     for model in [
         Message,
         Stream,
@@ -155,7 +155,7 @@ def clear_database() -> None:
     ]:
         model.objects.all().delete()
     Session.objects.all().delete()
-    post_delete.connect(flush_alert_word, sender=AlertWord)
+    post_delete.connect(flush_deleted_alert_word, sender=AlertWord)
 
 
 def subscribe_users_to_streams(realm: Realm, stream_dict: dict[str, dict[str, Any]]) -> None:
@@ -1,5 +1,7 @@
 import os
+import time
 from collections.abc import Iterator
+from itertools import tee
 from typing import Any
 
 import orjson
@@ -8,7 +10,7 @@ from django.db.models import QuerySet
 from typing_extensions import override
 
 from zerver.lib.management import ZulipBaseCommand
-from zerver.lib.markdown import render_message_markdown
+from zerver.lib.markdown import render_messages_markdown
 from zerver.models import Message
 
 
@@ -23,8 +25,8 @@ def queryset_iterator(queryset: QuerySet[Message], chunksize: int = 5000) -> Ite
 
 class Command(ZulipBaseCommand):
     help = """
-    Render messages to a file.
-    Usage: ./manage.py render_messages <destination> [--amount=10000]
+    Render messages to a file, and report how long rendering took.
+    Usage: ./manage.py render_messages <destination> [--amount=10000] [--processes=4]
     """
 
     @override
@@ -32,6 +34,9 @@ class Command(ZulipBaseCommand):
         parser.add_argument("destination", help="Destination file path")
         parser.add_argument("--amount", default=100000, help="Number of messages to render")
         parser.add_argument("--latest_id", default=0, help="Last message id to render")
+        parser.add_argument(
+            "--processes", default=1, type=int, help="Number of processes to render with"
+        )
 
     @override
     def handle(self, *args: Any, **options: Any) -> None:
@@ -42,9 +47,8 @@ class Command(ZulipBaseCommand):
         if not os.path.exists(dest_dir):
             os.makedirs(dest_dir)
 
-        with open(options["destination"], "wb") as result:
-            messages = Message.objects.filter(id__gt=latest - amount, id__lte=latest).order_by("id")
-            for message in queryset_iterator(messages):
+        def original_contents(messages: Iterator[Message]) -> Iterator[tuple[Message, str]]:
+            for message in messages:
                 content = message.content
                 # In order to ensure that the output of this tool is
                 # consistent across the time, even if messages are
@@ -58,12 +62,32 @@ class Command(ZulipBaseCommand):
                         if "prev_content" in entry:
                             content = entry["prev_content"]
                             break
+                yield message, content
+
+        with open(options["destination"], "wb") as result:
+            messages = Message.objects.filter(id__gt=latest - amount, id__lte=latest).order_by("id")
+            # Stream messages through the renderer a chunk at a time,
+            # rather than holding all of them in memory; tee only
+            # buffers the messages which are being rendered.
+            to_write, to_render = tee(
+                original_contents(queryset_iterator(messages.select_related("sender", "realm")))
+            )
+            rendered_contents = render_messages_markdown(to_render, options["processes"])
+
+            start = time.perf_counter()
+            count = 0
+            for (message, _), rendered_content in zip(to_write, rendered_contents, strict=True):
                 result.write(
                     orjson.dumps(
-                        {
-                            "id": message.id,
-                            "content": render_message_markdown(message, content),
-                        },
+                        {"id": message.id, "content": rendered_content},
                         option=orjson.OPT_APPEND_NEWLINE,
                     )
                 )
+                count += 1
+            duration = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Rendered {count} messages in {duration:.2f}s "
+            f"({count / duration:.0f} messages/s) "
+            f"with {options['processes']} processes"
+        )
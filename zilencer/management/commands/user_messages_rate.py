@@ -0,0 +1,73 @@
+from functools import partial
+from timeit import timeit
+from typing import Any
+
+from django.core.management.base import CommandParser
+from typing_extensions import override
+
+from zerver.actions.message_send import create_user_messages
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.markdown import MessageRenderingResult
+from zerver.models import Message, Recipient
+
+
+class Command(ZulipBaseCommand):
+    help = """Times computing the UserMessage rows and flags for a channel message,
+per recipient, for channels of several sizes."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--sizes",
+            help="Numbers of channel subscribers to time",
+            default=[1000, 10000, 100000],
+            nargs="+",
+            type=int,
+        )
+        parser.add_argument("--reps", help="Iterations for each size", default=20, type=int)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        message = Message(recipient=Recipient(type=Recipient.STREAM), is_channel_message=True)
+        for size in options["sizes"]:
+            user_ids = set(range(1, size + 1))
+            # A typical large channel: a tenth of the subscribers are
+            # soft-deactivated, a few get notifications for every
+            # message, and a handful are mentioned or have alert words.
+            long_term_idle_user_ids = set(range(1, size + 1, 10))
+            stream_push_user_ids = set(range(3, size + 1, 100))
+            step = max(size // 5, 1)
+            rendering_result = MessageRenderingResult(
+                rendered_content="",
+                mentions_topic_wildcard=False,
+                mentions_stream_wildcard=False,
+                mentions_user_ids=set(range(1, size + 1, step)),
+                mentions_user_group_ids=set(),
+                alert_words=set(),
+                links_for_preview=set(),
+                user_ids_with_alert_words=set(range(2, size + 1, step)),
+                potential_attachment_path_ids=[],
+                thumbnail_spinners=set(),
+            )
+
+            run = partial(
+                create_user_messages,
+                message=message,
+                rendering_result=rendering_result,
+                um_eligible_user_ids=user_ids,
+                long_term_idle_user_ids=long_term_idle_user_ids,
+                stream_push_user_ids=stream_push_user_ids,
+                stream_email_user_ids=set(),
+                mentioned_user_ids=rendering_result.mentions_user_ids,
+                followed_topic_push_user_ids=set(),
+                followed_topic_email_user_ids=set(),
+                mark_as_read_user_ids={1},
+                limit_unread_user_ids=None,
+                topic_participant_user_ids=set(),
+            )
+
+            duration = timeit(run, number=options["reps"]) / options["reps"]
+            print(
+                f"{size} recipients: {duration * 1000:.2f}ms per message, "
+                f"{duration / size * 10**6:.3f}us per recipient"
+            )
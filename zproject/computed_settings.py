@@ -7,7 +7,7 @@ from copy import deepcopy
 from typing import Any, Final, Literal
 from urllib.parse import urljoin
 
-from scripts.lib.zulip_tools import get_tornado_ports
+from scripts.lib.zulip_tools import get_tornado_ports, get_tornado_processes_per_port
 from zerver.lib.db import TimeTrackingConnection, TimeTrackingCursor
 from zerver.lib.types import AnalyticsDataUploadLevel
 
@@ -249,6 +249,7 @@ MIDDLEWARE = [
     "zerver.middleware.JsonErrorHandler",
     "zerver.middleware.RateLimitMiddleware",
     "zerver.middleware.FlushDisplayRecipientCache",
+    "zerver.middleware.BatchTornadoNotices",
     "django.middleware.common.CommonMiddleware",
     "zerver.middleware.LocaleMiddleware",
     "zerver.middleware.HostDomainMiddleware",
@@ -295,7 +296,8 @@ CORPORATE_ENABLED = "corporate" in INSTALLED_APPS
 
 if not TORNADO_PORTS:
     TORNADO_PORTS = get_tornado_ports(config_file)
-TORNADO_PROCESSES = len(TORNADO_PORTS)
+TORNADO_PROCESSES_PER_PORT = get_tornado_processes_per_port(config_file)
+TORNADO_PROCESSES = len(TORNADO_PORTS) * TORNADO_PROCESSES_PER_PORT
 
 RUNNING_INSIDE_TORNADO = (
     len(sys.argv) > 1 and "manage.py" in sys.argv[0] and sys.argv[1] == "runtornado"
@@ -720,6 +720,14 @@ MAX_GROUP_SIZE_FOR_MENTION_REACTIVATION = 11
 # will consider sending DMs to each new subscriber.
 MAX_BULK_NEW_SUBSCRIPTION_MESSAGES = 100
 
+# If set, the UserMessage rows, notifications, and events for messages
+# to channels with at least this many recipients are created by the
+# message_fanout queue worker, after the request sending the message
+# has returned.  This makes sending messages to very large channels
+# faster, at the cost of those messages reaching clients later, and
+# possibly after newer messages to smaller channels.
+MESSAGE_FANOUT_QUEUE_MIN_RECIPIENTS: int | None = None
+
 # Limiting guest access to other users via the
 # can_access_all_users_group setting makes presence queries much more
 # expensive. This can be a significant performance problem for
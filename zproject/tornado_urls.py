@@ -6,11 +6,14 @@ from zerver.tornado.views import (
     cleanup_event_queue,
     get_events,
     get_events_internal,
+    hand_off_event_queues,
+    metrics,
     notify,
+    receive_event_queues,
     web_reload_clients,
 )
 
-# Minimal URL configuration for Tornado.  Tornado only serves 5
+# Minimal URL configuration for Tornado.  Tornado only serves 8
 # endpoints, but without a dedicated urlconf it resolves every request
 # against the full Django URL configuration (~800 patterns), wasting
 # significant CPU on regex matching.
@@ -28,5 +31,8 @@ urlpatterns = [
     path("json/", include(api_and_json_patterns)),
     path("api/internal/notify_tornado", notify),
     path("api/internal/web_reload_clients", web_reload_clients),
+    path("api/internal/hand_off_event_queues", hand_off_event_queues),
+    path("api/internal/receive_event_queues", receive_event_queues),
+    path("api/internal/metrics", metrics),
     path("api/v1/events/internal", get_events_internal),
 ]